@@ -5,10 +5,23 @@ from .usbinfos import (
 	get_devices_list,
 	get_identified_devices,
 	get_unidentified_ports,
+	iter_devices,
+	find_device,
+	scan,
+	watch,
+	diff_devices,
+	last_scan_stats,
 	devices_by_name,
 	devices_by_drive,
 	devices_by_serial,
 	devices_by_vidpid,
+	devices_by_selector,
+	Selector,
+	SelectorError,
+	FIELDS,
+	record_scans,
+	set_backend,
+	set_trace,
 )
 
 try:
@@ -0,0 +1,318 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Incremental backups of the drives of the boards, for discotool backup.
+
+Each drive is copied file by file, skipping the files that did not change
+since the last backup of that drive into the same backup directory: same
+size and modification time, or same hash (checksum). The manifest of each
+drive (in .discotool/ in the backup directory) remembers where the files
+of its last backup are. The unchanged files are hard linked from there
+(or copied from the local disk), so that a new dated backup is complete
+without reading them from the board again.
+
+The drives are copied by a pool of workers, with one lane per board: the
+drives of a board are copied one after the other.
+
+With an archive format, the files of each drive are streamed into an
+archive instead (one file per drive, compressed as they are read).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+from .fleet import run_lanes
+from .usbinfos.usbinfos_trace import span
+
+MANIFEST_DIR = ".discotool"
+HASH_CHUNK = 1024 * 1024
+DEFAULT_WORKERS = 4
+ARCHIVE_FORMATS = ("tar.gz", "tar.zst", "zip")
+
+
+class BackupResult:
+	def __init__(self, job):
+		self.job = job
+		self.files_copied = 0
+		self.files_unchanged = 0
+		self.bytes_copied = 0
+		# with the content addressed store (see store)
+		self.bytes_stored = 0
+		self.snapshot = None
+		self.errors = []
+		self.duration = 0
+
+
+def manifest_path(backup_dir, key):
+	"""
+	The manifest of a drive in the backup directory, key identifies the drive.
+	"""
+	return os.path.join(backup_dir, MANIFEST_DIR, key + ".json")
+
+
+def load_manifest(path):
+	try:
+		with open(path, "r") as fp:
+			return json.load(fp).get("files", {})
+	except (OSError, ValueError):
+		return {}
+
+
+def temp_file(path):
+	"""
+	A new temporary file next to path (to replace it), that can't be the
+	name of a file of the user. Returns its path.
+	"""
+	directory, name = os.path.split(path)
+	fd, temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory or ".")
+	os.close(fd)
+	return temp_path
+
+
+def save_manifest(path, files):
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	temp_path = temp_file(path)
+	try:
+		with open(temp_path, "w") as fp:
+			json.dump({"time": time.time(), "files": files}, fp)
+		os.replace(temp_path, path)
+	except OSError:
+		os.remove(temp_path)
+		raise
+
+
+def file_hash(path):
+	digest = hashlib.sha256()
+	with open(path, "rb") as fp:
+		for chunk in iter(lambda: fp.read(HASH_CHUNK), b""):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+
+def walk_tree(root, ignore=None):
+	"""
+	The paths of the directories and files in root relative to it, as
+	(path, is_dir), with a shutil ignore function (like
+	shutil.ignore_patterns) applied to each directory.
+	"""
+	for dirpath, dirnames, filenames in os.walk(root):
+		ignored = set()
+		if ignore is not None:
+			ignored = ignore(dirpath, dirnames + filenames)
+		dirnames[:] = sorted(name for name in dirnames if name not in ignored)
+		for name in dirnames:
+			yield os.path.relpath(os.path.join(dirpath, name), root), True
+		for name in sorted(filenames):
+			if name not in ignored:
+				yield os.path.relpath(os.path.join(dirpath, name), root), False
+
+
+def walk_files(root, ignore=None):
+	"""
+	The paths of the files in root relative to it (see walk_tree).
+	"""
+	for relative, is_dir in walk_tree(root, ignore):
+		if not is_dir:
+			yield relative
+
+
+def _unchanged(old, entry, checksum):
+	if old is None or old.get("size") != entry["size"]:
+		return False
+	if checksum:
+		return old.get("hash") == entry["hash"]
+	return old.get("mtime") == entry["mtime"]
+
+
+def _copy_file(source, destination):
+	os.makedirs(os.path.dirname(destination), exist_ok=True)
+	# replace the file, it might be linked to the previous backups
+	temp_path = temp_file(destination)
+	try:
+		shutil.copyfile(source, temp_path)
+	except OSError:
+		os.remove(temp_path)
+		raise
+	# copystat can fail between filesystems (macOS), the copy is still fine
+	try:
+		shutil.copystat(source, temp_path)
+	except OSError:
+		pass
+	os.replace(temp_path, destination)
+
+
+def _reuse_file(previous, destination):
+	if os.path.exists(destination):
+		if os.path.samefile(previous, destination):
+			return
+		os.remove(destination)
+	os.makedirs(os.path.dirname(destination), exist_ok=True)
+	try:
+		os.link(previous, destination)
+	except OSError:
+		shutil.copy2(previous, destination)
+
+
+def backup_drive(job, ignore=None, checksum=False):
+	"""
+	Copy the drive job["source"] into job["destination"], skipping the
+	files unchanged since the manifest job["manifest"].
+	"""
+	result = BackupResult(job)
+	start = time.monotonic()
+	source = job["source"]
+	destination = job["destination"]
+	previous = load_manifest(job["manifest"])
+	files = {}
+	for relative, is_dir in walk_tree(source, ignore):
+		source_file = os.path.join(source, relative)
+		destination_file = os.path.join(destination, relative)
+		if is_dir:
+			# keep the empty directories
+			try:
+				os.makedirs(destination_file, exist_ok=True)
+			except OSError as ex:
+				result.errors.append(f"{relative}: {ex}")
+			continue
+		try:
+			stat = os.stat(source_file)
+			entry = {
+				"size": stat.st_size,
+				"mtime": stat.st_mtime,
+				"path": os.path.abspath(destination_file),
+			}
+			if checksum:
+				entry["hash"] = file_hash(source_file)
+			old = previous.get(relative)
+			if _unchanged(old, entry, checksum) and os.path.isfile(old["path"]):
+				_reuse_file(old["path"], destination_file)
+				result.files_unchanged += 1
+			else:
+				_copy_file(source_file, destination_file)
+				result.files_copied += 1
+				result.bytes_copied += stat.st_size
+			files[relative] = entry
+		except OSError as ex:
+			result.errors.append(f"{relative}: {ex}")
+	os.makedirs(destination, exist_ok=True)
+	save_manifest(job["manifest"], files)
+	result.duration = time.monotonic() - start
+	return result
+
+
+def _open_tar_zst(path):
+	try:
+		# python 3.14
+		from compression import zstd
+		return tarfile.open(path, "w:zst")
+	except ImportError:
+		pass
+	try:
+		import zstandard
+	except ImportError:
+		raise ValueError("tar.zst archives need the zstandard module (pip install zstandard)")
+	fileobj = open(path, "wb")
+	stream = zstandard.ZstdCompressor().stream_writer(fileobj)
+	tar = tarfile.open(fileobj=stream, mode="w|")
+	# close the compressor and the file with the archive
+	close = tar.close
+	def close_all():
+		close()
+		stream.close()
+	tar.close = close_all
+	return tar
+
+
+def check_archive_format(archive_format):
+	"""
+	Raise ValueError if the archive format can't be written.
+	"""
+	if archive_format not in ARCHIVE_FORMATS:
+		raise ValueError(f"Unknown archive format: {archive_format}")
+	if archive_format == "tar.zst":
+		try:
+			from compression import zstd
+		except ImportError:
+			try:
+				import zstandard
+			except ImportError:
+				raise ValueError("tar.zst archives need the zstandard module (pip install zstandard)")
+
+
+def archive_drive(job, ignore=None, archive_format="tar.gz"):
+	"""
+	Stream the files of the drive job["source"] into the archive
+	job["destination"], in a directory named after it.
+	"""
+	result = BackupResult(job)
+	start = time.monotonic()
+	source = job["source"]
+	destination = job["destination"]
+	root = os.path.basename(destination)[:-len(archive_format) - 1]
+	os.makedirs(os.path.dirname(destination), exist_ok=True)
+	temp_path = temp_file(destination)
+	try:
+		if archive_format == "zip":
+			archive = zipfile.ZipFile(temp_path, "w", zipfile.ZIP_DEFLATED)
+			add = archive.write
+		else:
+			if archive_format == "tar.zst":
+				archive = _open_tar_zst(temp_path)
+			else:
+				archive = tarfile.open(temp_path, "w:gz")
+			add = lambda path, name: archive.add(path, name, recursive=False)
+		try:
+			for relative, is_dir in walk_tree(source, ignore):
+				source_file = os.path.join(source, relative)
+				try:
+					if is_dir:
+						# the empty directories too
+						add(source_file, os.path.join(root, relative))
+						continue
+					size = os.stat(source_file).st_size
+					add(source_file, os.path.join(root, relative))
+					result.files_copied += 1
+					result.bytes_copied += size
+				except OSError as ex:
+					result.errors.append(f"{relative}: {ex}")
+		finally:
+			archive.close()
+		os.replace(temp_path, destination)
+	except (OSError, tarfile.TarError, zipfile.BadZipFile) as ex:
+		if os.path.exists(temp_path):
+			os.remove(temp_path)
+		result.errors.append(f"{destination}: {ex}")
+	else:
+		result.bytes_stored = os.stat(destination).st_size
+	result.duration = time.monotonic() - start
+	return result
+
+
+def backup_lanes(lanes, workers=DEFAULT_WORKERS, ignore=None, checksum=False, done=None, store=None, archive=None):
+	"""
+	Run the lists of jobs (one per board) concurrently, the jobs of a lane
+	one after the other. done(result) is called when each job is finished.
+	With a store (store.BackupStore) the jobs are snapshots in the store,
+	with an archive format they are archives.
+	Returns the results.
+	"""
+	def run(job):
+		with span("backup.copy", serial=job["serial"], source=job["source"], destination=job["destination"]) as trace:
+			if archive is not None:
+				result = archive_drive(job, ignore, archive)
+			elif store is not None:
+				result = store.backup_drive(job, ignore, checksum)
+			else:
+				result = backup_drive(job, ignore, checksum)
+			trace["files_copied"] = result.files_copied
+			trace["bytes_copied"] = result.bytes_copied
+			if result.errors:
+				trace["outcome"] = "incomplete"
+		return result
+	return run_lanes(lanes, run, workers, done)
@@ -0,0 +1,153 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Send a payload to the DATA ports of many boards at once, for discotool
+broadcast, and collect their replies.
+
+	from discotool.broadcast import broadcast
+	results = broadcast(devices, b"show 3\\n", reply=True)
+	for result in results:
+		print(result.device['name'], result.reply, result.latency)
+
+The ports are all opened first (opening a port is slow), then the
+payloads are written by a pool of workers, each one reading its reply
+until the delimiter or the timeout. The connections come from a
+serialpool.SerialPool, pass one to keep them open between broadcasts.
+"""
+
+import codecs
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .serialpool import SerialPool
+from .templates import template_variables
+from .usbinfos.usbinfos_trace import span
+
+DEFAULT_TIMEOUT = 1
+DEFAULT_WORKERS = 64
+MAX_REPLY = 64 * 1024
+
+
+class BroadcastResult:
+	def __init__(self, device, index):
+		self.device = device
+		self.index = index
+		self.payload = b""
+		self.reply = None
+		self.error = None
+		# seconds from the start of the broadcast to the write
+		self.offset = 0
+		# seconds to write the payload, from the write to the end of the reply
+		self.write_time = 0
+		self.latency = 0
+
+	@property
+	def ok(self):
+		return self.error is None
+
+
+def unescape(text):
+	"""
+	The bytes of a text with escape sequences like \\n or \\x00.
+	"""
+	return codecs.escape_decode(text.encode("utf-8"))[0]
+
+
+def template_payload(template):
+	"""
+	A payload function formatting the template for each board, with the
+	variables of templates.py and {index}, the position of the board.
+	"""
+	def payload(device, index):
+		return template.format(index=index, **template_variables(device))
+	return payload
+
+
+def _encode(payload):
+	if isinstance(payload, str):
+		return payload.encode("utf-8")
+	return bytes(payload)
+
+
+def broadcast(devices, payload, reply=False, delimiter=b"\n", timeout=DEFAULT_TIMEOUT,
+		workers=DEFAULT_WORKERS, done=None, pool=None):
+	"""
+	Write the payload to the DATA port of the devices. payload is bytes, a
+	string, or a function payload(device, index) for a payload per board.
+	With reply, read until the delimiter (or for timeout seconds if there
+	is no delimiter). done(result) is called as each board ends (one at a
+	time). Returns the results in the order of the devices.
+	"""
+	results = [BroadcastResult(device, index) for index, device in enumerate(devices)]
+	own_pool = pool is None
+	if own_pool:
+		# the ports of the devices are known, scan only if one is missing
+		pool = SerialPool(timeout=timeout, follow_hotplug=False, devices=devices)
+	lock = threading.Lock()
+	def finish(result):
+		with lock:
+			if done is not None:
+				done(result)
+	def connect(result):
+		try:
+			connection = pool.get(result.device['serial_num'], "data")
+			connection.open()
+			return connection
+		except Exception as ex:
+			result.error = str(ex)
+			finish(result)
+			return None
+	def send(result, connection, start):
+		with span("broadcast.send", serial=result.device['serial_num'], port=connection.path) as trace:
+			try:
+				with connection:
+					if reply:
+						connection.reset_input_buffer()
+					write_start = time.monotonic()
+					result.offset = write_start - start
+					connection.write(result.payload)
+					connection.flush()
+					result.write_time = time.monotonic() - write_start
+					if reply:
+						if delimiter:
+							result.reply = connection.read_until(delimiter, MAX_REPLY, timeout)
+							if not result.reply.endswith(delimiter):
+								result.error = f"no reply after {timeout}s"
+						else:
+							result.reply = connection.read(MAX_REPLY, timeout)
+					result.latency = time.monotonic() - write_start
+			except Exception as ex:
+				result.error = str(ex)
+			if not result.ok:
+				trace["outcome"] = "error"
+		finish(result)
+
+	try:
+		ready = []
+		for result in results:
+			device = result.device
+			if not device['serial_num']:
+				result.error = "no serial number"
+			elif not device.data:
+				result.error = "no data port"
+			else:
+				try:
+					result.payload = _encode(payload(device, result.index) if callable(payload) else payload)
+				except (KeyError, IndexError, ValueError) as ex:
+					result.error = f"bad payload template: {ex}"
+			if result.error:
+				finish(result)
+			else:
+				ready.append(result)
+		with ThreadPoolExecutor(max_workers=workers) as executor:
+			connections = list(executor.map(connect, ready))
+			start = time.monotonic()
+			futures = [executor.submit(send, result, connection, start)
+				for result, connection in zip(ready, connections) if connection is not None]
+			for future in futures:
+				future.result()
+	finally:
+		if own_pool:
+			pool.close()
+	return results
@@ -0,0 +1,204 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Record the serial output of the boards into files, for discotool capture.
+
+The ports are read by a monitor.SerialMonitor, each one is appended as
+is to its own file through a large buffer, flushed every FLUSH_INTERVAL.
+A file is rotated when it reaches a size or an age: renamed with the time
+and compressed in the background (gzip or xz) while the capture goes on.
+
+When a board resets its port is found again by rescanning the devices in
+a thread (one scan shared by all the ports waiting), and the capture
+continues in the same file after a marker line.
+"""
+
+import gzip
+import lzma
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .usbinfos import get_identified_devices, device_identity, hotplug_monitor
+
+BUFFER_SIZE = 1024 * 1024
+FLUSH_INTERVAL = 1
+RESCAN_INTERVAL = 1
+CAPTURE_FIELDS = ("name", "serial_num", "usb_location", "ports")
+COMPRESSORS = {
+	"gz": gzip.open,
+	"xz": lzma.open,
+}
+
+
+def compress_file(path, compression):
+	"""
+	Compress a file to path.gz or path.xz and remove it.
+	"""
+	with open(path, "rb") as source, COMPRESSORS[compression](path + "." + compression, "wb") as target:
+		shutil.copyfileobj(source, target, BUFFER_SIZE)
+	os.remove(path)
+
+
+class CaptureFile:
+	"""
+	The log of a port, name.log in the directory, rotated after max_size
+	bytes or max_age seconds (0 for no limit).
+	"""
+	def __init__(self, directory, name, max_size=0, max_age=0, compression=None, compressor=None):
+		self.directory = directory
+		self.name = name
+		self.path = os.path.join(directory, name + ".log")
+		self.max_size = max_size
+		self.max_age = max_age
+		self.compression = compression
+		self.compressor = compressor
+		self.bytes_written = 0
+		self._open()
+
+	def _open(self):
+		self.file = open(self.path, "ab", buffering=BUFFER_SIZE)
+		self.size = self.file.tell()
+		self.opened = time.time()
+		self.dirty = False
+
+	def write(self, data):
+		self.file.write(data)
+		self.size += len(data)
+		self.bytes_written += len(data)
+		self.dirty = True
+		if self.max_size and self.size >= self.max_size:
+			self.rotate()
+
+	def marker(self, text):
+		self.write(f"\n--- discotool: {text} at {time.strftime('%Y-%m-%d %H:%M:%S')}\n".encode())
+
+	def tick(self, now):
+		if self.max_age and self.size and now - self.opened >= self.max_age:
+			self.rotate()
+		elif self.dirty:
+			self.file.flush()
+			self.dirty = False
+
+	def rotate(self):
+		self.file.close()
+		stamp = time.strftime("%Y%m%d-%H%M%S")
+		rotated = os.path.join(self.directory, f"{self.name}.{stamp}.log")
+		suffix = 1
+		while os.path.exists(rotated) or os.path.exists(f"{rotated}.{self.compression}"):
+			rotated = os.path.join(self.directory, f"{self.name}.{stamp}-{suffix}.log")
+			suffix += 1
+		os.replace(self.path, rotated)
+		if self.compression:
+			self.compressor.submit(compress_file, rotated, self.compression)
+		self._open()
+
+	def close(self):
+		self.file.close()
+
+
+class PortResolver:
+	"""
+	Find the current port of a board after it reset, by device_identity.
+	The devices are scanned by a thread, on the hotplug events and every
+	RESCAN_INTERVAL while ports are missing: port() only reads the last scan
+	and doesn't block the monitor loop.
+	"""
+	def __init__(self, data=False, devices=()):
+		self.data = data
+		self.lock = threading.Lock()
+		self.devices = {device_identity(device): device for device in devices}
+		self.missing = threading.Event()
+		self.stopping = threading.Event()
+		self.thread = None
+
+	def start(self):
+		self.thread = threading.Thread(target=self._follow_hotplug, daemon=True)
+		self.thread.start()
+
+	def scan(self):
+		try:
+			devices = get_identified_devices(fields=CAPTURE_FIELDS)
+		except Exception:
+			return
+		with self.lock:
+			self.devices = {device_identity(device): device for device in devices}
+
+	def _follow_hotplug(self):
+		monitor = hotplug_monitor()
+		try:
+			while not self.stopping.is_set():
+				events = monitor.wait(RESCAN_INTERVAL)
+				if self.stopping.is_set():
+					break
+				if events or self.missing.is_set():
+					self.missing.clear()
+					self.scan()
+		finally:
+			monitor.close()
+
+	def port(self, identity):
+		# called when the port is not connected, look for it again
+		self.missing.set()
+		with self.lock:
+			device = self.devices.get(identity)
+		if device is None:
+			return None
+		return device.data if self.data else device.repl
+
+	def close(self):
+		self.stopping.set()
+		if self.thread is not None:
+			self.thread.join()
+
+
+class Capture:
+	"""
+	Connect the ports to their files in the directory (see CaptureFile).
+	handler, event and tick are given to the SerialMonitor.
+	"""
+	def __init__(self, directory, max_size=0, max_age=0, compression=None):
+		self.directory = directory
+		self.max_size = max_size
+		self.max_age = max_age
+		self.compression = compression
+		self.compressor = ThreadPoolExecutor(max_workers=1) if compression else None
+		self.files = {}
+		self.connections = {}
+		self.last_tick = 0
+
+	def add(self, port, name):
+		capture_file = CaptureFile(self.directory, name, self.max_size,
+			self.max_age, self.compression, self.compressor)
+		self.files[id(port)] = capture_file
+		return capture_file
+
+	def handler(self, port, data, timestamp):
+		self.files[id(port)].write(data)
+
+	def event(self, port, name):
+		capture_file = self.files[id(port)]
+		count = self.connections.get(id(port), 0)
+		if name == "connected":
+			self.connections[id(port)] = count + 1
+			# the first connection is the start of the capture
+			if count:
+				capture_file.marker(f"reconnected to {port.path}")
+		else:
+			capture_file.marker(f"disconnected from {port.path}")
+
+	def tick(self):
+		now = time.time()
+		if now - self.last_tick < FLUSH_INTERVAL:
+			return
+		self.last_tick = now
+		for capture_file in self.files.values():
+			capture_file.tick(now)
+
+	def close(self):
+		for capture_file in self.files.values():
+			capture_file.close()
+		if self.compressor is not None:
+			self.compressor.shutdown(wait=True)
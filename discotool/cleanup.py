@@ -0,0 +1,117 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Find and remove the files that computers leave on the drives of the
+boards, for discotool cleanup.
+
+The drives are walked with os.scandir (no stat of every file) and all the
+candidates are collected first, so that they can be confirmed at once,
+then the drives are cleaned concurrently.
+"""
+
+import fnmatch
+import os
+import shutil
+import time
+from .fleet import run_lanes
+from .usbinfos.usbinfos_trace import span
+
+# macOS's resource forks, folder settings and trash
+DEFAULT_PATTERNS = ("._*", ".DS_Store", ".Trashes")
+DEFAULT_WORKERS = 8
+
+
+class Candidate:
+	def __init__(self, path, is_dir, size):
+		self.path = path
+		self.is_dir = is_dir
+		self.size = size
+
+
+def _matches(name, patterns):
+	return any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+
+
+def find_candidates(root, patterns=DEFAULT_PATTERNS):
+	"""
+	The files and directories matching the patterns in root.
+	A matching directory is removed whole, it is not walked.
+	"""
+	candidates = []
+	directories = [root]
+	while directories:
+		directory = directories.pop()
+		with os.scandir(directory) as entries:
+			for entry in entries:
+				is_dir = entry.is_dir(follow_symlinks=False)
+				if _matches(entry.name, patterns):
+					size = 0 if is_dir else entry.stat(follow_symlinks=False).st_size
+					candidates.append(Candidate(entry.path, is_dir, size))
+				elif is_dir:
+					directories.append(entry.path)
+	candidates.sort(key=lambda candidate: candidate.path)
+	return candidates
+
+
+class CleanupResult:
+	def __init__(self, job):
+		self.job = job
+		self.removed = 0
+		self.bytes_removed = 0
+		self.errors = []
+		self.duration = 0
+
+
+def remove_candidates(job):
+	"""
+	Remove the candidates of a drive, job["candidates"].
+	"""
+	result = CleanupResult(job)
+	start = time.monotonic()
+	for candidate in job["candidates"]:
+		try:
+			if candidate.is_dir:
+				shutil.rmtree(candidate.path)
+			else:
+				os.remove(candidate.path)
+			result.removed += 1
+			result.bytes_removed += candidate.size
+		except FileNotFoundError:
+			pass
+		except OSError as ex:
+			result.errors.append(f"{candidate.path}: {ex}")
+	result.duration = time.monotonic() - start
+	return result
+
+
+def find_all(jobs, patterns=DEFAULT_PATTERNS, workers=DEFAULT_WORKERS):
+	"""
+	Fill job["candidates"] (or job["error"]) for the drives job["source"].
+	"""
+	def find(job):
+		with span("cleanup.find", serial=job["serial"], source=job["source"]) as trace:
+			try:
+				job["candidates"] = find_candidates(job["source"], patterns)
+				trace["candidates"] = len(job["candidates"])
+			except OSError as ex:
+				job["candidates"] = []
+				job["error"] = str(ex)
+				trace["outcome"] = "error"
+	run_lanes([[job] for job in jobs], find, workers)
+	return jobs
+
+
+def remove_all(jobs, workers=DEFAULT_WORKERS, done=None):
+	"""
+	Remove the candidates of the drives concurrently, done(result) is
+	called when each drive is finished. Returns the results.
+	"""
+	def remove(job):
+		with span("cleanup.remove", serial=job["serial"], source=job["source"]) as trace:
+			result = remove_candidates(job)
+			trace["removed"] = result.removed
+			if result.errors:
+				trace["outcome"] = "incomplete"
+		return result
+	return run_lanes([[job] for job in jobs], remove, workers, done)
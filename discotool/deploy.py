@@ -0,0 +1,166 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Copy a project to the drives of the boards, for discotool deploy.
+
+Only the files that differ are written: a file with the same size and
+the same modification time (at the 2 seconds resolution of FAT) on the
+board is skipped, any other file with the same size is compared by hash.
+The files written on the board get the modification time of the source
+rounded to that resolution, so the next deploy skips them.
+
+Every drive is compared first, then the changes are written in one burst,
+libraries first and code.py last, so that Circuitpython reloads as few
+times as possible. The boards are deployed concurrently.
+"""
+
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import Future
+from .backup import walk_files, file_hash
+from .fleet import run_lanes
+from .usbinfos.usbinfos_trace import span
+
+DEFAULT_WORKERS = 8
+DEPLOY_IGNORE = shutil.ignore_patterns("._*", ".DS_Store", ".git", "__pycache__")
+# the files that start the code, written last
+MAIN_FILES = ("code.txt", "code.py", "main.txt", "main.py")
+# FAT stores the modification time with a 2 seconds resolution
+MTIME_RESOLUTION = 2
+
+
+def fat_time(mtime):
+	"""
+	The modification time as stored by FAT, rounded down to the resolution.
+	"""
+	return mtime - mtime % MTIME_RESOLUTION
+
+
+def deploy_order(relative):
+	"""
+	Sort key of the files: lib/ first, the main files last.
+	"""
+	if relative in MAIN_FILES:
+		return (2, MAIN_FILES.index(relative))
+	if relative.split(os.sep)[0] == "lib":
+		return (0, relative)
+	return (1, relative)
+
+
+class SourceTree:
+	"""
+	The files of the project, their hashes are computed once for all boards.
+	"""
+	def __init__(self, root, ignore=DEPLOY_IGNORE):
+		self.root = root
+		self.files = {}
+		for relative in sorted(walk_files(root, ignore), key=deploy_order):
+			self.files[relative] = os.stat(os.path.join(root, relative))
+		self._hashes = {}
+		self._lock = threading.Lock()
+
+	def hash(self, relative):
+		# the first caller hashes the file, outside of the lock, the
+		# others wait for its result
+		with self._lock:
+			future = self._hashes.get(relative)
+			first = future is None
+			if first:
+				future = self._hashes[relative] = Future()
+		if first:
+			try:
+				future.set_result(file_hash(os.path.join(self.root, relative)))
+			except Exception as ex:
+				future.set_exception(ex)
+		return future.result()
+
+
+class DeployResult:
+	def __init__(self, job):
+		self.job = job
+		self.files_written = 0
+		self.files_unchanged = 0
+		self.files_hashed = 0
+		self.bytes_written = 0
+		# the files that differ, in the order they are written
+		self.changes = []
+		self.errors = []
+		self.duration = 0
+
+
+def _changed(tree, relative, target):
+	"""
+	Returns True if the file needs to be written, and if it was hashed.
+	"""
+	source_stat = tree.files[relative]
+	try:
+		target_stat = os.stat(target)
+	except FileNotFoundError:
+		return True, False
+	if target_stat.st_size != source_stat.st_size:
+		return True, False
+	if fat_time(target_stat.st_mtime) == fat_time(source_stat.st_mtime):
+		return False, False
+	return file_hash(target) != tree.hash(relative), True
+
+
+def _write_file(source, target):
+	os.makedirs(os.path.dirname(target), exist_ok=True)
+	with open(source, "rb") as source_file, open(target, "wb") as target_file:
+		shutil.copyfileobj(source_file, target_file)
+		target_file.flush()
+		os.fsync(target_file.fileno())
+	# the same time whatever the filesystem, for the next comparison
+	mtime = fat_time(os.stat(source).st_mtime)
+	try:
+		os.utime(target, (mtime, mtime))
+	except OSError:
+		pass
+
+
+def deploy_drive(tree, job, dry_run=False):
+	"""
+	Write the files of the tree that differ on the drive job["destination"].
+	"""
+	result = DeployResult(job)
+	start = time.monotonic()
+	destination = job["destination"]
+	for relative in tree.files:
+		try:
+			changed, hashed = _changed(tree, relative, os.path.join(destination, relative))
+			result.files_hashed += hashed
+			if changed:
+				result.changes.append(relative)
+			else:
+				result.files_unchanged += 1
+		except OSError as ex:
+			result.errors.append(f"{relative}: {ex}")
+	if not dry_run:
+		for relative in result.changes:
+			try:
+				_write_file(os.path.join(tree.root, relative), os.path.join(destination, relative))
+				result.files_written += 1
+				result.bytes_written += tree.files[relative].st_size
+			except OSError as ex:
+				result.errors.append(f"{relative}: {ex}")
+	result.duration = time.monotonic() - start
+	return result
+
+
+def deploy_all(tree, jobs, workers=DEFAULT_WORKERS, dry_run=False, done=None):
+	"""
+	Deploy the tree to the drives of the jobs concurrently.
+	done(result) is called when each drive is finished. Returns the results.
+	"""
+	def run(job):
+		with span("deploy.drive", serial=job["serial"], destination=job["destination"]) as trace:
+			result = deploy_drive(tree, job, dry_run)
+			trace["files_written"] = result.files_written
+			trace["bytes_written"] = result.bytes_written
+			if result.errors:
+				trace["outcome"] = "incomplete"
+		return result
+	return run_lanes([[job] for job in jobs], run, workers, done)
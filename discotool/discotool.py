@@ -11,18 +11,13 @@ import re
 import shutil
 import subprocess
 import sys
+import threading
 import time
-import traceback
 from . import usbinfos
 from .usbinfos import port_is_repl, port_is_data
-
-# fix for bug on macOS where copytree errors when copying between filesystems
-COPYSTAT = shutil.copystat
-def NOCOPYSTAT(*a, **k):
-	try:
-		COPYSTAT(*a, **k)
-	except Exception:
-		pass
+from .usbinfos import Selector, SelectorError
+from .usbinfos.usbinfos_trace import span
+from .templates import template_variables, TEMPLATE_HELP
 
 SHUTIL_IGNORE = shutil.ignore_patterns("._*")
 
@@ -41,6 +36,8 @@ conf = {
 	"SERIALTOOL" : "",
 	# command line to call circup
 	"CIRCUP" : "circup",
+	# number of boards updated by circup at the same time
+	"CIRCUP_JOBS" : 4,
 	# disable colors
 	"NOCOLOR" : False,
 	# separation line length
@@ -48,15 +45,18 @@ conf = {
 }
 """Global configuration of the app, will be updated with env and configs"""
 
+# rescan anyway after this many seconds, in case a change was not notified
+WAIT_RESCAN_INTERVAL = 5
+
 APPDIR = appdirs.user_data_dir(appname="discotool", appauthor="neradoc")
 alias_file = os.path.join(APPDIR, "alias.json")
 
 # click.echo/secho
-def echo(*text,nl=True,**kargs):
+def echo(*text,nl=True,err=False,**kargs):
 	if bool(conf['NOCOLOR']):
-		click.echo(" ".join(text), nl=nl)
+		click.echo(" ".join(text), nl=nl, err=err)
 	else:
-		click.secho(" ".join(text), nl=nl, **kargs)
+		click.secho(" ".join(text), nl=nl, err=err, **kargs)
 
 
 # setup the command line configuration and tools
@@ -141,50 +141,155 @@ def displayTheBoardsList(bList, ports=[]):
 		echo(" ".join(ports))
 
 
+# human readable size
+def format_size(size):
+	for unit in ("B", "KB", "MB", "GB"):
+		if size < 1024 or unit == "GB":
+			break
+		size /= 1024
+	if unit == "B":
+		return f"{size:.0f} {unit}"
+	return f"{size:.1f} {unit}"
+
+
+# print the timings of the last scan
+def displayTheTimings(stats):
+	if stats is None:
+		return
+	echo(f"- Scan timings ({stats['backend']}) ".ljust(conf['LINE_LENGTH'],"-"), fg="cyan", bold=True, err=True)
+	for phase, duration in stats['phases'].items():
+		click.echo(f"\t{phase:16s} {duration*1000:9.2f} ms", err=True)
+	click.echo(f"\t{'total':16s} {stats['total']*1000:9.2f} ms", err=True)
+	counters = ", ".join(f"{name} {value}" for name, value in stats['counters'].items())
+	click.echo(f"\t{counters}", err=True)
+
+
+# compile the selection arguments into one selector (None if no criteria)
+def build_selector(name, serial, mount, select):
+	selectors = []
+	if name != "":
+		selectors.append(Selector.contains("name", name))
+	if serial != "":
+		selectors.append(Selector.contains("serial", serial))
+	if mount != "":
+		selectors.append(Selector.contains("drive", mount))
+	if select != "":
+		selectors.append(Selector(select))
+	if len(selectors) == 0:
+		return None
+	if len(selectors) == 1:
+		return selectors[0]
+	return Selector.any_of(selectors)
+
+
 # interpret the arguments and select devices based on that
-def find_the_devices(deviceList, auto, wait, name, serial, mount):
+def find_the_devices(deviceList, auto, selector):
 	selectedDevices = []
 	# only one device and "--auto", connect to it
 	if auto and len(deviceList) == 1:
 		selectedDevices.append(deviceList[0])
-	# device selected by its name (first one found that matches)
-	if name != "":
-		for device in deviceList:
-			device_name = device['name'].lower()
-			if device_name.find(name) >= 0:
-				if device not in selectedDevices:
-					selectedDevices.append(device)
-	# device selected by its serial number (first one found that matches)
-	if serial != "":
-		for device in deviceList:
-			serial_number = device['serial_num'].lower()
-			if serial_number.find(serial) >= 0:
-				if device not in selectedDevices:
-					selectedDevices.append(device)
-	# device selected by its drive path (first one that matches)
-	if mount != "":
-		for device in deviceList:
-			for volume in device['volumes']:
-				if 'name' in volume \
-					and volume['name'].lower().find(mount) >= 0:
-					if device not in selectedDevices:
-						selectedDevices.append(device)
+	# devices selected by name, serial number, drive name or expression
+	if selector is not None:
+		# compare by identity, not by contents (a device is in the list once)
+		selectedDevices += [device for device in selector.select(deviceList)
+			if not any(device is other for other in selectedDevices)]
 	return selectedDevices
 
 
-# remove macOS ._ files from a drive (or directory)
-def tree_clean(root, force=False):
-	for target in os.listdir(root):
-		file = os.path.join(root,target)
-		if os.path.isdir(file):
-			tree_clean(file, force)
-		else:
-			if os.path.basename(file).startswith("._"):
-				if force:
-					click.echo(f"Delete {file}")
-					os.remove(file)
-				elif click.confirm(f"Delete {file} ?"):
-					os.remove(file)
+# keep the devices that have a mounted drive and/or a serial port we can open
+def ready_devices(deviceList, drive=False, port=False):
+	def is_ready(device):
+		if drive and not any(os.path.isdir(volume['mount_point'])
+			for volume in device['volumes']):
+			return False
+		if port and not any(os.access(pp['dev'], os.R_OK | os.W_OK)
+			for pp in device['ports']):
+			return False
+		return True
+	return [device for device in deviceList if is_ready(device)]
+
+
+# commands that need all the devices and unknown ports, even with a selection
+FULL_SCAN_COMMANDS = ("metrics",)
+
+# declare the device fields that a command uses, the scan skips the others
+# (see usbinfos.FIELDS), commands that don't declare them get all the fields
+def uses_fields(*fields):
+	def decorator(function):
+		function.device_fields = fields
+		return function
+	return decorator
+
+
+# the command calls select_the_devices itself (if it needs devices at all),
+# for example when the fields it uses depend on its arguments
+def selects_later(function):
+	function.selects_later = True
+	return function
+
+# scan the devices and select them with the criteria given to main
+def scan_the_devices(ctx):
+	criteria = ctx.obj["criteria"]
+	# push the selection into the scan, unless --auto needs to count all
+	selector = criteria["selector"]
+	# the version of the boards is read from their drive
+	drive_info = ctx.obj["info"] or (selector is not None and "version" in selector.fields())
+	if criteria["auto"] or ctx.invoked_subcommand in FULL_SCAN_COMMANDS:
+		selector = None
+	deviceList, remainingPorts = usbinfos.get_devices_list(
+		drive_info=drive_info,
+		selector=selector,
+		fields=ctx.obj["fields"],
+	)
+	if ctx.obj["noCriteria"]:
+		selectedDevices = deviceList
+	else:
+		selectedDevices = find_the_devices(deviceList, **ctx.obj["criteria"])
+	ctx.obj["deviceList"] = deviceList
+	ctx.obj["remainingPorts"] = remainingPorts
+	ctx.obj["selectedDevices"] = selectedDevices
+	return selectedDevices
+
+
+# scan the devices with the fields used by the command (None for all),
+# and wait for them if asked by main
+def select_the_devices(ctx, fields=None):
+	wait, wait_drive, wait_port = ctx.obj["wait"]
+	if fields is not None:
+		fields = set(fields)
+		if wait_drive:
+			fields.add("volumes")
+		if wait_port:
+			fields.add("ports")
+		# the selection is also made after the scan (--auto, metrics)
+		if ctx.obj["criteria"]["selector"] is not None:
+			fields |= ctx.obj["criteria"]["selector"].fields()
+	ctx.obj["fields"] = fields
+	if not wait:
+		return scan_the_devices(ctx)
+	#
+	# wait until the device pops up, the monitor sees the changes from
+	# before the first scan
+	monitor = usbinfos.hotplug_monitor()
+	try:
+		selectedDevices = scan_the_devices(ctx)
+		click.echo("Wait until the device is available")
+		selectedDevices = ready_devices(selectedDevices, wait_drive, wait_port)
+		while len(selectedDevices) == 0:
+			click.echo(".",nl=False)
+			sys.stdout.flush()
+			# sleep until something changes on USB or in the mounts
+			monitor.wait(WAIT_RESCAN_INTERVAL)
+			# re scan the device
+			selectedDevices = scan_the_devices(ctx)
+			selectedDevices = ready_devices(selectedDevices, wait_drive, wait_port)
+		ctx.obj["selectedDevices"] = selectedDevices
+	except KeyboardInterrupt:
+		# exit cleanly on ctrl-C rather than print an exception
+		sys.exit(0)
+	finally:
+		monitor.close()
+	return selectedDevices
 
 
 # connect to port
@@ -197,7 +302,11 @@ def connect_to_port(device, port):
 		command = conf['SERIALTOOL'] + " " + port
 	echo(f"- Connecting to {device_name} ".ljust(conf['LINE_LENGTH'],"-"), fg="cyan", bold=True)
 	echo("> "+command, fg="cyan", bold=True)
-	subprocess.run(command, shell=True)
+	with span("command.serialtool", serial=device['serial_num'], port=port, command=command) as trace:
+		process = subprocess.run(command, shell=True)
+		trace["returncode"] = process.returncode
+		if process.returncode != 0:
+			trace["outcome"] = "error"
 
 
 @click.group(invoke_without_command=True, cls=ClickAliasedGroup)
@@ -207,7 +316,15 @@ def connect_to_port(device, port):
 )
 @click.option(
 	"--wait", "-w",
-	is_flag=True, help="Scan the boards until one match is found. Warning: does not wait for the board's drive to be mounted."
+	is_flag=True, help="Wait until a matching board is found, rescanning when USB devices or mounts change."
+)
+@click.option(
+	"--wait-drive",
+	is_flag=True, help="Wait until a matching board has its drive mounted (implies --wait)."
+)
+@click.option(
+	"--wait-port",
+	is_flag=True, help="Wait until a matching board has a usable serial port (implies --wait)."
 )
 @click.option(
 	"--name", "-n",
@@ -230,6 +347,11 @@ def connect_to_port(device, port):
 	default="",
 	help="Select a device by matching name, serial, or mount.",
 )
+@click.option(
+	"--select", "-S",
+	default="",
+	help="Select devices with an expression like 'vid=239a pid=80f4', 'serial~^DF60', 'loc=1-2.*', 'drive=CIRCUITPY', combined with and/or/not.",
+)
 @click.option(
 	"--nocolor",
 	is_flag=True, help="Disable colors in the terminal."
@@ -253,8 +375,28 @@ def connect_to_port(device, port):
 	is_flag=True,
 	help="Fetch more information. Can cause drive access and code reload on Circuitpython."
 )
+@click.option(
+	"--record",
+	default="",
+	help="Record the inputs of the scans into a file, to replay them with DISCOTOOL_BACKEND=replay:FILE."
+)
+@click.option(
+	"--timings",
+	is_flag=True,
+	help="Print the duration of each phase of the scan and its counters (and add them to the json output)."
+)
+@click.option(
+	"--profile",
+	default="",
+	help="Profile the command with cProfile and dump the stats into a file (read with pstats or snakeviz)."
+)
+@click.option(
+	"--profile-memory",
+	default="",
+	help="Trace the memory allocations of the command with tracemalloc and write the top ones into a file."
+)
 @click.pass_context
-def main(ctx, auto, wait, name, serial, mount, any_criteria, nocolor, color, serialtool, circuptool, info):
+def main(ctx, auto, wait, wait_drive, wait_port, name, serial, mount, any_criteria, select, nocolor, color, serialtool, circuptool, info, record, timings, profile, profile_memory):
 	"""
 	discotool, the discovery tool for USB microcontroller boards.
 	"""
@@ -289,45 +431,50 @@ def main(ctx, auto, wait, name, serial, mount, any_criteria, nocolor, color, ser
 		serial  = any_criteria
 		mount = any_criteria
 	# differenciate "nothing found" and "nothing asked"
-	noCriteria = (serial == "" and name == "" and mount == "" and not auto)
+	noCriteria = (serial == "" and name == "" and mount == "" and select == "" and not auto)
 	ctx.obj["noCriteria"] = noCriteria
+	# record the scans for replay
+	if record:
+		usbinfos.record_scans(record)
+	# profiling of the whole command
+	ctx.obj["timings"] = timings
+	if timings:
+		ctx.call_on_close(lambda: displayTheTimings(usbinfos.last_scan_stats()))
+	if profile:
+		import cProfile
+		profiler = cProfile.Profile()
+		profiler.enable()
+		def dump_profile():
+			profiler.disable()
+			profiler.dump_stats(profile)
+		ctx.call_on_close(dump_profile)
+	if profile_memory:
+		import tracemalloc
+		tracemalloc.start()
+		def dump_memory():
+			snapshot = tracemalloc.take_snapshot()
+			tracemalloc.stop()
+			with open(profile_memory, "w") as fp:
+				for stat in snapshot.statistics("lineno")[:50]:
+					fp.write(f"{stat}\n")
+		ctx.call_on_close(dump_memory)
 	# compute the data
-	deviceList, remainingPorts = usbinfos.get_devices_list(drive_info=info)
-	#
-	# wait until the device pops up
-	if wait:
-		click.echo("Wait until the device is available")
-		while True:
-			try:
-			# try finding a device
-				if noCriteria:
-					selectedDevices = deviceList
-				else:
-					selectedDevices = find_the_devices(deviceList, auto, wait, name, serial, mount)
-				if len(selectedDevices) == 0:
-					click.echo(".",nl=False)
-					sys.stdout.flush()
-					# loop slowly
-					time.sleep(1)
-					# re scan the device
-					deviceList, remainingPorts = usbinfos.get_devices_list()
-				else:
-					ctx.obj["deviceList"] = deviceList
-					ctx.obj["remainingPorts"] = remainingPorts
-					ctx.obj["selectedDevices"] = selectedDevices
-					break
-			except KeyboardInterrupt:
-				# exit cleanly on ctrl-C rather than print an exception
-				sys.exit(0)
-	else:
-		# find only once
-		if noCriteria:
-			selectedDevices = deviceList
-		else:
-			selectedDevices = find_the_devices(deviceList, auto, wait, name, serial, mount)
-		ctx.obj["deviceList"] = deviceList
-		ctx.obj["remainingPorts"] = remainingPorts
-		ctx.obj["selectedDevices"] = selectedDevices
+	ctx.obj["wait"] = (wait or wait_drive or wait_port, wait_drive, wait_port)
+	ctx.obj["info"] = info
+	try:
+		selector = build_selector(name, serial, mount, select)
+	except SelectorError as ex:
+		echo(f"Invalid selector: {ex}", fg="red")
+		sys.exit(2)
+	ctx.obj["criteria"] = dict(auto=auto, selector=selector)
+	# only compute what the command uses
+	fields = None
+	if ctx.invoked_subcommand is not None:
+		command = main.get_command(ctx, ctx.invoked_subcommand)
+		if getattr(command.callback, "selects_later", False):
+			return
+		fields = getattr(command.callback, "device_fields", None)
+	select_the_devices(ctx, fields)
 	# here we exit and run the command, or if no command, go to repl
 	if ctx.invoked_subcommand is None:
 		if noCriteria:
@@ -347,6 +494,7 @@ def list_cli(ctx):
 
 @main.command()
 @click.pass_context
+@uses_fields("name", "serial_num", "ports")
 def repl(ctx):
 	"""
 	Connect to the REPL of the selected device.
@@ -376,12 +524,37 @@ def repl(ctx):
 
 
 @main.command()
+@click.option(
+	"--pipe", "-p",
+	is_flag=True,
+	help="Connect stdin and stdout to the DATA port instead of the serial tool.",
+)
+@click.option(
+	"--close-on-eof", "-e",
+	is_flag=True,
+	help="With --pipe, stop when stdin ends and the answer is read, instead of reading until Ctrl-C.",
+)
 @click.pass_context
-def data(ctx):
+@uses_fields("name", "serial_num", "ports")
+def data(ctx, pipe, close_on_eof):
 	"""
 	Connect to the DATA port of the selected device if any.
 	"""
 	selectedDevices = ctx.obj["selectedDevices"]
+	if pipe:
+		ports = [device.data for device in selectedDevices if device.data is not None]
+		if len(ports) == 0:
+			echo("No device with a data port selected.", fg="magenta", err=True)
+			sys.exit(1)
+		if len(ports) > 1:
+			echo(f"{len(ports)} devices selected, piping to the first one: {ports[0]}", fg="magenta", err=True)
+		from .pipe import pipe_port
+		stats = pipe_port(ports[0], close_on_eof=close_on_eof)
+		duration = max(stats.duration, 0.001)
+		echo(f"- {format_size(stats.bytes_in)} sent ({format_size(stats.bytes_in / duration)}/s), "
+			+ f"{format_size(stats.bytes_out)} received ({format_size(stats.bytes_out / duration)}/s) "
+			+ f"in {stats.duration:.1f}s", fg="green", err=True)
+		return
 	if conf['SERIALTOOL'].strip() == "":
 		echo("repl: No serial tool available, see documentation to set one.", fg="red")
 		sys.exit(1)
@@ -398,6 +571,7 @@ def data(ctx):
 
 @main.command()
 @click.pass_context
+@uses_fields("name", "volumes")
 def eject(ctx):
 	"""
 	Eject the disk volume(s) from the matching device (Mac only).
@@ -438,18 +612,55 @@ def eject(ctx):
 )
 @click.option(
 	"--format", "-f",
-	help="Format the backup name. {timestamp}, {device}, {drive}, {serial}"
+	help="Format the backup name. " + TEMPLATE_HELP
+)
+@click.option(
+	"--jobs", "-j",
+	default=4,
+	help="Number of boards backed up at the same time.",
+)
+@click.option(
+	"--checksum",
+	is_flag=True,
+	help="Compare the files with the previous backup by hash instead of size and modification time.",
+)
+@click.option(
+	"--store", "-s",
+	is_flag=True,
+	help="Save the files once in a content addressed store in the backup directory, and a snapshot of each drive.",
+)
+@click.option(
+	"--snapshot-only",
+	is_flag=True,
+	help="With --store, don't write the backup directories (see discotool store restore).",
+)
+@click.option(
+	"--archive", "-a",
+	type=click.Choice(["tar.gz", "tar.zst", "zip"]),
+	help="Stream the files of each drive into a compressed archive instead of a directory.",
 )
 @click.argument(
 	"sub_dir",
 	required=False,
 )
 @click.pass_context
-def backup(ctx, backup_dir, create, date, format, sub_dir):
+@uses_fields("name", "serial_num", "usb_location", "volumes")
+def backup(ctx, backup_dir, create, date, format, jobs, checksum, store, snapshot_only, archive, sub_dir):
 	"""
 	Backup copy of all (Circuipython) drives found.
+	Only the files changed since the previous backup are read from the boards.
 	"""
 	selectedDevices = ctx.obj["selectedDevices"]
+	if archive:
+		from .backup import check_archive_format
+		if store:
+			echo("--archive and --store can't be used together.", fg="red")
+			return
+		try:
+			check_archive_format(archive)
+		except ValueError as ex:
+			echo(str(ex), fg="red")
+			return
 	if create:
 		if not os.path.exists(backup_dir):
 			os.mkdir(backup_dir)
@@ -470,48 +681,571 @@ def backup(ctx, backup_dir, create, date, format, sub_dir):
 	if len(selectedDevices) == 0:
 		echo("No device selected.", fg="magenta")
 	else:
+		from .backup import backup_lanes, manifest_path
+		backup_store = None
+		if store:
+			from .store import BackupStore
+			backup_store = BackupStore(backup_dir)
 		echo("- BACKING UP ".ljust(conf['LINE_LENGTH'],"-"), fg="green", bold=True)
+		# one lane per board, its drives are copied one after the other
+		lanes = []
 		for device in selectedDevices:
 			if len(device['volumes']) == 0:
 				echo(f"No drive found for {device['name']}.", fg="magenta")
+			lane = []
 			for volume in device['volumes']:
 				volume_src = volume['mount_point']
 				volume_bootout = os.path.join(volume_src,"boot_out.txt")
 				# only backup circuitpython boards
 				if os.path.exists(volume_src) and os.path.exists(volume_bootout):
 					if format:
-						container_name = format.format(
-							drive=volume['name'],
-							timestamp=time.strftime("%Y%m%d-%H%M%S"),
-							device=device['name'],
-							serial=device['serial_num'],
-						)
+						container_name = format.format(**template_variables(device, volume))
 						container_name = re.sub(r"[^A-Za-z0-9-]","_",container_name).strip("_")
 					else:
 						container_name = re.sub(r"[^A-Za-z0-9]","_",device['name']).strip("_")
 						container_name += "_SN"+device['serial_num']
 						container_name += "_"+volume['name']
 					container = os.path.join(targetDir, container_name)
-					click.echo(f"Backing up {volume_src} to\n{container}")
-					shutil.copystat = NOCOPYSTAT
-					try:
-						shutil.copytree(
-							volume_src,
-							container,
-							ignore = SHUTIL_IGNORE,
-							dirs_exist_ok = True,
-						)
-					except shutil.Error as err:
-						print("There was an error, backup might be incomplete.")
-						traceback.print_exception(err)
-					shutil.copystat = COPYSTAT
+					if archive:
+						container += "." + archive
+					if store and snapshot_only:
+						container = None
+						click.echo(f"Backing up {volume_src} to the store")
+					else:
+						click.echo(f"Backing up {volume_src} to\n{container}")
+					# the manifest of the drive, whatever the name of the backup
+					drive_key = device['serial_num'] or device['usb_location']
+					drive_key = re.sub(r"[^A-Za-z0-9-]","_",f"{drive_key}_{volume['name']}")
+					lane.append({
+						"serial": device['serial_num'],
+						"source": volume_src,
+						"destination": container,
+						"manifest": manifest_path(backup_dir, drive_key),
+						"drive": drive_key,
+					})
 				else:
 					echo(f"{volume_src} is not a circuitpython board !", fg="red")
+			if lane:
+				lanes.append(lane)
+		# copy the boards concurrently
+		def backup_done(result):
+			source = result.job["source"]
+			echo(f"Done {source}: {result.files_copied} copied ({format_size(result.bytes_copied)}), {result.files_unchanged} unchanged, {result.duration:.1f}s", fg="cyan")
+			if archive and not result.errors:
+				echo(f"\tarchive {format_size(result.bytes_stored)}", fg="cyan")
+			if result.snapshot:
+				echo(f"\tsnapshot {result.job['drive']} {result.snapshot}, {format_size(result.bytes_stored)} new in the store", fg="cyan")
+			if result.errors:
+				echo("There was an error, backup might be incomplete.", fg="red")
+				for error in result.errors:
+					echo("\t" + error, fg="red")
+		start = time.monotonic()
+		results = backup_lanes(lanes, jobs, SHUTIL_IGNORE, checksum, backup_done, backup_store, archive)
+		duration = time.monotonic() - start
+		copied = sum(result.bytes_copied for result in results)
+		echo(f"- Backed up {len(results)} drives: "
+			+ f"{sum(result.files_copied for result in results)} files copied ({format_size(copied)}), "
+			+ f"{sum(result.files_unchanged for result in results)} unchanged, "
+			+ f"in {duration:.1f}s ({format_size(copied / max(duration, 0.001))}/s)",
+			fg="green", bold=True)
+
+
+@main.group()
+@selects_later
+def store():
+	"""
+	Manage the content addressed store of backup --store.
+	"""
+
+
+@store.command("list")
+@click.argument("backup_dir", type=click.Path(exists=True, file_okay=False))
+def store_list(backup_dir):
+	"""
+	List the snapshots of each drive in the store.
+	"""
+	from .store import BackupStore
+	backup_store = BackupStore(backup_dir)
+	for drive in backup_store.drives():
+		echo(drive, fg="cyan", bold=True)
+		for name in backup_store.snapshots(drive):
+			files = backup_store.load_snapshot(drive, name) or {}
+			size = sum(entry["size"] for entry in files.values())
+			count = sum(not entry.get("dir") for entry in files.values())
+			click.echo(f"\t{name}\t{count} files\t{format_size(size)}")
+
+
+@store.command("verify")
+@click.argument("backup_dir", type=click.Path(exists=True, file_okay=False))
+@click.option(
+	"--jobs", "-j",
+	default=4,
+	help="Number of files hashed at the same time.",
+)
+def store_verify(backup_dir, jobs):
+	"""
+	Check the content of the store against the hashes.
+	"""
+	from .store import BackupStore
+	backup_store = BackupStore(backup_dir)
+	start = time.monotonic()
+	checked, corrupted, missing = backup_store.verify(jobs)
+	for digest in corrupted:
+		echo(f"Corrupted: {backup_store.object_path(digest)}", fg="red")
+	for digest in missing:
+		echo(f"Missing: {backup_store.object_path(digest)}", fg="red")
+	color = "red" if corrupted or missing else "green"
+	echo(f"- Checked {checked} objects in {time.monotonic() - start:.1f}s: "
+		+ f"{len(corrupted)} corrupted, {len(missing)} missing", fg=color, bold=True)
+	if corrupted or missing:
+		sys.exit(1)
+
+
+@store.command("prune")
+@click.argument("backup_dir", type=click.Path(exists=True, file_okay=False))
+@click.option(
+	"--keep", "-k",
+	type=click.IntRange(min=1),
+	required=True,
+	help="Number of snapshots of each drive to keep.",
+)
+def store_prune(backup_dir, keep):
+	"""
+	Remove the old snapshots and the files that they alone used.
+	"""
+	from .store import BackupStore
+	backup_store = BackupStore(backup_dir)
+	snapshots, objects, freed = backup_store.prune(keep)
+	echo(f"- Removed {snapshots} snapshots and {objects} files, {format_size(freed)} freed", fg="green", bold=True)
+
+
+@store.command("restore")
+@click.argument("backup_dir", type=click.Path(exists=True, file_okay=False))
+@click.argument("drive")
+@click.argument("destination", type=click.Path(file_okay=False))
+@click.option(
+	"--snapshot",
+	help="Name of the snapshot to restore, the latest by default.",
+)
+def store_restore(backup_dir, drive, destination, snapshot):
+	"""
+	Copy the files of a snapshot of a drive to a directory (or a board).
+	"""
+	from .store import BackupStore
+	backup_store = BackupStore(backup_dir)
+	files = backup_store.load_snapshot(drive, snapshot)
+	if files is None:
+		echo(f"No snapshot found for {drive}.", fg="red")
+		sys.exit(1)
+	backup_store.materialize(files, destination, link=False)
+	count = sum(not entry.get("dir") for entry in files.values())
+	echo(f"- Restored {count} files to {destination}", fg="green", bold=True)
+
+
+@main.command()
+@click.argument("source", type=click.Path(exists=True, file_okay=False))
+@click.option(
+	"--jobs", "-j",
+	default=8,
+	help="Number of boards written at the same time.",
+)
+@click.option(
+	"--dry-run", "-n",
+	is_flag=True,
+	help="Only list the files that would be written.",
+)
+@click.pass_context
+@uses_fields("name", "serial_num", "volumes")
+def deploy(ctx, source, jobs, dry_run):
+	"""
+	Copy the files of a project to the selected boards, only the changes.
+	Libraries are written first and code.py last, to limit the reloads.
+	"""
+	selectedDevices = ctx.obj["selectedDevices"]
+	if len(selectedDevices) == 0:
+		echo("No device selected.", fg="magenta")
+		return
+	from .deploy import SourceTree, deploy_all
+	tree = SourceTree(source)
+	deploy_jobs = []
+	for device in selectedDevices:
+		if len(device['volumes']) == 0:
+			echo(f"No drive found for {device['name']}.", fg="magenta")
+		for volume in device['volumes']:
+			volume_src = volume['mount_point']
+			volume_bootout = os.path.join(volume_src,"boot_out.txt")
+			# only deploy to circuitpython boards
+			if os.path.exists(volume_src) and os.path.exists(volume_bootout):
+				deploy_jobs.append({
+					"serial": device['serial_num'],
+					"name": device['name'],
+					"destination": volume_src,
+				})
+				break
+	echo(f"- DEPLOYING {len(tree.files)} files to {len(deploy_jobs)} boards ".ljust(conf['LINE_LENGTH'],"-"), fg="green", bold=True)
+	def deploy_done(result):
+		job = result.job
+		verb = "to write" if dry_run else "written"
+		echo(f"{job['name']} ({job['destination']}): {len(result.changes)} {verb} ({format_size(sum(tree.files[relative].st_size for relative in result.changes))}), {result.files_unchanged} unchanged, {result.duration:.1f}s", fg="cyan")
+		if dry_run:
+			for relative in result.changes:
+				click.echo("\t" + relative)
+		for error in result.errors:
+			echo("\t" + error, fg="red")
+	start = time.monotonic()
+	results = deploy_all(tree, deploy_jobs, jobs, dry_run, deploy_done)
+	duration = time.monotonic() - start
+	written = sum(result.bytes_written for result in results)
+	echo(f"- Deployed to {len(results)} boards: "
+		+ f"{sum(result.files_written for result in results)} files written ({format_size(written)}), "
+		+ f"{sum(result.files_hashed for result in results)} compared by hash, "
+		+ f"in {duration:.1f}s", fg="green", bold=True)
+	if any(result.errors for result in results):
+		sys.exit(1)
+
+
+@main.command()
+@click.argument("source", type=click.Path(exists=True, file_okay=False))
+@click.option(
+	"--watch", "-w",
+	is_flag=True,
+	help="Keep watching the source and mirror the changes.",
+)
+@click.option(
+	"--debounce", "-d",
+	default=0.3,
+	type=click.FloatRange(min=0),
+	help="Wait for the files to be quiet for this long before writing (in seconds).",
+)
+@click.option(
+	"--jobs", "-j",
+	default=8,
+	help="Number of boards written at the same time.",
+)
+@click.option(
+	"--rescan",
+	is_flag=True,
+	help="Compare with the drives instead of trusting the index of the last sync.",
+)
+@click.pass_context
+@uses_fields("name", "serial_num", "usb_location", "volumes")
+def sync(ctx, source, watch, debounce, jobs, rescan):
+	"""
+	Mirror a project on the selected boards, including deletions and renames.
+	"""
+	selectedDevices = ctx.obj["selectedDevices"]
+	if len(selectedDevices) == 0:
+		echo("No device selected.", fg="magenta")
+		return
+	from .sync import BoardSync, index_path, sync_boards, tree_watcher, batches
+	boards = []
+	for device in selectedDevices:
+		for volume in device['volumes']:
+			volume_src = volume['mount_point']
+			volume_bootout = os.path.join(volume_src,"boot_out.txt")
+			# only sync circuitpython boards
+			if os.path.exists(volume_src) and os.path.exists(volume_bootout):
+				drive_key = device['serial_num'] or device['usb_location']
+				drive_key = re.sub(r"[^A-Za-z0-9-]","_",f"{drive_key}_{volume['name']}")
+				boards.append(BoardSync(source, {
+					"serial": device['serial_num'],
+					"name": device['name'],
+					"destination": volume_src,
+					"index": index_path(os.path.join(APPDIR, "sync"), source, drive_key),
+				}))
+				break
+		else:
+			echo(f"No drive found for {device['name']}.", fg="magenta")
+	if not boards:
+		return
+	def sync_done(result):
+		job = result.job
+		if result.files_written or result.deleted or result.moved:
+			echo(f"{job['name']} ({job['destination']}): {result.files_written} written ({format_size(result.bytes_written)}), {result.deleted} deleted, {result.moved} moved, {result.duration:.1f}s", fg="cyan")
+		for error in result.errors:
+			echo("\t" + error, fg="red")
+	echo(f"- SYNCING {source} to {len(boards)} boards ".ljust(conf['LINE_LENGTH'],"-"), fg="green", bold=True)
+	sync_boards(boards, lambda board: board.start(rescan), jobs, sync_done)
+	if not watch:
+		return
+	watcher = tree_watcher(source)
+	echo(f"- Watching {source} (Ctrl-C to stop)", fg="green", bold=True)
+	try:
+		for batch in batches(watcher, debounce):
+			sync_boards(boards, lambda board: board.apply(batch), jobs, sync_done)
+	except KeyboardInterrupt:
+		pass
+	finally:
+		watcher.close()
+
+
+@main.command()
+@click.argument("firmware", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+	"--timeout", "-t",
+	default=30,
+	type=click.FloatRange(min=0),
+	help="Time to wait for each board to show its boot drive (in seconds).",
+)
+@click.option(
+	"--jobs", "-j",
+	default=16,
+	help="Number of boards reset and written at the same time.",
+)
+@click.pass_context
+@uses_fields("name", "serial_num", "usb_location", "volumes", "ports")
+def flash(ctx, firmware, timeout, jobs):
+	"""
+	Install a UF2 firmware on the selected boards, all at the same time.
+	"""
+	selectedDevices = ctx.obj["selectedDevices"]
+	if len(selectedDevices) == 0:
+		echo("No device selected.", fg="magenta")
+		return
+	from .flash import flash_boards
+	echo(f"- Flashing {os.path.basename(firmware)} on {len(selectedDevices)} boards ".ljust(conf['LINE_LENGTH'],"-"), fg="green", bold=True)
+	def flash_done(result):
+		device = result.device
+		if result.ok:
+			echo(f"{device['name']} @ {result.location}: flashed {result.drive} in {result.duration:.1f}s", fg="cyan")
+		else:
+			echo(f"{device['name']} @ {result.location}: {result.error}", fg="red")
+	start = time.monotonic()
+	results = flash_boards(selectedDevices, firmware, timeout, jobs, flash_done)
+	# summary table
+	echo(f"- Flash summary ({time.monotonic() - start:.1f}s) ".ljust(conf['LINE_LENGTH'],"-"), fg="green", bold=True)
+	name_width = max(len(result.device['name']) for result in results)
+	location_width = max(len(result.location or "") for result in results)
+	click.echo(f"{'board'.ljust(name_width)}  {'location'.ljust(location_width)}  {'boot':>6}  {'copy':>6}  {'total':>6}")
+	for result in results:
+		line = f"{result.device['name'].ljust(name_width)}  {(result.location or '').ljust(location_width)}  "
+		line += f"{result.boot_time:5.1f}s  {result.copy_time:5.1f}s  {result.duration:5.1f}s  "
+		click.echo(line, nl=False)
+		if result.ok:
+			echo("OK", fg="green")
+		else:
+			echo("FAILED", fg="red")
+	failed = sum(not result.ok for result in results)
+	echo(f"{len(results) - failed} flashed, {failed} failed", fg="red" if failed else "green", bold=True)
+	if failed:
+		sys.exit(1)
+
+
+@main.command()
+@click.option(
+	"--data", "-d", "data_port",
+	is_flag=True,
+	help="Read the DATA ports instead of the REPL ports.",
+)
+@click.option(
+	"--timestamps/--no-timestamps", "-t/-T",
+	default=True,
+	help="Add the time to each line (on by default).",
+)
+@click.pass_context
+@uses_fields("name", "serial_num", "usb_location", "ports")
+def monitor(ctx, data_port, timestamps):
+	"""
+	Print the output of the selected boards' serial ports, line by line.
+	"""
+	selectedDevices = ctx.obj["selectedDevices"]
+	if len(selectedDevices) == 0:
+		echo("No device selected.", fg="magenta")
+		return
+	from .monitor import Port, monitor_lines
+	ports = []
+	for device in selectedDevices:
+		path = device.data if data_port else device.repl
+		if path is None:
+			echo(f"- No {'data' if data_port else 'REPL'} port for {device['name']}", fg="red")
+			continue
+		label = f"{device['name']} {device['serial_num'] or device['usb_location']}"
+		ports.append(Port(label, path))
+	if not ports:
+		return
+	def port_event(port, event):
+		echo(f"--- {port.label}: {event} ({port.path})", fg="cyan" if event == "connected" else "magenta", err=True)
+	echo(f"- Monitoring {len(ports)} ports (Ctrl-C to stop) ".ljust(conf['LINE_LENGTH'],"-"), fg="green", bold=True, err=True)
+	serial_monitor = monitor_lines(ports, sys.stdout.buffer, timestamps, port_event)
+	try:
+		serial_monitor.run()
+	except KeyboardInterrupt:
+		pass
+
+
+@main.command()
+@click.argument("directory", type=click.Path(file_okay=False))
+@click.option(
+	"--data", "-d", "data_port",
+	is_flag=True,
+	help="Record the DATA ports instead of the REPL ports.",
+)
+@click.option(
+	"--max-size", "-s",
+	default=100.0,
+	type=click.FloatRange(min=0),
+	help="Rotate the files at this size in MB (100 by default, 0 for no limit).",
+)
+@click.option(
+	"--max-age", "-a",
+	default=0,
+	type=click.IntRange(min=0),
+	help="Rotate the files after this many seconds (0 for no limit).",
+)
+@click.option(
+	"--compress", "-z",
+	type=click.Choice(["gz", "xz"]),
+	help="Compress the rotated files.",
+)
+@click.pass_context
+@uses_fields("name", "serial_num", "usb_location", "ports")
+def capture(ctx, directory, data_port, max_size, max_age, compress):
+	"""
+	Record the serial output of the selected boards, one file per board.
+	"""
+	selectedDevices = ctx.obj["selectedDevices"]
+	if len(selectedDevices) == 0:
+		echo("No device selected.", fg="magenta")
+		return
+	from .monitor import Port, SerialMonitor
+	from .capture import Capture, PortResolver
+	os.makedirs(directory, exist_ok=True)
+	recorder = Capture(directory, int(max_size * 1024 * 1024), max_age, compress)
+	resolver = PortResolver(data_port, selectedDevices)
+	role = "data" if data_port else "repl"
+	ports = []
+	for device in selectedDevices:
+		path = device.data if data_port else device.repl
+		if path is None:
+			echo(f"- No {role} port for {device['name']}", fg="red")
+			continue
+		identity = usbinfos.device_identity(device)
+		port = Port(device['name'], path, lambda identity=identity: resolver.port(identity))
+		name = re.sub(r"[^A-Za-z0-9-]","_",f"{device['serial_num'] or device['usb_location']}_{role}")
+		capture_file = recorder.add(port, name)
+		click.echo(f"{device['name']}: {path} -> {capture_file.path}")
+		ports.append(port)
+	if not ports:
+		return
+	def port_event(port, event):
+		recorder.event(port, event)
+		echo(f"--- {port.label}: {event} ({port.path})", fg="cyan" if event == "connected" else "magenta", err=True)
+	echo(f"- Recording {len(ports)} ports in {directory} (Ctrl-C to stop) ".ljust(conf['LINE_LENGTH'],"-"), fg="green", bold=True, err=True)
+	serial_monitor = SerialMonitor(ports, recorder.handler, port_event, recorder.tick)
+	start = time.monotonic()
+	resolver.start()
+	try:
+		serial_monitor.run()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		resolver.close()
+		recorder.close()
+	duration = time.monotonic() - start
+	total = sum(port.bytes_read for port in ports)
+	echo(f"- Recorded {format_size(total)} in {duration:.0f}s", fg="green", bold=True, err=True)
+
+
+@main.command()
+@click.argument("payload")
+@click.option(
+	"--template", "-f",
+	is_flag=True,
+	help="Format the payload for each board, with {index} (the position of the board), " + TEMPLATE_HELP,
+)
+@click.option(
+	"--no-newline", "-N",
+	is_flag=True,
+	help="Don't add a new line at the end of the payload.",
+)
+@click.option(
+	"--reply", "-r",
+	is_flag=True,
+	help="Read the reply of each board until the delimiter or the timeout.",
+)
+@click.option(
+	"--delimiter", "-d",
+	default="\\n",
+	help="End of the replies (a new line by default), empty to read until the timeout.",
+)
+@click.option(
+	"--timeout", "-t",
+	default=1.0,
+	type=click.FloatRange(min=0),
+	help="Time to wait for each reply (in seconds).",
+)
+@click.option(
+	"--jobs", "-j",
+	default=64,
+	help="Number of boards written at the same time.",
+)
+@click.pass_context
+@selects_later
+def broadcast(ctx, payload, template, no_newline, reply, delimiter, timeout, jobs):
+	"""
+	Send the payload to the DATA ports of the selected boards, all at once.
+	Escape sequences like \\n or \\x00 are decoded.
+	"""
+	fields = ["name", "serial_num", "ports"]
+	if template:
+		# for {drive} and {mount}
+		fields.append("volumes")
+	selectedDevices = select_the_devices(ctx, fields)
+	if len(selectedDevices) == 0:
+		echo("No device selected.", fg="magenta")
+		return
+	from .broadcast import broadcast as broadcast_payload, template_payload, unescape
+	if not no_newline:
+		payload += "\n"
+	if template:
+		payload_template = template_payload(payload)
+		payload = lambda device, index: unescape(payload_template(device, index))
+	else:
+		payload = unescape(payload)
+	echo(f"- Sending to {len(selectedDevices)} boards ".ljust(conf['LINE_LENGTH'],"-"), fg="green", bold=True)
+	def broadcast_done(result):
+		device = result.device
+		name = f"{device['name']} {device['serial_num'] or device['usb_location']}"
+		if not result.ok:
+			echo(f"{name}: {result.error}", fg="red")
+		elif reply:
+			text = result.reply.decode("utf-8", errors="replace").rstrip("\r\n")
+			echo(f"{name}: {result.latency * 1000:.1f}ms: ", fg="cyan", nl=False)
+			click.echo(text)
+		else:
+			echo(f"{name}: sent {format_size(len(result.payload))} in {result.latency * 1000:.1f}ms", fg="cyan")
+	start = time.monotonic()
+	results = broadcast_payload(selectedDevices, payload, reply, unescape(delimiter), timeout, jobs, broadcast_done)
+	# summary table
+	echo(f"- Broadcast summary ({time.monotonic() - start:.2f}s) ".ljust(conf['LINE_LENGTH'],"-"), fg="green", bold=True)
+	name_width = max(len(result.device['name']) for result in results)
+	serial_width = max(len(result.device['serial_num'] or "") for result in results)
+	click.echo(f"{'board'.ljust(name_width)}  {'serial'.ljust(serial_width)}  {'offset':>9}  {'latency':>9}  {'reply':>9}")
+	for result in results:
+		line = f"{result.device['name'].ljust(name_width)}  {(result.device['serial_num'] or '').ljust(serial_width)}  "
+		line += f"{result.offset * 1000:7.1f}ms  {result.latency * 1000:7.1f}ms  "
+		line += f"{format_size(len(result.reply)) if result.reply is not None else '-':>9}  "
+		click.echo(line, nl=False)
+		if result.ok:
+			echo("OK", fg="green")
+		else:
+			echo("FAILED", fg="red")
+	sent = [result for result in results if result.ok]
+	if sent:
+		latencies = [result.latency * 1000 for result in sent]
+		offsets = [result.offset * 1000 for result in sent]
+		click.echo(f"latency min {min(latencies):.1f}ms, average {sum(latencies) / len(latencies):.1f}ms, "
+			+ f"max {max(latencies):.1f}ms, writes spread over {max(offsets) - min(offsets):.1f}ms")
+	failed = len(results) - len(sent)
+	echo(f"{len(sent)} sent, {failed} failed", fg="red" if failed else "green", bold=True)
+	if failed:
+		sys.exit(1)
 
 
 @main.command(aliases=['cu'], context_settings={"ignore_unknown_options":True})
 @click.argument("circup_options", nargs=-1)
 @click.pass_context
+@uses_fields("name", "serial_num", "volumes")
 def circup(ctx, circup_options):
 	"""
 	Call circup on the selected device with the given options.
@@ -520,8 +1254,8 @@ def circup(ctx, circup_options):
 	if len(selectedDevices) == 0:
 		echo("No device selected.", fg="magenta")
 		return
+	jobs = []
 	for device in selectedDevices:
-		device_name = device['name']
 		if len(device['volumes']) == 0:
 			echo(f"No drive found for {device['name']}.", fg="magenta")
 		for volume in device['volumes']:
@@ -529,18 +1263,73 @@ def circup(ctx, circup_options):
 			volume_bootout = os.path.join(volume_src,"boot_out.txt")
 			# only circup circuitpython boards
 			if os.path.exists(volume_src) and os.path.exists(volume_bootout):
-				command = [conf['CIRCUP'], "--path", volume_src]
-				command += [x for x in circup_options]
-				echo(f"- Running circup on {device_name} ".ljust(conf['LINE_LENGTH'],"-"), fg="cyan", bold=True)
-				echo("> ", bold=True, nl=False)
-				click.echo(" ".join(command))
-				subprocess.run(" ".join(command), shell=True)
+				jobs.append({
+					"serial": device['serial_num'],
+					"name": device['name'],
+					"drive": volume_src,
+					"span": "command.circup",
+				})
 				break
+	circup_options = list(circup_options)
+	# several boards get no input: update all the modules without asking
+	if len(jobs) > 1 and "update" in circup_options and "--all" not in circup_options:
+		circup_options.insert(circup_options.index("update") + 1, "--all")
+	for job in jobs:
+		job["command"] = " ".join([conf['CIRCUP'], "--path", job["drive"]] + circup_options)
+	# one board: run it in the terminal, it can ask questions
+	if len(jobs) == 1:
+		job = jobs[0]
+		echo(f"- Running circup on {job['name']} ".ljust(conf['LINE_LENGTH'],"-"), fg="cyan", bold=True)
+		echo("> ", bold=True, nl=False)
+		click.echo(job['command'])
+		with span("command.circup", serial=job['serial'], command=job['command']) as trace:
+			process = subprocess.run(job['command'], shell=True)
+			trace["returncode"] = process.returncode
+			if process.returncode != 0:
+				trace["outcome"] = "error"
+		return
+	if not jobs:
+		return
+	from .fleet import run_all, prefix_lines
+	echo(f"- Running circup on {len(jobs)} boards ".ljust(conf['LINE_LENGTH'],"-"), fg="cyan", bold=True)
+	echo("> ", bold=True, nl=False)
+	click.echo(" ".join([conf['CIRCUP'], "--path", "{drive}"] + circup_options))
+	def circup_done(result):
+		job = result.job
+		prefix = f"[{os.path.basename(job['drive'])} {job['serial']}] "
+		color = "green" if result.ok else "red"
+		echo(f"{prefix}done in {result.duration:.1f}s, exit code {result.returncode}", fg=color, bold=True)
+		click.echo(prefix_lines(prefix, result.output), nl=False)
+		if result.error:
+			echo(prefix + result.error, fg="red")
+	start = time.monotonic()
+	# the first board alone fills the bundle cache of circup, the others
+	# would all download the bundles at the same time
+	results = run_all(jobs[:1], 1, circup_done)
+	results += run_all(jobs[1:], conf['CIRCUP_JOBS'], circup_done)
+	# summary table
+	echo(f"- Circup summary ({time.monotonic() - start:.1f}s) ".ljust(conf['LINE_LENGTH'],"-"), fg="cyan", bold=True)
+	name_width = max(len(result.job['name']) for result in results)
+	serial_width = max(len(result.job['serial']) for result in results)
+	drive_width = max(len(result.job['drive']) for result in results)
+	for result in results:
+		job = result.job
+		line = f"{job['name'].ljust(name_width)}  {job['serial'].ljust(serial_width)}  {job['drive'].ljust(drive_width)}  {result.duration:6.1f}s  "
+		click.echo(line, nl=False)
+		if result.ok:
+			echo("OK", fg="green")
+		else:
+			echo(f"FAILED ({result.returncode})", fg="red")
+	failed = sum(not result.ok for result in results)
+	echo(f"{len(results) - failed} succeeded, {failed} failed", fg="red" if failed else "green", bold=True)
+	if failed:
+		sys.exit(1)
 
 
 @main.command(context_settings={"ignore_unknown_options":True})
 @click.argument("circup_options", nargs=-1)
 @click.pass_context
+@uses_fields("name", "serial_num", "volumes")
 def install(ctx, circup_options):
 	"""
 	Call circup install on the selected device with the given options.
@@ -552,6 +1341,7 @@ def install(ctx, circup_options):
 @main.command(context_settings={"ignore_unknown_options":True})
 @click.argument("circup_options", nargs=-1)
 @click.pass_context
+@uses_fields("name", "serial_num", "volumes")
 def update(ctx, circup_options):
 	"""
 	Call circup update on the selected device with the given options.
@@ -565,41 +1355,97 @@ def update(ctx, circup_options):
 	"--yes", "-y", "--all", "-a",
 	is_flag=True, help="Always accept deleting without asking."
 )
+@click.option(
+	"--dry-run", "-n",
+	is_flag=True,
+	help="Only list the files that would be deleted.",
+)
+@click.option(
+	"--pattern", "-p", "patterns",
+	multiple=True,
+	help="Name pattern of the files to delete, instead of ._* .DS_Store .Trashes (repeatable).",
+)
+@click.option(
+	"--jobs", "-j",
+	default=8,
+	help="Number of drives cleaned at the same time.",
+)
 @click.pass_context
-def cleanup(ctx, yes):
+@uses_fields("name", "serial_num", "volumes")
+def cleanup(ctx, yes, dry_run, patterns, jobs):
 	"""
-	Remove unwanted files from selected drives (macOS's ._* files).
+	Remove the files left by macOS (._*, .DS_Store, .Trashes) or matching
+	the given patterns from the selected drives.
 	"""
 	selectedDevices = ctx.obj["selectedDevices"]
 	if len(selectedDevices) == 0:
 		echo("No device selected.", fg="magenta")
-	else:
-		echo("- CLEANING FILES ".ljust(conf['LINE_LENGTH'],"-"), fg="green", bold=True)
-		for device in selectedDevices:
-			if len(device['volumes']) == 0:
-				echo(f"No drive found for {device['name']}.", fg="magenta")
-			for volume in device['volumes']:
-				try:
-					volume_src = volume['mount_point']
-					volume_bootout = os.path.join(volume_src,"boot_out.txt")
-					# only cleanup circuitpython boards
-					if os.path.exists(volume_src) and os.path.exists(volume_bootout):
-						echo(f"Cleanup on drive: {volume_src}",fg="cyan")
-						# erase all "._*" files
-						tree_clean(volume_src, yes)
-					else:
-						echo(f"{volume_src} is not a circuitpython board !", fg="red")
-				except click.exceptions.Abort:
-					return
-				except Exception as ex:
-					if yes:
-						echo("An error occurred, skipping drive:", fg="red")
-						echo("\t", str(ex), fg="red")
+		return
+	from .cleanup import DEFAULT_PATTERNS, find_all, remove_all
+	echo("- CLEANING FILES ".ljust(conf['LINE_LENGTH'],"-"), fg="green", bold=True)
+	cleanup_jobs = []
+	for device in selectedDevices:
+		if len(device['volumes']) == 0:
+			echo(f"No drive found for {device['name']}.", fg="magenta")
+		for volume in device['volumes']:
+			volume_src = volume['mount_point']
+			volume_bootout = os.path.join(volume_src,"boot_out.txt")
+			# only cleanup circuitpython boards
+			if os.path.exists(volume_src) and os.path.exists(volume_bootout):
+				cleanup_jobs.append({
+					"serial": device['serial_num'],
+					"source": volume_src,
+				})
+			else:
+				echo(f"{volume_src} is not a circuitpython board !", fg="red")
+	# collect everything first
+	find_all(cleanup_jobs, patterns or DEFAULT_PATTERNS, jobs)
+	total = 0
+	total_size = 0
+	for job in cleanup_jobs:
+		if "error" in job:
+			echo(f"Error reading {job['source']}: {job['error']}", fg="red")
+		candidates = job["candidates"]
+		size = sum(candidate.size for candidate in candidates)
+		total += len(candidates)
+		total_size += size
+		echo(f"Cleanup on drive: {job['source']}: {len(candidates)} to delete ({format_size(size)})", fg="cyan")
+		if dry_run:
+			for candidate in candidates:
+				click.echo("\t" + candidate.path + (os.sep if candidate.is_dir else ""))
+	cleanup_jobs = [job for job in cleanup_jobs if job["candidates"]]
+	if dry_run or total == 0:
+		return
+	if not yes and not click.confirm(f"Delete {total} files ({format_size(total_size)}) on {len(cleanup_jobs)} drives ?"):
+		return
+	def cleanup_done(result):
+		echo(f"Cleaned {result.job['source']}: {result.removed} deleted, {result.duration:.1f}s", fg="cyan")
+		for error in result.errors:
+			echo("\t" + error, fg="red")
+	results = remove_all(cleanup_jobs, jobs, cleanup_done)
+	if any(result.errors for result in results):
+		sys.exit(1)
 
 
+# the fields used by the special keys of get
+GET_KEY_FIELDS = {
+	"volume": ("volumes",),
+	"port": ("ports",),
+	"repl": ("ports",),
+	"console": ("ports",),
+	"cdc2": ("ports",),
+	"data": ("ports",),
+	"vid": ("vendor_id",),
+	"pid": ("product_id",),
+	"sn": ("serial_num",),
+	"main": ("volumes",),
+	"code.py": ("volumes",),
+}
+
 @main.command()
 @click.argument("key", required=True)
 @click.pass_context
+@selects_later
 def get(ctx, key):
 	"""
 	Get value for the key sparated by a new line for each device.
@@ -613,7 +1459,11 @@ def get(ctx, key):
 	
 	Example: screen `discotool -n clue get port`
 	"""
-	selectedDevices = ctx.obj["selectedDevices"]
+	if key in usbinfos.FIELDS:
+		fields = (key,)
+	else:
+		fields = GET_KEY_FIELDS.get(key)
+	selectedDevices = select_the_devices(ctx, fields)
 	values = []
 	for device in selectedDevices:
 		if key in device:
@@ -669,7 +1519,119 @@ def json_cli(ctx,pretty):
 	selectedDevices = ctx.obj["selectedDevices"]
 	if pretty: indent = 2
 	else: indent = None
-	click.echo(json.dumps(selectedDevices,indent=indent))
+	if ctx.obj.get("timings"):
+		output = {
+			"devices": selectedDevices,
+			"timings": usbinfos.last_scan_stats(),
+		}
+	else:
+		output = selectedDevices
+	click.echo(json.dumps(output,indent=indent))
+
+
+@main.command()
+@click.option(
+	"--port", "-p",
+	default=0,
+	help="Serve the metrics over HTTP on this port of localhost.",
+)
+@click.option(
+	"--textfile", "-t",
+	default="",
+	help="Write the metrics into this file (for the node exporter textfile collector).",
+)
+@click.option(
+	"--interval", "-i",
+	default=10.0,
+	help="Seconds between scans.",
+)
+@click.pass_context
+@uses_fields("vendor_id", "product_id", "serial_num", "usb_location", "ports", "volumes")
+def metrics(ctx, port, textfile, interval):
+	"""
+	Scan the selected boards at regular intervals and export metrics in the Prometheus format.
+	"""
+	from .metrics import Metrics
+	if not port and not textfile:
+		echo("metrics: give a --port and/or a --textfile.", fg="red")
+		sys.exit(2)
+	board_metrics = Metrics()
+	if port:
+		board_metrics.serve(port)
+		echo(f"Serving metrics on http://127.0.0.1:{port}/metrics", fg="cyan")
+	try:
+		while True:
+			board_metrics.observe_scan(
+				ctx.obj["selectedDevices"],
+				ctx.obj["remainingPorts"],
+				usbinfos.last_scan_stats(),
+			)
+			if textfile:
+				board_metrics.write_textfile(textfile)
+			time.sleep(interval)
+			scan_the_devices(ctx)
+	except KeyboardInterrupt:
+		pass
+
+
+@main.command()
+@click.option(
+	"--debounce", "-d",
+	default=0.5,
+	help="Seconds without changes before scanning, to coalesce bursts into one event per board.",
+)
+@click.option(
+	"--exec", "-x", "exec_commands",
+	multiple=True,
+	help="Command to run when a board is added. Template variables: " + TEMPLATE_HELP + ", {event}.",
+)
+@click.option(
+	"--hook",
+	multiple=True,
+	nargs=3,
+	help="EVENT SELECTOR COMMAND: run the command when a board starts matching the selector (added), stops matching it (removed), or changes while matching it (changed). An empty selector matches all.",
+)
+@click.option(
+	"--workers", "-j",
+	default=4,
+	help="Maximum number of hooks running at the same time (they run one at a time for a board).",
+)
+@click.pass_context
+@selects_later
+def watch(ctx, debounce, exec_commands, hook, workers):
+	"""
+	Print a JSON line for each board added, removed or changed, run hooks.
+	"""
+	import asyncio
+	from .hooks import HookRunner
+	criteria = ctx.obj["criteria"]
+	output_lock = threading.Lock()
+	def print_event(event):
+		with output_lock:
+			click.echo(json.dumps(dict(time=time.time(), **event)))
+	runner = HookRunner(workers=workers, report=print_event)
+	try:
+		for command in exec_commands:
+			runner.add(command)
+		for event, selector, command in hook:
+			runner.add(command, selector, event)
+	except (ValueError, SelectorError) as ex:
+		echo(f"Invalid hook: {ex}", fg="red")
+		sys.exit(2)
+	async def print_events():
+		events = usbinfos.watch(
+			drive_info=ctx.obj["info"],
+			selector=criteria["selector"],
+			debounce=debounce,
+		)
+		async for event in events:
+			print_event(event)
+			runner.dispatch(event)
+	try:
+		asyncio.run(print_events())
+		runner.close()
+	except KeyboardInterrupt:
+		runner.close(wait=False)
 
 
 @main.command()
@@ -685,6 +1647,7 @@ def version():
 @click.argument("key", required=False, default=None)
 @click.argument("value", required=False, default=None)
 @click.pass_context
+@selects_later
 def alias(ctx, key, value):
 	"""
 	Create or call an alias.
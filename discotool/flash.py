@@ -0,0 +1,162 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Install a UF2 firmware on the boards, for discotool flash.
+
+All the boards are reset into the UF2 bootloader at once (a 1200 baud
+"touch" of their serial port), then followed by their USB location while
+they come back as a boot drive: the devices are scanned again each time
+the hotplug monitor sees a change. The UF2 is copied to each boot drive
+as soon as it appears, on a pool of workers, and synced to the drive.
+Boards that are already in the bootloader are copied to right away.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .usbinfos import get_identified_devices, hotplug_monitor
+from .usbinfos.usbinfos_trace import span
+
+FLASH_FIELDS = ("name", "serial_num", "usb_location", "volumes")
+DEFAULT_TIMEOUT = 30
+DEFAULT_WORKERS = 16
+RESET_BAUDRATE = 1200
+# the file that identifies a UF2 bootloader drive
+BOOT_INFO = "INFO_UF2.TXT"
+COPY_CHUNK = 64 * 1024
+
+
+class FlashResult:
+	def __init__(self, device):
+		self.device = device
+		self.location = device['usb_location']
+		self.drive = None
+		self.error = None
+		# seconds from the reset to the boot drive, copying the firmware
+		self.boot_time = 0
+		self.copy_time = 0
+		self.duration = 0
+		self.start = time.monotonic()
+
+	@property
+	def ok(self):
+		return self.error is None
+
+
+def boot_drive(device):
+	"""
+	The mount point of the UF2 bootloader drive of the device, or None.
+	"""
+	for volume in device['volumes']:
+		mount = volume['mount_point']
+		if mount and os.path.exists(os.path.join(mount, BOOT_INFO)):
+			return mount
+	return None
+
+
+def reset_to_bootloader(port):
+	import serial
+	serial.Serial(port, RESET_BAUDRATE).close()
+
+
+def copy_firmware(firmware, drive):
+	target = os.path.join(drive, os.path.basename(firmware))
+	with open(firmware, "rb") as source, open(target, "wb") as destination:
+		while True:
+			chunk = source.read(COPY_CHUNK)
+			if not chunk:
+				break
+			destination.write(chunk)
+		destination.flush()
+		try:
+			os.fsync(destination.fileno())
+		except OSError:
+			# the board restarts as soon as it has the whole file
+			pass
+
+
+def flash_boards(devices, firmware, timeout=DEFAULT_TIMEOUT, workers=DEFAULT_WORKERS, done=None):
+	"""
+	Flash the firmware on the devices, done(result) is called as each one
+	ends (one at a time). Returns the results in the order of the devices.
+	"""
+	results = [FlashResult(device) for device in devices]
+	lock = threading.Lock()
+	def finish(result):
+		result.duration = time.monotonic() - result.start
+		with lock:
+			if done is not None:
+				done(result)
+	def copy(result):
+		start = time.monotonic()
+		with span("flash.copy", serial=result.device['serial_num'], drive=result.drive) as trace:
+			try:
+				copy_firmware(firmware, result.drive)
+			except OSError as ex:
+				result.error = str(ex)
+				trace["outcome"] = "error"
+		result.copy_time = time.monotonic() - start
+		finish(result)
+	def reset(result):
+		with span("flash.reset", serial=result.device['serial_num'], port=result.device.repl):
+			try:
+				reset_to_bootloader(result.device.repl)
+			except Exception as ex:
+				result.error = f"reset failed: {ex}"
+
+	pool = ThreadPoolExecutor(max_workers=workers)
+	copies = []
+	waiting = {}
+	try:
+		to_reset = []
+		for result in results:
+			result.drive = boot_drive(result.device)
+			if result.drive:
+				copies.append(pool.submit(copy, result))
+			elif not result.location:
+				result.error = "no USB location to follow the board"
+			elif result.location in waiting:
+				result.error = "same USB location as another board"
+			elif not result.device.repl:
+				result.error = "no serial port to reset the board"
+			else:
+				waiting[result.location] = result
+				to_reset.append(result)
+		for result in results:
+			if result.error:
+				finish(result)
+		# reset everything at once
+		list(pool.map(reset, to_reset))
+		for result in to_reset:
+			if result.error:
+				del waiting[result.location]
+				finish(result)
+		monitor = hotplug_monitor()
+		deadline = time.monotonic() + timeout
+		try:
+			while waiting:
+				for device in get_identified_devices(fields=FLASH_FIELDS):
+					result = waiting.get(device['usb_location'])
+					drive = boot_drive(device)
+					if result is None or drive is None:
+						continue
+					del waiting[result.location]
+					result.drive = drive
+					result.boot_time = time.monotonic() - result.start
+					copies.append(pool.submit(copy, result))
+				remaining = deadline - time.monotonic()
+				if not waiting or remaining <= 0:
+					break
+				monitor.wait(min(1, remaining))
+		finally:
+			monitor.close()
+		for result in waiting.values():
+			result.error = f"no boot drive after {timeout}s"
+			finish(result)
+		for future in copies:
+			future.result()
+	finally:
+		pool.shutdown()
+	return results
@@ -0,0 +1,95 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Run a command for each board concurrently (circup, install, update).
+run_lanes() is the runner of all the commands working on several boards.
+
+The commands run on a bounded pool of workers. Their output (stdout and
+stderr) is buffered and given back whole when the command ends, so that
+the outputs of the boards are not mixed. They get no input: a command
+that asks a question fails instead of waiting forever.
+"""
+
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .usbinfos.usbinfos_trace import span
+
+DEFAULT_WORKERS = 4
+
+
+class CommandResult:
+	def __init__(self, job):
+		self.job = job
+		self.returncode = None
+		self.output = ""
+		self.error = None
+		self.duration = 0
+
+	@property
+	def ok(self):
+		return self.returncode == 0
+
+
+def run_command(job):
+	"""
+	Run job["command"] with the shell, capture its output.
+	"""
+	result = CommandResult(job)
+	start = time.monotonic()
+	with span(job.get("span", "command.run"), serial=job["serial"], command=job["command"]) as trace:
+		try:
+			process = subprocess.run(
+				job["command"],
+				shell=True,
+				stdin=subprocess.DEVNULL,
+				stdout=subprocess.PIPE,
+				stderr=subprocess.STDOUT,
+			)
+			result.returncode = process.returncode
+			result.output = process.stdout.decode("utf-8", errors="replace")
+		except OSError as ex:
+			result.error = str(ex)
+		trace["returncode"] = result.returncode
+		if not result.ok:
+			trace["outcome"] = "error"
+	result.duration = time.monotonic() - start
+	return result
+
+
+def prefix_lines(prefix, text):
+	"""
+	The text with the prefix at the start of each line.
+	"""
+	return "".join(prefix + line + "\n" for line in text.splitlines())
+
+
+def run_lanes(lanes, function, workers=DEFAULT_WORKERS, done=None):
+	"""
+	Run function(job) for the lists of jobs (usually one per board), the
+	lanes concurrently and the jobs of a lane one after the other.
+	done(result) is called when each job ends (one at a time).
+	Returns the results in the order of the lanes and of their jobs.
+	"""
+	lock = threading.Lock()
+	def run_lane(lane):
+		results = []
+		for job in lane:
+			result = function(job)
+			with lock:
+				if done is not None:
+					done(result)
+			results.append(result)
+		return results
+	with ThreadPoolExecutor(max_workers=workers) as pool:
+		return [result for results in pool.map(run_lane, lanes) for result in results]
+
+
+def run_all(jobs, workers=DEFAULT_WORKERS, done=None):
+	"""
+	Run the commands of the jobs concurrently, done(result) is called when
+	each one ends (one at a time). Returns the results in the jobs order.
+	"""
+	return run_lanes([[job] for job in jobs], run_command, workers, done)
@@ -0,0 +1,157 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Hooks run on the events of discotool watch (see usbinfos.watch).
+
+A hook is a selector, an event and an action: a command line run with the
+shell (a template, see templates) or a Python callable given the event.
+- "added": a board starts matching the selector (it was plugged in, or
+  its drive was just mounted for "drive=CIRCUITPY").
+- "removed": a board stops matching the selector.
+- "changed": a board that matches the selector changed.
+
+The hooks run on a bounded pool of workers. The runs for a board are
+serialized: one after the other, and a hook that is already waiting to
+run for that board is not queued again (a board that resets twice while
+its hook runs gets one more run, not two).
+"""
+
+import collections
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .usbinfos import device_identity, Selector
+from .usbinfos.usbinfos_trace import span
+from .templates import template_variables
+
+HOOK_EVENTS = ("added", "removed", "changed")
+DEFAULT_WORKERS = 4
+
+
+def format_command(template, device, event):
+	"""
+	The command of a hook for a device, the values are quoted for the shell.
+	"""
+	variables = template_variables(device)
+	variables["event"] = event
+	if sys.platform != "win32":
+		variables = {key: shlex.quote(str(value)) for key, value in variables.items()}
+	return template.format(**variables)
+
+
+class Hook:
+	def __init__(self, action, selector=None, event="added"):
+		if event not in HOOK_EVENTS:
+			raise ValueError(f"Unknown hook event: {event}")
+		if isinstance(selector, str):
+			selector = Selector(selector) if selector.strip() else None
+		self.action = action
+		self.selector = selector
+		self.event = event
+		# the boards matching the selector
+		self.matching = set()
+
+	def trigger(self, event):
+		"""
+		Follow the device events, return the event of the hook (or None).
+		"""
+		device = event["device"]
+		identity = device_identity(device)
+		was = identity in self.matching
+		matches = event["event"] != "removed" and (
+			self.selector is None or self.selector.match(device))
+		if matches:
+			self.matching.add(identity)
+		else:
+			self.matching.discard(identity)
+		if matches and not was:
+			return "added"
+		if was and not matches:
+			return "removed"
+		if matches and event["event"] == "changed":
+			return "changed"
+		return None
+
+
+class HookRunner:
+	"""
+	Dispatch the device events to the hooks, run them on the workers.
+	report(result) is called with the result of each run, output is where
+	the commands print (stderr by default).
+	"""
+	def __init__(self, workers=DEFAULT_WORKERS, report=None, output=None):
+		self.hooks = []
+		self.report = report
+		self.output = output or sys.stderr
+		self.pool = ThreadPoolExecutor(max_workers=workers)
+		self.lock = threading.Lock()
+		self.queues = {}
+
+	def add(self, action, selector=None, event="added"):
+		hook = Hook(action, selector, event)
+		self.hooks.append(hook)
+		return hook
+
+	def dispatch(self, event):
+		for hook in self.hooks:
+			if hook.trigger(event) == hook.event:
+				self._queue(hook, dict(event, event=hook.event))
+
+	def _queue(self, hook, event):
+		key = device_identity(event["device"])
+		with self.lock:
+			queue = self.queues.setdefault(key, collections.deque())
+			# the first one is running, the others are waiting
+			if any(waiting is hook for waiting, _ in list(queue)[1:]):
+				return
+			queue.append((hook, event))
+			if len(queue) == 1:
+				self.pool.submit(self._drain, key)
+
+	def _drain(self, key):
+		while True:
+			with self.lock:
+				hook, event = self.queues[key][0]
+			self._run(hook, event)
+			with self.lock:
+				queue = self.queues[key]
+				queue.popleft()
+				if not queue:
+					del self.queues[key]
+					return
+
+	def _run(self, hook, event):
+		device = event["device"]
+		result = {
+			"event": "hook",
+			"hook": event["event"],
+			"serial": device['serial_num'],
+		}
+		start = time.monotonic()
+		with span("command.hook", serial=device['serial_num'], event=event["event"]) as trace:
+			try:
+				if callable(hook.action):
+					hook.action(event)
+					result["returncode"] = 0
+				else:
+					command = format_command(hook.action, device, event["event"])
+					result["command"] = command
+					trace["command"] = command
+					process = subprocess.run(command, shell=True, stdout=self.output)
+					result["returncode"] = process.returncode
+			except Exception as ex:
+				result["returncode"] = None
+				result["error"] = repr(ex)
+			if result["returncode"] != 0:
+				trace["outcome"] = "error"
+				trace["returncode"] = result["returncode"]
+		result["duration"] = time.monotonic() - start
+		if self.report is not None:
+			self.report(result)
+
+	def close(self, wait=True):
+		self.pool.shutdown(wait=wait)
@@ -0,0 +1,152 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Metrics of the boards found on the host in the Prometheus text format,
+served over HTTP on localhost or written to a file for the textfile
+collector of the node exporter.
+
+- discotool_boards_present{vid,pid}: boards present by VID/PID.
+- discotool_unknown_serial_ports: serial ports not attributed to a board.
+- discotool_scans_total: number of scans.
+- discotool_scan_duration_seconds{phase}: histogram of the scan phases
+  (see usbinfos_stats) and of the whole scan (phase="total").
+- discotool_hotplug_events_total{event}: boards "added" and "removed"
+  between two scans.
+- discotool_drive_probe_timeouts_total: drives that did not answer in time.
+"""
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .backup import temp_file
+from .usbinfos import device_identity
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+	def __init__(self, buckets=DURATION_BUCKETS):
+		self.buckets = buckets
+		self.counts = [0] * len(buckets)
+		self.count = 0
+		self.sum = 0
+
+	def observe(self, value):
+		for index, bound in enumerate(self.buckets):
+			if value <= bound:
+				self.counts[index] += 1
+		self.count += 1
+		self.sum += value
+
+
+def _labels(**labels):
+	return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+class Metrics:
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.boards = {}
+		self.unknown_ports = 0
+		self.scans = 0
+		self.durations = {}
+		self.events = {"added": 0, "removed": 0}
+		self.probe_timeouts = 0
+		self.previous = None
+
+	def observe_scan(self, deviceList, remainingPorts, stats=None):
+		"""
+		Update the metrics with the result of a scan and its stats.
+		"""
+		with self.lock:
+			self.scans += 1
+			self.boards = {}
+			for device in deviceList:
+				key = (device['vendor_id'], device['product_id'])
+				self.boards[key] = self.boards.get(key, 0) + 1
+			self.unknown_ports = len(remainingPorts)
+			identities = set(device_identity(device) for device in deviceList)
+			if self.previous is not None:
+				self.events["added"] += len(identities - self.previous)
+				self.events["removed"] += len(self.previous - identities)
+			self.previous = identities
+			if stats is not None:
+				phases = dict(stats['phases'], total=stats['total'])
+				for phase, duration in phases.items():
+					self.durations.setdefault(phase, Histogram()).observe(duration)
+				self.probe_timeouts += stats['counters'].get('drive_timeouts', 0)
+
+	def render(self):
+		"""
+		The metrics in the Prometheus text exposition format.
+		"""
+		lines = []
+		with self.lock:
+			lines.append("# HELP discotool_boards_present Boards present by VID/PID.")
+			lines.append("# TYPE discotool_boards_present gauge")
+			for (vid, pid), number in sorted(self.boards.items()):
+				labels = _labels(vid=f"{vid:04x}", pid=f"{pid:04x}")
+				lines.append(f"discotool_boards_present{labels} {number}")
+			lines.append("# HELP discotool_unknown_serial_ports Serial ports not attributed to a board.")
+			lines.append("# TYPE discotool_unknown_serial_ports gauge")
+			lines.append(f"discotool_unknown_serial_ports {self.unknown_ports}")
+			lines.append("# HELP discotool_scans_total Scans of the USB devices.")
+			lines.append("# TYPE discotool_scans_total counter")
+			lines.append(f"discotool_scans_total {self.scans}")
+			lines.append("# HELP discotool_scan_duration_seconds Duration of the phases of the scans.")
+			lines.append("# TYPE discotool_scan_duration_seconds histogram")
+			for phase, histogram in sorted(self.durations.items()):
+				for bound, number in zip(histogram.buckets, histogram.counts):
+					labels = _labels(phase=phase, le=bound)
+					lines.append(f"discotool_scan_duration_seconds_bucket{labels} {number}")
+				labels = _labels(phase=phase, le="+Inf")
+				lines.append(f"discotool_scan_duration_seconds_bucket{labels} {histogram.count}")
+				labels = _labels(phase=phase)
+				lines.append(f"discotool_scan_duration_seconds_sum{labels} {histogram.sum}")
+				lines.append(f"discotool_scan_duration_seconds_count{labels} {histogram.count}")
+			lines.append("# HELP discotool_hotplug_events_total Boards added or removed between scans.")
+			lines.append("# TYPE discotool_hotplug_events_total counter")
+			for event, number in self.events.items():
+				lines.append(f"discotool_hotplug_events_total{_labels(event=event)} {number}")
+			lines.append("# HELP discotool_drive_probe_timeouts_total Drives that did not answer in time.")
+			lines.append("# TYPE discotool_drive_probe_timeouts_total counter")
+			lines.append(f"discotool_drive_probe_timeouts_total {self.probe_timeouts}")
+		return "\n".join(lines) + "\n"
+
+	def write_textfile(self, path):
+		"""
+		Write the metrics atomically, for the node exporter textfile collector.
+		"""
+		temp_path = temp_file(path)
+		try:
+			with open(temp_path, "w") as fp:
+				fp.write(self.render())
+			# mkstemp makes it private, the node exporter must read it
+			os.chmod(temp_path, 0o644)
+			os.replace(temp_path, path)
+		except OSError:
+			os.remove(temp_path)
+			raise
+
+	def serve(self, port, host="127.0.0.1"):
+		"""
+		Serve the metrics over HTTP from a background thread.
+		"""
+		metrics = self
+		class Handler(BaseHTTPRequestHandler):
+			def do_GET(self):
+				body = metrics.render().encode("utf-8")
+				self.send_response(200)
+				self.send_header("Content-Type", CONTENT_TYPE)
+				self.send_header("Content-Length", str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, *args):
+				pass
+		server = ThreadingHTTPServer((host, port), Handler)
+		thread = threading.Thread(target=server.serve_forever, daemon=True)
+		thread.start()
+		return server
@@ -0,0 +1,242 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Read the serial ports of many boards at once, for discotool monitor and
+discotool capture.
+
+On posix systems the ports are opened non blocking in raw mode and read
+by a single selectors loop, in large chunks (no thread per port). On
+windows each port is read by a thread with pyserial.
+
+A port that stops answering (the board resets, the device disappears)
+is closed and opened again every RECONNECT_INTERVAL, from the path given
+by its resolve function (the same path by default).
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+
+RECONNECT_INTERVAL = 1
+READ_SIZE = 64 * 1024
+# the title bar of Circuitpython (OSC sequences)
+TITLE_SEQUENCE = re.compile(rb"\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)")
+
+
+class Port:
+	"""
+	A serial port followed by the monitor. resolve() returns the current
+	path of the port (or None if it's not there), to follow it on reconnect.
+	"""
+	def __init__(self, label, path, resolve=None):
+		self.label = label
+		self.path = path
+		self.resolve = resolve or (lambda: self.path)
+		self.handle = None
+		self.retry = 0
+		self.bytes_read = 0
+
+	@property
+	def connected(self):
+		return self.handle is not None
+
+
+class LineSplitter:
+	"""
+	Cut the data of a port into lines, keep the end until it's complete.
+	"""
+	def __init__(self, strip_title=True):
+		self.partial = bytearray()
+		self.strip_title = strip_title
+
+	def feed(self, data):
+		self.partial += data
+		end = self.partial.rfind(b"\n")
+		if end < 0:
+			return []
+		lines = bytes(self.partial[:end]).split(b"\n")
+		del self.partial[:end + 1]
+		if self.strip_title:
+			lines = [TITLE_SEQUENCE.sub(b"", line) for line in lines]
+		return [line.rstrip(b"\r") for line in lines]
+
+	def flush(self):
+		return self.feed(b"\n") if self.partial else []
+
+
+def open_raw(path):
+	import termios
+	import tty
+	fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+	try:
+		# TCSANOW: keep what the board sent before the port was opened
+		tty.setraw(fd, termios.TCSANOW)
+		attributes = termios.tcgetattr(fd)
+		# ignore the modem lines, the board has no carrier
+		attributes[2] |= termios.CLOCAL
+		termios.tcsetattr(fd, termios.TCSANOW, attributes)
+	except termios.error:
+		# not a tty (a pipe or a file in tests)
+		pass
+	return fd
+
+
+class SerialMonitor:
+	"""
+	Read the ports, calling handler(port, data, timestamp) with each chunk
+	read (timestamp with time.time()) and event(port, "connected" or
+	"disconnected") when a port opens or closes. tick() is called at least
+	every RECONNECT_INTERVAL, from the same thread as the handler.
+	"""
+	def __init__(self, ports, handler, event=None, tick=None):
+		self.ports = list(ports)
+		self.handler = handler
+		self.event = event or (lambda port, name: None)
+		self.tick = tick or (lambda: None)
+		self.stopping = threading.Event()
+		self.lock = threading.Lock()
+
+	def stop(self):
+		self.stopping.set()
+
+	def _connect(self, port):
+		port.retry = time.monotonic() + RECONNECT_INTERVAL
+		path = port.resolve()
+		if path is None:
+			return False
+		try:
+			if sys.platform == "win32":
+				import serial
+				port.handle = serial.Serial(path, timeout=0.1)
+			else:
+				port.handle = open_raw(path)
+		except Exception:
+			return False
+		port.path = path
+		with self.lock:
+			self.event(port, "connected")
+		return True
+
+	def _disconnect(self, port, notify=True):
+		try:
+			if sys.platform == "win32":
+				port.handle.close()
+			else:
+				os.close(port.handle)
+		except Exception:
+			pass
+		port.handle = None
+		port.retry = time.monotonic() + RECONNECT_INTERVAL
+		if notify:
+			with self.lock:
+				self.event(port, "disconnected")
+
+	def run(self, duration=None):
+		"""
+		Read until stop() is called, or for duration seconds.
+		"""
+		deadline = None if duration is None else time.monotonic() + duration
+		try:
+			if sys.platform == "win32":
+				self._run_threads(deadline)
+			else:
+				self._run_selector(deadline)
+		finally:
+			for port in self.ports:
+				if port.connected:
+					self._disconnect(port, notify=False)
+
+	def _run_selector(self, deadline):
+		import selectors
+		selector = selectors.DefaultSelector()
+		for port in self.ports:
+			if self._connect(port):
+				selector.register(port.handle, selectors.EVENT_READ, port)
+		while not self.stopping.is_set():
+			now = time.monotonic()
+			if deadline is not None and now >= deadline:
+				break
+			for port in self.ports:
+				if not port.connected and now >= port.retry:
+					if self._connect(port):
+						selector.register(port.handle, selectors.EVENT_READ, port)
+			timeout = RECONNECT_INTERVAL
+			if deadline is not None:
+				timeout = max(0, min(timeout, deadline - now))
+			self.tick()
+			if not selector.get_map():
+				self.stopping.wait(timeout)
+				continue
+			for key, _ in selector.select(timeout):
+				port = key.data
+				try:
+					data = os.read(port.handle, READ_SIZE)
+				except BlockingIOError:
+					continue
+				except OSError:
+					data = b""
+				if not data:
+					# EOF or EIO: the device is gone
+					selector.unregister(port.handle)
+					self._disconnect(port)
+					continue
+				port.bytes_read += len(data)
+				self.handler(port, data, time.time())
+		selector.close()
+
+	def _run_threads(self, deadline):
+		def read(port):
+			while not self.stopping.is_set():
+				if not port.connected:
+					if not self._connect(port):
+						self.stopping.wait(RECONNECT_INTERVAL)
+						continue
+				try:
+					data = port.handle.read(max(1, port.handle.in_waiting))
+				except Exception:
+					self._disconnect(port)
+					continue
+				if data:
+					port.bytes_read += len(data)
+					with self.lock:
+						self.handler(port, data, time.time())
+		threads = [threading.Thread(target=read, args=(port,), daemon=True)
+			for port in self.ports]
+		for thread in threads:
+			thread.start()
+		while not self.stopping.is_set():
+			timeout = RECONNECT_INTERVAL
+			if deadline is not None:
+				timeout = min(timeout, deadline - time.monotonic())
+				if timeout <= 0:
+					break
+			self.stopping.wait(timeout)
+			with self.lock:
+				self.tick()
+		self.stopping.set()
+		for thread in threads:
+			thread.join()
+
+
+def monitor_lines(ports, output, timestamps=True, event=None):
+	"""
+	A SerialMonitor writing the lines of the ports to the binary stream
+	output, prefixed with the label of the port (and the time).
+	"""
+	splitters = {}
+	width = max((len(port.label) for port in ports), default=0)
+	def handler(port, data, timestamp):
+		splitter = splitters.setdefault(id(port), LineSplitter())
+		lines = splitter.feed(data)
+		if not lines:
+			return
+		prefix = f"[{port.label.ljust(width)}] "
+		if timestamps:
+			prefix = time.strftime("%H:%M:%S", time.localtime(timestamp)) + f".{int(timestamp * 1000) % 1000:03d} " + prefix
+		prefix = prefix.encode()
+		output.write(b"".join(prefix + line + b"\n" for line in lines))
+		output.flush()
+	return SerialMonitor(ports, handler, event)
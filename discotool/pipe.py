@@ -0,0 +1,162 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Connect stdin and stdout to a serial port, for discotool data --pipe.
+
+The bytes are moved as they are (no decoding, no lines) through two
+buffers allocated once: read into them with readv/readinto and written
+from memoryviews. On posix a single select loop moves both directions,
+the port is non blocking so a direction that can't be written doesn't
+stop the other one. On windows a thread per direction uses pyserial.
+
+With close_on_eof, when the input ends the port is still read until it
+has been quiet for DRAIN_TIMEOUT, to get the answer to the last bytes.
+"""
+
+import os
+import select
+import sys
+import threading
+import time
+from .monitor import open_raw
+
+BUFFER_SIZE = 256 * 1024
+DRAIN_TIMEOUT = 0.5
+
+
+class PipeStats:
+	def __init__(self):
+		self.bytes_in = 0
+		self.bytes_out = 0
+		self.start = time.monotonic()
+		self.duration = 0
+
+
+def _write_all(fd, view):
+	while len(view):
+		written = os.write(fd, view)
+		view = view[written:]
+
+
+def _pipe_posix(path, input_fd, output_fd, close_on_eof, stats):
+	port = open_raw(path)
+	to_port = bytearray(BUFFER_SIZE)
+	to_port_view = memoryview(to_port)
+	from_port = bytearray(BUFFER_SIZE)
+	from_port_view = memoryview(from_port)
+	# the part of to_port not written to the port yet
+	pending_start = pending_end = 0
+	input_open = True
+	try:
+		while True:
+			readers = [port]
+			writers = []
+			timeout = None
+			if pending_start < pending_end:
+				writers.append(port)
+			elif input_open:
+				readers.append(input_fd)
+			elif close_on_eof:
+				# everything is sent, read the answer until it stops
+				timeout = DRAIN_TIMEOUT
+			readable, writable, _ = select.select(readers, writers, [], timeout)
+			if timeout is not None and not readable:
+				break
+			if input_fd in readable:
+				count = os.readv(input_fd, [to_port])
+				if count == 0:
+					input_open = False
+				pending_start, pending_end = 0, count
+				stats.bytes_in += count
+			if port in writable:
+				try:
+					pending_start += os.write(port, to_port_view[pending_start:pending_end])
+				except BlockingIOError:
+					pass
+			if port in readable:
+				try:
+					count = os.readv(port, [from_port])
+				except BlockingIOError:
+					continue
+				except OSError:
+					# EIO: the board is gone
+					break
+				if count == 0:
+					break
+				_write_all(output_fd, from_port_view[:count])
+				stats.bytes_out += count
+	finally:
+		os.close(port)
+
+
+def _pipe_threads(path, input_fd, output_fd, close_on_eof, stats):
+	import serial
+	port = serial.Serial(path, timeout=0.1)
+	done = threading.Event()
+	last_read = time.monotonic()
+	def to_port():
+		nonlocal last_read
+		buffer = bytearray(BUFFER_SIZE)
+		view = memoryview(buffer)
+		with os.fdopen(input_fd, "rb", buffering=0, closefd=False) as source:
+			while not done.is_set():
+				count = source.readinto(buffer)
+				if not count:
+					break
+				port.write(view[:count])
+				stats.bytes_in += count
+		if close_on_eof:
+			port.flush()
+			last_read = time.monotonic()
+			# read the answer until it stops
+			while not done.wait(0.1):
+				if time.monotonic() - last_read >= DRAIN_TIMEOUT:
+					done.set()
+	def from_port():
+		nonlocal last_read
+		buffer = bytearray(BUFFER_SIZE)
+		view = memoryview(buffer)
+		try:
+			while not done.is_set():
+				count = port.readinto(view[:max(1, min(port.in_waiting, BUFFER_SIZE))])
+				if count:
+					last_read = time.monotonic()
+					_write_all(output_fd, view[:count])
+					stats.bytes_out += count
+		finally:
+			done.set()
+	threading.Thread(target=to_port, daemon=True).start()
+	reader = threading.Thread(target=from_port, daemon=True)
+	reader.start()
+	try:
+		while not done.wait(0.5):
+			pass
+	finally:
+		done.set()
+		reader.join()
+		port.close()
+
+
+def pipe_port(path, input_fd=None, output_fd=None, close_on_eof=False):
+	"""
+	Copy input_fd (stdin) to the serial port and the port to output_fd
+	(stdout) until the port closes, or with close_on_eof until the input
+	ends and the port is quiet for DRAIN_TIMEOUT.
+	Returns the PipeStats.
+	"""
+	if input_fd is None:
+		input_fd = sys.stdin.fileno()
+	if output_fd is None:
+		output_fd = sys.stdout.fileno()
+	stats = PipeStats()
+	try:
+		if sys.platform == "win32":
+			_pipe_threads(path, input_fd, output_fd, close_on_eof, stats)
+		else:
+			_pipe_posix(path, input_fd, output_fd, close_on_eof, stats)
+	except (KeyboardInterrupt, BrokenPipeError):
+		pass
+	finally:
+		stats.duration = time.monotonic() - stats.start
+	return stats
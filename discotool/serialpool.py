@@ -0,0 +1,261 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Long lived connections to the serial ports of the boards, by serial
+number and role ("repl" or "data"), shared between threads.
+
+	from discotool import serialpool
+	port = serialpool.get("DF6...", "data")
+	port.write(b"hello\\n")
+	with port:
+		# hold the port for a question and its answer
+		port.write(b"ping\\n")
+		answer = port.readline()
+
+Opening a port takes time and toggles DTR, which can reset some boards:
+the connections stay open. A thread follows the hotplug events and closes
+the connection of a board whose port changed (it reset and came back
+under a new name), it's opened again on the next use. A read or write
+that fails is retried once on the new port. Where there are no hotplug
+events (polling), refresh() does the same.
+"""
+
+import threading
+import time
+from .usbinfos import get_identified_devices, hotplug_monitor
+
+POOL_FIELDS = ("serial_num", "ports")
+ROLES = ("repl", "data")
+RESCAN_INTERVAL = 0.5
+DEFAULT_TIMEOUT = 1
+
+
+class SerialConnection:
+	"""
+	A connection to a port of a board, opened when first used.
+	Each method holds the lock of the connection, use "with connection:"
+	to keep it for several calls.
+	"""
+	def __init__(self, pool, serial_num, role, baudrate=115200, timeout=DEFAULT_TIMEOUT):
+		self.pool = pool
+		self.serial_num = serial_num
+		self.role = role
+		self.baudrate = baudrate
+		self.timeout = timeout
+		self.path = None
+		self.port = None
+		self.lock = threading.RLock()
+
+	def __enter__(self):
+		self.lock.acquire()
+		return self
+
+	def __exit__(self, *args):
+		self.lock.release()
+
+	@property
+	def is_open(self):
+		return self.port is not None
+
+	def open(self, rescan=False):
+		import serial
+		with self.lock:
+			if self.port is not None:
+				return
+			try:
+				self._open(rescan)
+			except (serial.SerialException, OSError):
+				if rescan:
+					raise
+				# the port may come from an older scan, look for it again
+				self._open(True)
+
+	def _open(self, rescan):
+		import serial
+		path = self.pool.port_of(self.serial_num, self.role, rescan)
+		if path is None:
+			raise ConnectionError(f"No {self.role} port for {self.serial_num}")
+		self.port = serial.Serial(path, self.baudrate, timeout=self.timeout, write_timeout=self.timeout)
+		self.path = path
+
+	def close(self):
+		with self.lock:
+			if self.port is not None:
+				try:
+					self.port.close()
+				except Exception:
+					pass
+			self.port = None
+
+	def _call(self, method, *args):
+		import serial
+		with self.lock:
+			self.open()
+			try:
+				return getattr(self.port, method)(*args)
+			except (serial.SerialException, OSError):
+				# the board went away, try its new port once
+				self.close()
+				self.open(rescan=True)
+				return getattr(self.port, method)(*args)
+
+	def write(self, data):
+		return self._call("write", data)
+
+	def flush(self):
+		return self._call("flush")
+
+	def _call_timeout(self, timeout, method, *args):
+		# the timeout of the port for one call
+		if timeout is None:
+			return self._call(method, *args)
+		with self.lock:
+			self.open()
+			self.port.timeout = timeout
+			try:
+				return self._call(method, *args)
+			finally:
+				if self.port is not None:
+					self.port.timeout = self.timeout
+
+	def read(self, size=1, timeout=None):
+		return self._call_timeout(timeout, "read", size)
+
+	def readline(self, timeout=None):
+		return self._call_timeout(timeout, "readline")
+
+	def read_until(self, expected=b"\n", size=None, timeout=None):
+		return self._call_timeout(timeout, "read_until", expected, size)
+
+	def reset_input_buffer(self):
+		return self._call("reset_input_buffer")
+
+	@property
+	def in_waiting(self):
+		return self._call("inWaiting")
+
+
+def _ports_of(devices):
+	ports = {}
+	for device in devices:
+		if device['serial_num']:
+			ports[(device['serial_num'], "repl")] = device.repl
+			ports[(device['serial_num'], "data")] = device.data
+	return ports
+
+
+class SerialPool:
+	"""
+	The connections by (serial number, role). The ports of the boards come
+	from a scan shared by all the connections, made again when a port is
+	not found (at most every RESCAN_INTERVAL) and on the hotplug events.
+	The ports of devices already scanned by the caller are used first.
+	"""
+	def __init__(self, baudrate=115200, timeout=DEFAULT_TIMEOUT, follow_hotplug=True, devices=()):
+		self.baudrate = baudrate
+		self.timeout = timeout
+		self.connections = {}
+		self.ports = _ports_of(devices)
+		self.scanned = None
+		self.lock = threading.Lock()
+		self.closing = threading.Event()
+		self.thread = None
+		if follow_hotplug:
+			self.thread = threading.Thread(target=self._follow_hotplug, daemon=True)
+			self.thread.start()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def get(self, serial_num, role="data"):
+		"""
+		The connection to the port of the board with that serial number.
+		"""
+		if role not in ROLES:
+			raise ValueError(f"Unknown port role: {role}")
+		with self.lock:
+			key = (serial_num, role)
+			if key not in self.connections:
+				self.connections[key] = SerialConnection(self, serial_num, role, self.baudrate, self.timeout)
+			return self.connections[key]
+
+	def _scan(self):
+		ports = _ports_of(get_identified_devices(fields=POOL_FIELDS))
+		self.ports = ports
+		self.scanned = time.monotonic()
+		return ports
+
+	def port_of(self, serial_num, role, rescan=False):
+		"""
+		The current path of the port of a board, or None.
+		"""
+		with self.lock:
+			path = self.ports.get((serial_num, role))
+			recent = self.scanned is not None and time.monotonic() - self.scanned < RESCAN_INTERVAL
+			if (rescan or path is None) and not recent:
+				path = self._scan().get((serial_num, role))
+			return path
+
+	def refresh(self):
+		"""
+		Scan the devices and close the connections whose port changed, they
+		are opened again when used. Called on the hotplug events.
+		"""
+		with self.lock:
+			ports = self._scan()
+			connections = list(self.connections.items())
+		for key, connection in connections:
+			if connection.is_open and ports.get(key) != connection.path:
+				connection.close()
+
+	def _follow_hotplug(self):
+		monitor = hotplug_monitor()
+		try:
+			while not self.closing.is_set():
+				if not monitor.wait(1) or self.closing.is_set():
+					continue
+				try:
+					self.refresh()
+				except Exception:
+					pass
+		finally:
+			monitor.close()
+
+	def close(self):
+		self.closing.set()
+		with self.lock:
+			connections = list(self.connections.values())
+			self.connections = {}
+		for connection in connections:
+			connection.close()
+		if self.thread is not None and self.thread is not threading.current_thread():
+			self.thread.join()
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+def get(serial_num, role="data"):
+	"""
+	A connection from the pool shared by the program.
+	"""
+	global _default_pool
+	with _default_lock:
+		if _default_pool is None:
+			_default_pool = SerialPool()
+	return _default_pool.get(serial_num, role)
+
+
+def close():
+	"""
+	Close the connections of the shared pool.
+	"""
+	global _default_pool
+	with _default_lock:
+		if _default_pool is not None:
+			_default_pool.close()
+			_default_pool = None
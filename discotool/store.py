@@ -0,0 +1,256 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Content addressed store of the backups of the boards (backup --store),
+in .discotool/store/ in the backup directory.
+
+- objects/ab/cdef...: the content of each file, once, named by its sha256.
+  The same lib/ on many boards is stored once.
+- snapshots/<drive>/<timestamp>.json: each backup of a drive, the size,
+  modification time and hash of its files, and its directories (entries
+  with "dir", without hash) so that the empty ones are restored.
+
+A file is only read from the board if its size or modification time
+changed since the last snapshot of the drive (or its hash with checksum),
+it is hashed while it is copied into the store. The backup directory of the board is then
+materialized with hard links to the objects (read only), or the snapshot
+can be restored later with discotool store restore.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .backup import BackupResult, walk_tree, file_hash, save_manifest, temp_file, HASH_CHUNK, DEFAULT_WORKERS
+
+STORE_DIR = os.path.join(".discotool", "store")
+
+
+class BackupStore:
+	def __init__(self, backup_dir):
+		self.root = os.path.join(backup_dir, STORE_DIR)
+		self.objects = os.path.join(self.root, "objects")
+		self.snapshots_dir = os.path.join(self.root, "snapshots")
+
+	def object_path(self, digest):
+		return os.path.join(self.objects, digest[:2], digest[2:])
+
+	def add_file(self, path):
+		"""
+		Copy a file into the store while hashing it.
+		Returns its hash and True if it was not in the store yet.
+		"""
+		temp_dir = os.path.join(self.root, "tmp")
+		os.makedirs(temp_dir, exist_ok=True)
+		temp_path = temp_file(os.path.join(temp_dir, "object"))
+		digest = hashlib.sha256()
+		try:
+			with open(path, "rb") as source, open(temp_path, "wb") as target:
+				for chunk in iter(lambda: source.read(HASH_CHUNK), b""):
+					digest.update(chunk)
+					target.write(chunk)
+			object_path = self.object_path(digest.hexdigest())
+			if os.path.exists(object_path):
+				os.remove(temp_path)
+				return digest.hexdigest(), False
+			os.makedirs(os.path.dirname(object_path), exist_ok=True)
+			# the objects are linked into the backups, don't edit them there
+			os.chmod(temp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+			os.replace(temp_path, object_path)
+			return digest.hexdigest(), True
+		except OSError:
+			if os.path.exists(temp_path):
+				os.remove(temp_path)
+			raise
+
+	############################################################
+	# snapshots
+	############################################################
+	def drives(self):
+		if not os.path.isdir(self.snapshots_dir):
+			return []
+		return sorted(os.listdir(self.snapshots_dir))
+
+	def snapshots(self, drive):
+		"""
+		The names of the snapshots of a drive, oldest first.
+		"""
+		directory = os.path.join(self.snapshots_dir, drive)
+		if not os.path.isdir(directory):
+			return []
+		return sorted(name[:-len(".json")] for name in os.listdir(directory)
+			if name.endswith(".json"))
+
+	def load_snapshot(self, drive, name=None):
+		"""
+		The files of a snapshot (the latest by default), None if there is none.
+		"""
+		if name is None:
+			names = self.snapshots(drive)
+			if not names:
+				return None
+			name = names[-1]
+		path = os.path.join(self.snapshots_dir, drive, name + ".json")
+		try:
+			with open(path, "r") as fp:
+				return json.load(fp)["files"]
+		except (OSError, ValueError, KeyError):
+			return None
+
+	def save_snapshot(self, drive, files):
+		directory = os.path.join(self.snapshots_dir, drive)
+		os.makedirs(directory, exist_ok=True)
+		name = time.strftime("%Y%m%d-%H%M%S")
+		suffix = 1
+		while os.path.exists(os.path.join(directory, name + ".json")):
+			name = time.strftime("%Y%m%d-%H%M%S") + f"-{suffix}"
+			suffix += 1
+		path = os.path.join(directory, name + ".json")
+		save_manifest(path, files)
+		return name
+
+	############################################################
+	# backup and restore
+	############################################################
+	def backup_drive(self, job, ignore=None, checksum=False):
+		"""
+		Store the files of the drive job["source"] as a new snapshot of
+		job["drive"], materialize it in job["destination"] if given.
+		With checksum the files are compared by hash, not modification time.
+		"""
+		result = BackupResult(job)
+		start = time.monotonic()
+		source = job["source"]
+		previous = self.load_snapshot(job["drive"]) or {}
+		files = {}
+		for relative, is_dir in walk_tree(source, ignore):
+			if is_dir:
+				files[relative] = {"size": 0, "dir": True}
+				continue
+			source_file = os.path.join(source, relative)
+			try:
+				file_stat = os.stat(source_file)
+				old = previous.get(relative)
+				if old is None or "hash" not in old or old["size"] != file_stat.st_size:
+					unchanged = False
+				elif checksum:
+					unchanged = old["hash"] == file_hash(source_file)
+				else:
+					unchanged = old["mtime"] == file_stat.st_mtime
+				if unchanged and os.path.exists(self.object_path(old["hash"])):
+					digest = old["hash"]
+					result.files_unchanged += 1
+				else:
+					digest, added = self.add_file(source_file)
+					result.files_copied += 1
+					result.bytes_copied += file_stat.st_size
+					if added:
+						result.bytes_stored += file_stat.st_size
+				files[relative] = {
+					"size": file_stat.st_size,
+					"mtime": file_stat.st_mtime,
+					"hash": digest,
+				}
+			except OSError as ex:
+				result.errors.append(f"{relative}: {ex}")
+		result.snapshot = self.save_snapshot(job["drive"], files)
+		if job.get("destination"):
+			self.materialize(files, job["destination"], link=True)
+		result.duration = time.monotonic() - start
+		return result
+
+	def materialize(self, files, destination, link=True):
+		"""
+		Write the files of a snapshot into destination, as hard links to the
+		objects, or as copies (to restore onto a board).
+		"""
+		for relative, entry in files.items():
+			target = os.path.join(destination, relative)
+			if entry.get("dir"):
+				os.makedirs(target, exist_ok=True)
+				continue
+			object_path = self.object_path(entry["hash"])
+			os.makedirs(os.path.dirname(target), exist_ok=True)
+			if os.path.exists(target):
+				if os.path.samefile(object_path, target):
+					continue
+				os.remove(target)
+			if link:
+				try:
+					os.link(object_path, target)
+					continue
+				except OSError:
+					pass
+			shutil.copyfile(object_path, target)
+
+	############################################################
+	# maintenance
+	############################################################
+	def referenced(self):
+		"""
+		The hashes used by the snapshots.
+		"""
+		digests = set()
+		for drive in self.drives():
+			for name in self.snapshots(drive):
+				files = self.load_snapshot(drive, name) or {}
+				digests.update(entry["hash"] for entry in files.values() if "hash" in entry)
+		return digests
+
+	def stored(self):
+		"""
+		The hashes of the objects in the store.
+		"""
+		if not os.path.isdir(self.objects):
+			return []
+		return [prefix + name
+			for prefix in sorted(os.listdir(self.objects))
+			for name in sorted(os.listdir(os.path.join(self.objects, prefix)))]
+
+	def verify(self, workers=DEFAULT_WORKERS):
+		"""
+		Hash the objects concurrently. Returns the number of objects checked,
+		the corrupted objects, and the objects missing from the snapshots.
+		"""
+		stored = self.stored()
+		def check(digest):
+			hasher = hashlib.sha256()
+			with open(self.object_path(digest), "rb") as fp:
+				for chunk in iter(lambda: fp.read(HASH_CHUNK), b""):
+					hasher.update(chunk)
+			return hasher.hexdigest() == digest
+		with ThreadPoolExecutor(max_workers=workers) as pool:
+			valid = list(pool.map(check, stored))
+		corrupted = [digest for digest, ok in zip(stored, valid) if not ok]
+		missing = sorted(self.referenced() - set(stored))
+		return len(stored), corrupted, missing
+
+	def prune(self, keep):
+		"""
+		Keep the last snapshots of each drive and remove the objects that
+		are not used anymore. Returns the number of snapshots and objects
+		removed and the bytes freed (not counting the backup directories
+		still linked to them).
+		"""
+		snapshots_removed = 0
+		for drive in self.drives():
+			names = self.snapshots(drive)
+			for name in names[:max(0, len(names) - keep)]:
+				os.remove(os.path.join(self.snapshots_dir, drive, name + ".json"))
+				snapshots_removed += 1
+		referenced = self.referenced()
+		objects_removed = 0
+		freed = 0
+		for digest in self.stored():
+			if digest not in referenced:
+				path = self.object_path(digest)
+				file_stat = os.stat(path)
+				if file_stat.st_nlink == 1:
+					freed += file_stat.st_size
+				os.remove(path)
+				objects_removed += 1
+		return snapshots_removed, objects_removed, freed
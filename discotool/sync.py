@@ -0,0 +1,475 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Mirror a project on the drives of the boards while it is edited, for
+discotool sync --watch.
+
+The source tree is watched with inotify on linux (with ctypes), by
+polling elsewhere. The events are collected until the tree is quiet for
+the debounce delay (an editor saving writes temporary files, renames...)
+then the batch is applied to every board at once: renames as renames on
+the drive, then deletions, then the writes (lib/ first, code.py last, see
+deploy), so that the board reloads once per batch.
+
+An index per board and source (in the discotool data directory) records
+the state of the source files last written to the board. At startup only
+the source is compared to it, the drive is not read, unless there is no
+index or rescan is asked.
+"""
+
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import select
+import shutil
+import struct
+import sys
+import time
+from .backup import walk_files, save_manifest
+from .deploy import deploy_order, _write_file, SourceTree, _changed
+from .fleet import run_lanes
+from .usbinfos.usbinfos_trace import span
+
+DEFAULT_DEBOUNCE = 0.3
+POLL_INTERVAL = 0.5
+SYNC_IGNORE = shutil.ignore_patterns(
+	"._*", ".DS_Store", ".git", "__pycache__",
+	# editors' temporary files
+	"*.swp", "*.swx", "*~", ".#*", "4913",
+)
+
+
+def ignored(relative, ignore=SYNC_IGNORE):
+	"""
+	True if a component of the relative path is ignored.
+	"""
+	directory = ""
+	for name in relative.split(os.sep):
+		if ignore(directory, [name]):
+			return True
+		directory = os.path.join(directory, name)
+	return False
+
+
+def index_path(index_dir, source, drive_key):
+	"""
+	The index of a board (drive_key) for a source directory.
+	"""
+	source_key = hashlib.sha256(os.path.abspath(source).encode()).hexdigest()[:16]
+	return os.path.join(index_dir, f"{drive_key}_{source_key}.json")
+
+
+############################################################
+# batches of changes
+############################################################
+
+class Batch:
+	"""
+	The changes to apply to the boards, relative paths in the source.
+	- moves: list of (old, new), files or directories.
+	- deleted: files or directories.
+	- changed: files to write.
+	- rescan: events were lost, compare everything.
+	"""
+	def __init__(self):
+		self.moves = []
+		self.deleted = set()
+		self.changed = set()
+		self.rescan = False
+		self._moved_from = {}
+
+	def __bool__(self):
+		return bool(self.moves or self.deleted or self.changed or self.rescan or self._moved_from)
+
+	def _cancel_move(self, relative):
+		# the path was written again after it was moved away (editors
+		# that keep a backup file): it's a change, not a deletion
+		for cookie, old in list(self._moved_from.items()):
+			if old == relative:
+				del self._moved_from[cookie]
+
+	def add(self, event):
+		kind = event[0]
+		if kind == "changed":
+			self._cancel_move(event[1])
+			self.changed.add(event[1])
+			self.deleted.discard(event[1])
+		elif kind == "deleted":
+			self.deleted.add(event[1])
+			self.changed.discard(event[1])
+		elif kind == "moved_from":
+			self._moved_from[event[1]] = event[2]
+		elif kind == "moved_to":
+			old = self._moved_from.pop(event[1], None)
+			new = event[2]
+			self._cancel_move(new)
+			if old is None:
+				# moved in from outside of the tree
+				self.changed.add(new)
+				self.deleted.discard(new)
+			elif old in self.changed:
+				# not written to the boards yet (editors save that way),
+				# the old name may be on the boards from an earlier batch
+				self.changed.discard(old)
+				self.deleted.add(old)
+				self.changed.add(new)
+				self.deleted.discard(new)
+			else:
+				self.moves.append((old, new))
+				self.deleted.discard(new)
+		elif kind == "rescan":
+			self.rescan = True
+
+	def close(self):
+		# moved out of the tree
+		for old in self._moved_from.values():
+			if old not in self.changed:
+				self.deleted.add(old)
+		self._moved_from = {}
+		return self
+
+
+############################################################
+# watchers
+############################################################
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_WATCH = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+	"""
+	Watch a directory tree with inotify, one watch per directory.
+	"""
+	def __init__(self, root, ignore=SYNC_IGNORE):
+		self.root = root
+		self.ignore = ignore
+		self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+		self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+		if self.fd < 0:
+			raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+		self.paths = {}
+		self._watch_tree("")
+
+	def _watch(self, relative):
+		path = os.path.join(self.root, relative)
+		wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), IN_WATCH)
+		if wd >= 0:
+			self.paths[wd] = relative
+
+	def _watch_tree(self, relative):
+		"""
+		Watch a new directory and its subdirectories, returns its files.
+		"""
+		events = []
+		top = os.path.join(self.root, relative)
+		for dirpath, dirnames, filenames in os.walk(top):
+			directory = os.path.relpath(dirpath, self.root)
+			directory = "" if directory == "." else directory
+			ignored_names = self.ignore(dirpath, dirnames + filenames)
+			dirnames[:] = [name for name in dirnames if name not in ignored_names]
+			self._watch(directory)
+			events += [("changed", os.path.join(directory, name))
+				for name in filenames if name not in ignored_names]
+		return events
+
+	def _moved_directory(self, old, new):
+		for wd, relative in list(self.paths.items()):
+			if relative == old or relative.startswith(old + os.sep):
+				if new is None:
+					self.libc.inotify_rm_watch(self.fd, wd)
+					del self.paths[wd]
+				else:
+					self.paths[wd] = new + relative[len(old):]
+
+	def wait(self, timeout=None):
+		"""
+		The events read within timeout seconds, an empty list if none.
+		"""
+		ready, _, _ = select.select([self.fd], [], [], timeout)
+		if not ready:
+			return []
+		data = os.read(self.fd, 64 * 1024)
+		events = []
+		# directories moved, by cookie
+		moved_directories = {}
+		offset = 0
+		while offset < len(data):
+			wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+			offset += EVENT_HEADER.size
+			name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+			offset += length
+			if mask & IN_Q_OVERFLOW:
+				events.append(("rescan",))
+				continue
+			if mask & IN_IGNORED:
+				self.paths.pop(wd, None)
+				continue
+			if wd not in self.paths:
+				continue
+			relative = os.path.join(self.paths[wd], name)
+			if ignored(relative, self.ignore):
+				continue
+			is_dir = mask & IN_ISDIR
+			if mask & IN_CLOSE_WRITE:
+				events.append(("changed", relative))
+			elif mask & IN_CREATE and is_dir:
+				events += self._watch_tree(relative)
+			elif mask & IN_DELETE:
+				events.append(("deleted", relative))
+			elif mask & IN_MOVED_FROM:
+				if is_dir:
+					moved_directories[cookie] = relative
+				events.append(("moved_from", cookie, relative))
+			elif mask & IN_MOVED_TO:
+				if is_dir:
+					if cookie in moved_directories:
+						# moved in the tree, it keeps its watches
+						self._moved_directory(moved_directories.pop(cookie), relative)
+					else:
+						events += self._watch_tree(relative)
+						continue
+				events.append(("moved_to", cookie, relative))
+		# moved out of the tree
+		for relative in moved_directories.values():
+			self._moved_directory(relative, None)
+		return events
+
+	def close(self):
+		os.close(self.fd)
+
+
+class PollingWatcher:
+	"""
+	Watch a directory tree by comparing the size and time of its files.
+	"""
+	def __init__(self, root, ignore=SYNC_IGNORE):
+		self.root = root
+		self.ignore = ignore
+		self.files = self._snapshot()
+
+	def _snapshot(self):
+		files = {}
+		for relative in walk_files(self.root, self.ignore):
+			try:
+				stat = os.stat(os.path.join(self.root, relative))
+				files[relative] = (stat.st_size, stat.st_mtime)
+			except OSError:
+				pass
+		return files
+
+	def wait(self, timeout=None):
+		deadline = None if timeout is None else time.monotonic() + timeout
+		while True:
+			files = self._snapshot()
+			events = [("changed", relative) for relative, state in files.items()
+				if self.files.get(relative) != state]
+			events += [("deleted", relative) for relative in self.files
+				if relative not in files]
+			self.files = files
+			if events:
+				return events
+			if deadline is not None and time.monotonic() >= deadline:
+				return []
+			delay = POLL_INTERVAL
+			if deadline is not None:
+				delay = min(delay, max(0, deadline - time.monotonic()))
+			time.sleep(delay)
+
+	def close(self):
+		pass
+
+
+def tree_watcher(root, ignore=SYNC_IGNORE):
+	if sys.platform == "linux":
+		try:
+			return InotifyWatcher(root, ignore)
+		except (OSError, AttributeError):
+			pass
+	return PollingWatcher(root, ignore)
+
+
+def batches(watcher, debounce=DEFAULT_DEBOUNCE):
+	"""
+	Generate the batches of changes, each one when the tree was quiet for
+	debounce seconds.
+	"""
+	while True:
+		batch = Batch()
+		for event in watcher.wait():
+			batch.add(event)
+		while True:
+			events = watcher.wait(debounce)
+			if not events:
+				break
+			for event in events:
+				batch.add(event)
+		batch.close()
+		if batch:
+			yield batch
+
+
+############################################################
+# boards
+############################################################
+
+class SyncResult:
+	def __init__(self, job):
+		self.job = job
+		self.files_written = 0
+		self.bytes_written = 0
+		self.deleted = 0
+		self.moved = 0
+		self.errors = []
+		self.duration = 0
+
+
+class BoardSync:
+	"""
+	Mirror the source on a drive, job["destination"], with the index
+	job["index"] of what was written.
+	"""
+	def __init__(self, source, job, ignore=SYNC_IGNORE):
+		self.source = source
+		self.job = job
+		self.ignore = ignore
+		self.destination = job["destination"]
+		try:
+			with open(job["index"], "r") as fp:
+				self.index = json.load(fp)["files"]
+		except (OSError, ValueError, KeyError):
+			self.index = None
+
+	def save_index(self):
+		save_manifest(self.job["index"], self.index)
+
+	def _forget(self, relative):
+		for key in list(self.index):
+			if key == relative or key.startswith(relative + os.sep):
+				del self.index[key]
+
+	def _write(self, relative, result):
+		source_file = os.path.join(self.source, relative)
+		stat = os.stat(source_file)
+		_write_file(source_file, os.path.join(self.destination, relative))
+		self.index[relative] = {"size": stat.st_size, "mtime": stat.st_mtime}
+		result.files_written += 1
+		result.bytes_written += stat.st_size
+
+	def _delete(self, relative):
+		# True if there was something to delete
+		target = os.path.join(self.destination, relative)
+		found = os.path.lexists(target)
+		if os.path.isdir(target):
+			shutil.rmtree(target)
+		elif found:
+			os.remove(target)
+		self._forget(relative)
+		return found
+
+	def start(self, rescan=False):
+		"""
+		Bring the drive up to date with the source.
+		"""
+		result = SyncResult(self.job)
+		start = time.monotonic()
+		tree = SourceTree(self.source, self.ignore)
+		if self.index is None or rescan:
+			# compare with the drive
+			changed = [relative for relative in tree.files
+				if _changed(tree, relative, os.path.join(self.destination, relative))[0]]
+			deleted = [relative for relative in (self.index or {})
+				if relative not in tree.files]
+			self.index = {relative: {"size": stat.st_size, "mtime": stat.st_mtime}
+				for relative, stat in tree.files.items() if relative not in changed}
+		else:
+			changed = [relative for relative, stat in tree.files.items()
+				if self.index.get(relative) != {"size": stat.st_size, "mtime": stat.st_mtime}]
+			deleted = [relative for relative in self.index if relative not in tree.files]
+		for relative in deleted:
+			try:
+				if self._delete(relative):
+					result.deleted += 1
+			except OSError as ex:
+				result.errors.append(f"{relative}: {ex}")
+		for relative in changed:
+			try:
+				self._write(relative, result)
+			except OSError as ex:
+				result.errors.append(f"{relative}: {ex}")
+		self.save_index()
+		result.duration = time.monotonic() - start
+		return result
+
+	def apply(self, batch):
+		"""
+		Apply a batch of changes to the drive.
+		"""
+		if batch.rescan:
+			return self.start(rescan=True)
+		result = SyncResult(self.job)
+		start = time.monotonic()
+		changed = set(batch.changed)
+		for old, new in batch.moves:
+			old_target = os.path.join(self.destination, old)
+			new_target = os.path.join(self.destination, new)
+			try:
+				if not os.path.exists(old_target):
+					raise FileNotFoundError(old_target)
+				os.makedirs(os.path.dirname(new_target), exist_ok=True)
+				os.replace(old_target, new_target)
+				for key in list(self.index):
+					if key == old or key.startswith(old + os.sep):
+						self.index[new + key[len(old):]] = self.index.pop(key)
+				result.moved += 1
+			except OSError:
+				# write it again instead
+				self._forget(old)
+				new_source = os.path.join(self.source, new)
+				if os.path.isdir(new_source):
+					changed.update(os.path.join(new, relative)
+						for relative in walk_files(new_source, self.ignore))
+				else:
+					changed.add(new)
+		for relative in batch.deleted:
+			try:
+				if self._delete(relative):
+					result.deleted += 1
+			except OSError as ex:
+				result.errors.append(f"{relative}: {ex}")
+		for relative in sorted(changed, key=deploy_order):
+			if not os.path.isfile(os.path.join(self.source, relative)):
+				continue
+			try:
+				self._write(relative, result)
+			except OSError as ex:
+				result.errors.append(f"{relative}: {ex}")
+		self.save_index()
+		result.duration = time.monotonic() - start
+		return result
+
+
+def sync_boards(boards, action, workers, done=None):
+	"""
+	Run action(board) for every board concurrently, done(result) is called
+	with each result. Returns the results.
+	"""
+	def run(board):
+		with span("sync.drive", serial=board.job["serial"], destination=board.destination) as trace:
+			result = action(board)
+			trace["files_written"] = result.files_written
+			if result.errors:
+				trace["outcome"] = "incomplete"
+		return result
+	return run_lanes([[board] for board in boards], run, workers, done)
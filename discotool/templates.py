@@ -0,0 +1,35 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Variables of the names and commands built for a board, like the name of a
+backup (backup --format) or the command of a hook (watch --exec).
+
+- {timestamp}: the date and time, like 20260101-120000.
+- {device}: the name of the board.
+- {serial}: its serial number.
+- {drive}: the name of its drive (volume), like CIRCUITPY.
+- {mount}: the path to the drive.
+- {port}, {data}: the REPL and DATA serial ports.
+"""
+
+import time
+
+TEMPLATE_HELP = "{timestamp}, {device}, {serial}, {drive}, {mount}, {port}, {data}"
+
+
+def template_variables(device, volume=None):
+	"""
+	The variables for a device, and one of its volumes (the first by default).
+	"""
+	if volume is None and device['volumes']:
+		volume = device['volumes'][0]
+	return {
+		"timestamp": time.strftime("%Y%m%d-%H%M%S"),
+		"device": device['name'],
+		"serial": device['serial_num'],
+		"drive": volume['name'] if volume else "",
+		"mount": volume['mount_point'] if volume else "",
+		"port": getattr(device, "repl", None) or "",
+		"data": getattr(device, "data", None) or "",
+	}
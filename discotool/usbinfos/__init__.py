@@ -12,23 +12,182 @@ I found no way to use pure python (pyusb, pyserial, psutil, etc.) to link the dr
 
 the API:
 - get_devices_list() returns the list of boards
+- get_devices_list(fields=...) only computes some fields of the boards
+- iter_devices() yields the boards as the scan finds them
+- await scan() and async for event in watch() for asyncio
+
+The backend is chosen from the platform, or with the DISCOTOOL_BACKEND
+environment variable (or set_backend()):
+- "live" (default) scans the USB bus of the host.
+- "replay:FILE" feeds the scans recorded in FILE with record_scans()
+  (or discotool --record FILE) through the backend of the recorded platform.
 """
 
+import asyncio
 import os
 import sys
+from . import usbinfos_async
+from . import usbinfos_hotplug
+from . import usbinfos_replay
+from .usbinfos_common import FIELDS, collect_devices, phase_needed
+from .usbinfos_replay import current_platform
+from .usbinfos_selector import Selector, SelectorError, DeviceIndex
+from .usbinfos_stats import ScanStats, TimedSource
+from .usbinfos_trace import set_trace, span
+
+
+def _backend_module(platform):
+	if platform == "darwin":
+		from . import usbinfos_macos
+		return usbinfos_macos
+	elif platform == "linux":
+		from . import usbinfos_linux
+		return usbinfos_linux
+	elif platform == "win32":
+		from . import usbinfos_win32
+		return usbinfos_win32
+	else:
+		raise ImportError("Platform not supported")
+
+if current_platform() not in ("darwin", "linux", "win32"):
+	raise ImportError("Platform not supported")
 
 
-if sys.platform.startswith("darwin"):
-	from .usbinfos_macos import get_devices_list as _get_devices_list
-
-elif sys.platform.startswith("linux"):
-	from .usbinfos_linux import get_devices_list as _get_devices_list
+############################################################
+# backend selection, record and replay
+############################################################
+_backend_spec = None
+_replayer = None
+_recorder = None
+
+def set_backend(spec):
+	"""
+	Select the backend: "live" or "replay:FILE".
+	"""
+	global _backend_spec, _replayer
+	if spec.startswith("replay:"):
+		_replayer = usbinfos_replay.Replayer(spec[len("replay:"):])
+	elif spec == "live":
+		_replayer = None
+	else:
+		raise ValueError(f"Unknown discotool backend: {spec}")
+	_backend_spec = spec
+
+
+def record_scans(path):
+	"""
+	Record the inputs of the following scans (and events) into path.
+	Pass None to stop recording.
+	"""
+	global _recorder
+	if path is None:
+		_recorder = None
+	else:
+		_recorder = usbinfos_replay.Recorder(path)
+		_recorder.save()
+
+
+def _select_source():
+	if _backend_spec is None:
+		set_backend(os.environ.get("DISCOTOOL_BACKEND", "live"))
+	if _replayer is not None:
+		module = _backend_module(_replayer.platform)
+		return module, _replayer.next_source()
+	module = _backend_module(current_platform())
+	return module, module.LiveSource()
+
+
+def hotplug_monitor():
+	"""
+	A monitor of the USB and mount changes for the current backend,
+	see usbinfos_hotplug. Events are recorded with the scans.
+	"""
+	if _backend_spec is None:
+		set_backend(os.environ.get("DISCOTOOL_BACKEND", "live"))
+	if _replayer is not None:
+		return usbinfos_replay.ReplayMonitor(_replayer.events)
+	monitor = usbinfos_hotplug.live_monitor()
+	if _recorder is not None:
+		monitor = usbinfos_replay.RecordingMonitor(monitor, _recorder)
+	return monitor
+
+
+def async_hotplug_monitor():
+	"""
+	Same as hotplug_monitor() with an asyncio monitor, to call from a
+	coroutine.
+	"""
+	if _backend_spec is None:
+		set_backend(os.environ.get("DISCOTOOL_BACKEND", "live"))
+	if _replayer is not None:
+		return usbinfos_hotplug.ThreadedMonitor(
+			usbinfos_replay.ReplayMonitor(_replayer.events))
+	monitor = usbinfos_hotplug.async_live_monitor()
+	if _recorder is not None:
+		monitor = usbinfos_replay.AsyncRecordingMonitor(monitor, _recorder)
+	return monitor
+
+
+_last_scan_stats = None
+
+def last_scan_stats():
+	"""
+	Timings and counters of the last scan as a dictionary, see usbinfos_stats.
+	"""
+	if _last_scan_stats is None:
+		return None
+	return _last_scan_stats.as_dict()
+
+
+def _projection(drive_info, selector, fields):
+	"""
+	The fields to compute for the scan: those asked and those the selector
+	uses. Only probe the drives (drive_info) if the volumes are wanted.
+	"""
+	if fields is None:
+		return drive_info, None
+	fields = set(fields)
+	unknown = fields - set(FIELDS)
+	if unknown:
+		raise ValueError(f"Unknown device fields: {', '.join(sorted(unknown))}")
+	if selector is not None:
+		fields |= selector.fields()
+	if "version" in fields:
+		fields.add("volumes")
+	return drive_info and "volumes" in fields, fields
+
+
+def _iter_devices(drive_info, selector=None, fields=None):
+	"""
+	Yield the devices of the backend as they are resolved, return the
+	remaining ports. Closing the generator stops the scan there.
+	"""
+	global _last_scan_stats
+	drive_info, fields = _projection(drive_info, selector, fields)
+	module, source = _select_source()
+	wanted = None
+	if selector is not None:
+		wanted = selector.prefilter
+	if _recorder is not None:
+		source = _recorder.record_scan(source)
+	stats = ScanStats(module.__name__.split("_")[-1])
+	try:
+		with span("scan", backend=stats.backend) as trace:
+			try:
+				ports = yield from module.iter_devices(drive_info,
+					source=TimedSource(source, stats), wanted=wanted, fields=fields)
+			finally:
+				stats.finish()
+				trace.update(stats.counters)
+	finally:
+		_last_scan_stats = stats
+		if _recorder is not None:
+			_recorder.save()
+	return ports
 
-elif sys.platform.startswith("win32"):
-	from .usbinfos_win32 import get_devices_list as _get_devices_list
 
-else:
-	raise ImportError("Platform not supported")
+def _get_devices_list(drive_info, selector=None, fields=None):
+	return collect_devices(_iter_devices(drive_info, selector, fields))
 
 
 ############################################################
@@ -93,24 +252,200 @@ class DeviceInfoDict(dict):
 					self.repl = port["dev"]
 
 
+def device_identity(device):
+	"""
+	Key identifying a board across scans: its serial number if it has one,
+	or the USB port it is connected to.
+	"""
+	if device['serial_num']:
+		return (device['vendor_id'], device['product_id'], device['serial_num'])
+	return (device['vendor_id'], device['product_id'], "@" + device.get('usb_location', ""))
+
+
+def diff_devices(previous, current):
+	"""
+	The events between two snapshots of the devices, lists or dictionaries
+	by device_identity: {"event": "added", "removed" or "changed",
+	"device": the device, "changes": the fields that changed}.
+	"""
+	if not isinstance(previous, dict):
+		previous = {device_identity(device): device for device in previous}
+	if not isinstance(current, dict):
+		current = {device_identity(device): device for device in current}
+	events = []
+	for identity, device in previous.items():
+		if identity not in current:
+			events.append({"event": "removed", "device": device, "changes": []})
+	for identity, device in current.items():
+		if identity not in previous:
+			events.append({"event": "added", "device": device, "changes": []})
+			continue
+		old = previous[identity]
+		changes = [field for field in FIELDS if old.get(field) != device.get(field)]
+		if changes:
+			events.append({"event": "changed", "device": device, "changes": changes})
+	return events
+
+
 ############################################################
 # get lists for things
 ############################################################
-def get_devices_list(drive_info=False):
-	liste, ports = _get_devices_list(drive_info)
-	return ([DeviceInfoDict(item) for item in liste], ports)
-
-
-def get_identified_devices(drive_info=False):
-	liste, _ = _get_devices_list(drive_info)
-	return [DeviceInfoDict(item) for item in liste]
+def _selected_devices(liste, selector):
+	devices = [DeviceInfoDict(item) for item in liste]
+	if selector is not None:
+		devices = selector.select(devices)
+	return devices
+
+
+def get_devices_list(drive_info=False, selector=None, fields=None):
+	"""
+	The selector (expression or Selector) skips resolving the ports and
+	drives of the devices that can't match it, their serial ports might
+	then be listed in the remaining ports.
+
+	fields (see FIELDS) limits the scan to what is needed for them, skipping
+	the listing of the serial ports, of the mounts or the probing of the
+	drives when possible. The other fields are empty or incomplete, and the
+	remaining ports are only listed when "ports" is asked.
+	"""
+	if isinstance(selector, str):
+		selector = Selector(selector)
+	liste, ports = _get_devices_list(drive_info, selector, fields)
+	return (_selected_devices(liste, selector), ports)
+
+
+def get_identified_devices(drive_info=False, selector=None, fields=None):
+	if isinstance(selector, str):
+		selector = Selector(selector)
+	liste, _ = _get_devices_list(drive_info, selector, fields)
+	return _selected_devices(liste, selector)
+
+
+def iter_devices(drive_info=False, selector=None, fields=None):
+	"""
+	Yield the devices (matching the selector) as soon as each one is
+	resolved. Stop the iteration to skip the rest of the scan, for example
+	when the wanted board is found. The remaining ports are not returned.
+	"""
+	if isinstance(selector, str):
+		selector = Selector(selector)
+	for item in _iter_devices(drive_info, selector, fields):
+		device = DeviceInfoDict(item)
+		if selector is None or selector.match(device):
+			yield device
+
+
+def find_device(selector, drive_info=False, fields=None):
+	"""
+	The first device matching the selector, None if there is none.
+	The scan stops there.
+	"""
+	for device in iter_devices(drive_info, selector, fields):
+		return device
+	return None
 
 
 def get_unidentified_ports():
-	_, ports = _get_devices_list(drive_info)
+	_, ports = _get_devices_list(False, fields=("ports",))
 	return ports
 
 
+############################################################
+# asyncio API
+############################################################
+# rescan anyway after this many seconds, in case a change was not notified
+WATCH_RESCAN_INTERVAL = 5
+# longest wait for a burst of changes to stop before scanning anyway
+WATCH_MAX_DEBOUNCE = 5
+
+async def scan(drive_info=False, selector=None, fields=None):
+	"""
+	Same as get_devices_list() without blocking the asyncio event loop,
+	see usbinfos_async.
+	"""
+	global _last_scan_stats
+	if isinstance(selector, str):
+		selector = Selector(selector)
+	drive_info, fields = _projection(drive_info, selector, fields)
+	module, source = _select_source()
+	wanted = None
+	if selector is not None:
+		wanted = selector.prefilter
+	if _recorder is not None:
+		source = _recorder.record_scan(source)
+	stats = ScanStats(module.__name__.split("_")[-1])
+	timed = TimedSource(source, stats)
+	try:
+		with span("scan", backend=stats.backend) as trace:
+			try:
+				prefetched = await usbinfos_async.fetch_inputs(
+					module, timed, FIELDS if fields is None else fields)
+				liste, ports = module.get_devices_list(False,
+					source=prefetched, wanted=wanted, fields=fields)
+				if drive_info:
+					await usbinfos_async.probe_drives(timed, liste)
+			finally:
+				stats.finish()
+				trace.update(stats.counters)
+	finally:
+		_last_scan_stats = stats
+		if _recorder is not None:
+			_recorder.save()
+	return (_selected_devices(liste, selector), ports)
+
+
+async def watch(drive_info=False, selector=None, fields=None, debounce=0):
+	"""
+	Yield the events of the devices (see diff_devices), starting with an
+	"added" event for each device present. The devices are scanned again
+	when the hotplug monitor sees a change, or every WATCH_RESCAN_INTERVAL.
+
+	With debounce (seconds) a burst of changes is coalesced: the scan waits
+	until the monitor has been quiet that long (up to WATCH_MAX_DEBOUNCE),
+	and a device is only "removed" if it's still missing after that delay.
+	A board that resets then gives one "changed" event, or none.
+	"""
+	if isinstance(selector, str):
+		selector = Selector(selector)
+	monitor = async_hotplug_monitor()
+	loop = asyncio.get_running_loop()
+	try:
+		# the devices as last published, and since when they are missing
+		published = {}
+		missing = {}
+		while True:
+			deviceList, _ = await scan(drive_info, selector, fields)
+			now = loop.time()
+			current = {device_identity(device): device for device in deviceList}
+			gone = {}
+			for identity, device in published.items():
+				if identity in current:
+					missing.pop(identity, None)
+					continue
+				since = missing.setdefault(identity, now)
+				if now - since >= debounce:
+					gone[identity] = device
+				else:
+					# not yet: it's still published
+					current[identity] = device
+			for identity in gone:
+				del missing[identity]
+			for event in diff_devices(published, current):
+				yield event
+			published = current
+			# wait for a change, or the end of the delay of a missing device
+			timeout = WATCH_RESCAN_INTERVAL
+			if missing:
+				timeout = min(timeout, max(0, min(missing.values()) + debounce - now))
+			events = await monitor.wait(timeout)
+			if events and debounce:
+				deadline = loop.time() + WATCH_MAX_DEBOUNCE
+				while events and loop.time() < deadline:
+					events = await monitor.wait(min(debounce, deadline - loop.time()))
+	finally:
+		monitor.close()
+
+
 ############################################################
 # get filtered lists
 ############################################################
@@ -149,6 +484,12 @@ def devices_by_serial(serial_number):
 			out.append(dev)
 	return out
 
+def devices_by_selector(expression):
+	"""
+	Devices matching a selector expression, see usbinfos_selector.
+	"""
+	return get_identified_devices(selector=expression)
+
 ############################################################
 # main for tests
 ############################################################
@@ -0,0 +1,59 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Run the phases of a scan for the asyncio API (usbinfos.scan).
+
+The inputs the backend needs (see PHASES in each backend) are read
+concurrently beforehand: subprocesses like ioreg with asyncio, the other
+calls (udev, pyserial, psutil, WMI) in the default executor. The backend
+then correlates them without blocking, and the drives are probed last,
+concurrently.
+"""
+
+import asyncio
+from .usbinfos_common import phase_needed
+
+
+class PrefetchedSource:
+	"""Give the inputs read by fetch_inputs() to the backend"""
+	def __init__(self, source, inputs):
+		self._source = source
+		self._inputs = inputs
+
+	def __getattr__(self, name):
+		if name in self._inputs:
+			return lambda: self._inputs[name]
+		return getattr(self._source, name)
+
+
+async def fetch_inputs(module, source, fields):
+	"""
+	Read the inputs of the backend module needed for the fields, with the
+	fetch() method of a TimedSource.
+	"""
+	names = [name for name in module.PHASES
+		if phase_needed(module.PHASES, name, fields)]
+	values = await asyncio.gather(*(source.fetch(name) for name in names))
+	return PrefetchedSource(source, dict(zip(names, values)))
+
+
+async def probe_drives(source, deviceList):
+	"""
+	Probe the drives of the devices concurrently for the mains and version.
+	The version is the one of the Circuitpython drive (with a boot_out.txt),
+	whatever the order the drives answer in.
+	"""
+	loop = asyncio.get_running_loop()
+	volumes = [(device, volume) for device in deviceList
+		for volume in device['volumes']]
+	infos = await asyncio.gather(*(
+		loop.run_in_executor(None, source.drive_info, volume['mount_point'], device['serial_num'])
+		for device, volume in volumes
+	))
+	for device in deviceList:
+		device['version'] = ""
+	for (device, volume), (mains, version) in zip(volumes, infos):
+		volume['mains'] = mains
+		if version and not device['version']:
+			device['version'] = version
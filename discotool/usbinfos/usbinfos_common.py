@@ -2,6 +2,8 @@
 # SPDX-License-Identifier: MIT
 
 import os
+import psutil
+import threading
 
 # Vendor IDs recognized as Arduino / Circuitpython boards
 VIDS = [
@@ -17,6 +19,26 @@ VIDS = [
 
 mainNames = ["code.txt","code.py","main.py","main.txt"]
 
+# the fields of a device, a scan can be limited to some of them (projection)
+# - vendor_id, product_id, serial_num, usb_location are always there
+# - name, manufacturer may need the serial ports or the USB descriptors
+# - ports needs the serial ports, volumes needs the mounted partitions
+# - version and the mains of the volumes need drive_info (probe the drives)
+FIELDS = (
+	"name",
+	"manufacturer",
+	"vendor_id",
+	"product_id",
+	"serial_num",
+	"usb_location",
+	"ports",
+	"volumes",
+	"version",
+)
+
+# seconds before giving up on reading a drive (unresponsive drive, flaky hub)
+DRIVE_PROBE_TIMEOUT = 5
+
 # list the drive info for a circuipython drive (code or main and version)
 def get_cp_drive_info(mount):
 	mains = []
@@ -31,3 +53,53 @@ def get_cp_drive_info(mount):
 	except (FileNotFoundError,ValueError,IndexError):
 		version = ""
 	return (mains,version)
+
+
+# same with a timeout, raises TimeoutError if the drive does not answer
+# the probing thread is left behind, it does not block the exit
+def get_cp_drive_info_timeout(mount, timeout=None):
+	if timeout is None:
+		timeout = DRIVE_PROBE_TIMEOUT
+	result = []
+	thread = threading.Thread(
+		target=lambda: result.append(get_cp_drive_info(mount)),
+		daemon=True,
+	)
+	thread.start()
+	thread.join(timeout)
+	if not result:
+		raise TimeoutError(f"Timeout reading the drive {mount}")
+	return result[0]
+
+# is an input (phase) of the backend needed to compute those fields
+# phases maps the name of each input to the fields needing it (None: always)
+def phase_needed(phases, name, fields):
+	needed = phases[name]
+	return needed is None or any(field in fields for field in needed)
+
+# run the iter_devices() generator of a backend to the end
+# it yields the devices and returns the remaining serial ports
+def collect_devices(devices):
+	deviceList = []
+	while True:
+		try:
+			deviceList.append(next(devices))
+		except StopIteration as stop:
+			return (deviceList, stop.value)
+
+# the inputs of a scan, read from the system
+# each backend adds its own platform specific inputs in a subclass
+# usbinfos_replay records and replays the values returned by those methods
+class BaseSource:
+	def comports(self):
+		return []
+
+	def disk_partitions(self):
+		return psutil.disk_partitions()
+
+	def drive_info(self, mount, serial=None):
+		return get_cp_drive_info_timeout(mount)
+
+	def count(self, name, number=1):
+		# counters are kept by usbinfos_stats.TimedSource
+		pass
@@ -0,0 +1,238 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Wait for changes of the USB devices and of the mounted drives.
+
+On linux we listen to a udev monitor (usb, tty and block subsystems) and
+poll /proc/self/mountinfo, that signals the changes of the mount table, so
+a waiting scan wakes up as soon as the board or its drive appear.
+Elsewhere (or without pyudev) we fall back to waiting a fixed interval.
+
+monitor.wait(timeout) returns the list of events seen, as dictionaries
+with a "kind" ("add", "remove", "change", "bind", "mount"...), or an empty
+list when it timed out (or when polling).
+
+The Async monitors do the same with "await monitor.wait(timeout)" without
+blocking the asyncio event loop.
+"""
+
+import asyncio
+import os
+import select
+import sys
+import time
+
+# after a first event, wait for the rest of the burst (usb, tty, block...)
+SETTLE_TIME = 0.05
+# interval between scans when there are no notifications
+POLL_INTERVAL = 1
+# interval between checks of the mount table from the event loop
+MOUNT_POLL_INTERVAL = 0.25
+MOUNTINFO = "/proc/self/mountinfo"
+
+
+def _udev_monitor():
+	import pyudev
+	context = pyudev.Context()
+	monitor = pyudev.Monitor.from_netlink(context)
+	for subsystem in ("usb", "tty", "block"):
+		monitor.filter_by(subsystem)
+	monitor.start()
+	return monitor
+
+
+def _udev_event(device):
+	return {
+		"kind": device.action,
+		"subsystem": device.subsystem,
+		"device": device.device_node or device.sys_path,
+	}
+
+
+def _open_mountinfo():
+	"""
+	The mount table, read once: it signals the next change with POLLPRI.
+	"""
+	if not os.path.exists(MOUNTINFO):
+		return None
+	mountinfo = open(MOUNTINFO, "r")
+	mountinfo.read()
+	return mountinfo
+
+
+class PollingMonitor:
+	def __init__(self, interval=POLL_INTERVAL):
+		self.interval = interval
+
+	def wait(self, timeout=None):
+		if timeout is None:
+			timeout = self.interval
+		time.sleep(min(timeout, self.interval))
+		return []
+
+	def close(self):
+		pass
+
+
+class UdevMonitor:
+	def __init__(self):
+		self.monitor = _udev_monitor()
+		self.poller = select.poll()
+		self.poller.register(self.monitor.fileno(), select.POLLIN)
+		self.mountinfo = _open_mountinfo()
+		if self.mountinfo is not None:
+			self.poller.register(self.mountinfo.fileno(), select.POLLPRI | select.POLLERR)
+
+	def _poll(self, timeout):
+		if timeout is None:
+			milliseconds = None
+		else:
+			milliseconds = max(0, int(timeout * 1000))
+		events = []
+		for fd, mask in self.poller.poll(milliseconds):
+			if self.mountinfo is not None and fd == self.mountinfo.fileno():
+				# reading the file again acknowledges the change
+				self.mountinfo.seek(0)
+				self.mountinfo.read()
+				events.append({"kind": "mount"})
+			else:
+				device = self.monitor.poll(timeout=0)
+				while device is not None:
+					events.append(_udev_event(device))
+					device = self.monitor.poll(timeout=0)
+		return events
+
+	def wait(self, timeout=None):
+		events = self._poll(timeout)
+		if events:
+			deadline = time.monotonic() + SETTLE_TIME
+			remaining = SETTLE_TIME
+			while remaining > 0:
+				events += self._poll(remaining)
+				remaining = deadline - time.monotonic()
+		return events
+
+	def close(self):
+		if self.mountinfo is not None:
+			self.mountinfo.close()
+			self.mountinfo = None
+
+
+def live_monitor():
+	"""
+	The best monitor available on this platform.
+	"""
+	if sys.platform.startswith("linux"):
+		try:
+			return UdevMonitor()
+		except (ImportError, OSError):
+			pass
+	return PollingMonitor()
+
+
+############################################################
+# asyncio monitors
+############################################################
+class AsyncPollingMonitor:
+	def __init__(self, interval=POLL_INTERVAL):
+		self.interval = interval
+
+	async def wait(self, timeout=None):
+		if timeout is None:
+			timeout = self.interval
+		await asyncio.sleep(min(timeout, self.interval))
+		return []
+
+	def close(self):
+		pass
+
+
+class AsyncUdevMonitor:
+	"""
+	The udev monitor is read by the event loop when it has events, the mount
+	table is checked every MOUNT_POLL_INTERVAL (asyncio can't wait for its
+	POLLPRI). Create it from a coroutine.
+	"""
+	def __init__(self):
+		self.loop = asyncio.get_running_loop()
+		self.events = []
+		self.notified = asyncio.Event()
+		self.monitor = _udev_monitor()
+		self.loop.add_reader(self.monitor.fileno(), self._read_udev)
+		self.mountinfo = _open_mountinfo()
+		self.poller = select.poll()
+		if self.mountinfo is not None:
+			self.poller.register(self.mountinfo.fileno(), select.POLLPRI | select.POLLERR)
+
+	def _read_udev(self):
+		device = self.monitor.poll(timeout=0)
+		while device is not None:
+			self.events.append(_udev_event(device))
+			device = self.monitor.poll(timeout=0)
+		self.notified.set()
+
+	def _poll_mounts(self):
+		if self.mountinfo is not None and self.poller.poll(0):
+			# reading the file again acknowledges the change
+			self.mountinfo.seek(0)
+			self.mountinfo.read()
+			self.events.append({"kind": "mount"})
+
+	async def wait(self, timeout=None):
+		deadline = None
+		if timeout is not None:
+			deadline = self.loop.time() + timeout
+		while True:
+			self._poll_mounts()
+			if self.events:
+				break
+			delay = MOUNT_POLL_INTERVAL
+			if deadline is not None:
+				delay = min(delay, deadline - self.loop.time())
+				if delay <= 0:
+					break
+			try:
+				await asyncio.wait_for(self.notified.wait(), delay)
+			except asyncio.TimeoutError:
+				pass
+			self.notified.clear()
+		if self.events:
+			await asyncio.sleep(SETTLE_TIME)
+			self._poll_mounts()
+		events, self.events = self.events, []
+		self.notified.clear()
+		return events
+
+	def close(self):
+		if self.monitor is not None:
+			self.loop.remove_reader(self.monitor.fileno())
+			self.monitor = None
+		if self.mountinfo is not None:
+			self.mountinfo.close()
+			self.mountinfo = None
+
+
+class ThreadedMonitor:
+	"""Wait for a blocking monitor in the default executor"""
+	def __init__(self, monitor):
+		self.monitor = monitor
+
+	async def wait(self, timeout=None):
+		loop = asyncio.get_running_loop()
+		return await loop.run_in_executor(None, self.monitor.wait, timeout)
+
+	def close(self):
+		self.monitor.close()
+
+
+def async_live_monitor():
+	"""
+	The best asyncio monitor available on this platform.
+	"""
+	if sys.platform.startswith("linux"):
+		try:
+			return AsyncUdevMonitor()
+		except (ImportError, OSError):
+			pass
+	return AsyncPollingMonitor()
@@ -8,23 +8,51 @@ Use pyudev and traverse the USB hierarchy of USB devices, removing the parent on
 
 import os, json, sys
 import subprocess
-import psutil
-import pyudev
-from serial.tools.list_ports import comports
 from .usbinfos_common import *
 
-def get_devices_list(drive_info=False):
+# the inputs of a scan and the fields that need them (None: always)
+PHASES = {
+	"disk_partitions": ("volumes",),
+	# the names of the serial ports are better than the udev ones
+	"comports": ("ports", "name", "manufacturer"),
+	"udev_devices": None,
+}
+
+class LiveSource(BaseSource):
+	def comports(self):
+		from serial.tools.list_ports import comports
+		return comports()
+
+	def udev_devices(self):
+		import pyudev
+		context = pyudev.Context()
+		return list(context.list_devices(subsystem='usb', DEVTYPE='usb_device'))
+
+def get_devices_list(drive_info=False, source=None, wanted=None, fields=None):
+	return collect_devices(iter_devices(drive_info, source, wanted, fields))
+
+def iter_devices(drive_info=False, source=None, wanted=None, fields=None):
+	if source is None:
+		source = LiveSource()
+	if fields is None:
+		fields = FIELDS
 	# get drives by mountpoint
 	allMounts = {}
-	for part in psutil.disk_partitions():
-		allMounts[part.device] = part.mountpoint
+	if phase_needed(PHASES, "disk_partitions", fields):
+		for part in source.disk_partitions():
+			allMounts[part.device] = part.mountpoint
+
+	remainingPorts = []
+	if phase_needed(PHASES, "comports", fields):
+		remainingPorts = [x for x in source.comports() if x.vid is not None]
 
-	remainingPorts = [x for x in comports() if x.vid is not None]
-	deviceList = []
-	
-	context = pyudev.Context()
-	devices = context.list_devices(subsystem='usb', DEVTYPE='usb_device')
+	# a device is kept until we know that it's not the parent of the next
+	pending = None
+	# sorted by path components, the children directly follow their parent
+	devices = sorted(source.udev_devices(),
+		key=lambda device: device.get('DEVPATH').split("/"))
 	for device in devices:
+		source.count("devices_seen")
 		# skip devices that have a base class of 09 (hubs)
 		if device.properties['TYPE'].split("/")[0] == "9":
 			continue
@@ -41,12 +69,17 @@ def get_devices_list(drive_info=False):
 		manufacturer = device.get('ID_VENDOR','')
 		name = device.get('ID_MODEL')
 		SN = device.get('ID_SERIAL_SHORT','')
+		usb_location = devpath.split("/", 4)[-1]
+		# don't look at the children of devices that can't be selected
+		selectable = wanted is None or wanted(vid=vid, pid=pid, serial=SN, loc=usb_location)
+		if not selectable:
+			source.count("devices_skipped")
 		# gather information from the device's subsystems
 		deviceVolumes = []
 		ttys = []
 		version = ""
 		mains = []
-		for child in device.children:
+		for child in (device.children if selectable else ()):
 			# serial port(s)
 			if child.subsystem == "tty":
 				tty = child.get("DEVNAME")
@@ -60,6 +93,7 @@ def get_devices_list(drive_info=False):
 							#
 							ttys.append({'dev':port.device,'iface':iface})
 							remainingPorts.remove(port)
+							source.count("ports_matched")
 							found = True
 					if not found:
 						ttys.append({'dev':tty,'iface':""})
@@ -68,7 +102,7 @@ def get_devices_list(drive_info=False):
 			if node and node in allMounts:
 				volume = allMounts[node]
 				if drive_info:
-					mains,version = get_cp_drive_info(volume)
+					mains,version = source.drive_info(volume, SN)
 				deviceVolumes.append({
 					'name': os.path.basename(volume),
 					'mount_point': volume,
@@ -78,15 +112,16 @@ def get_devices_list(drive_info=False):
 		# the issue is that we might find duplicates of devices, by finding
 		# a parent and treating it as the device. So, when we find a device
 		# that has parents that are previously found devices, we remove
-		# said parents.
-		def noParent(dev):
-			# test if the already found device is a parent of the current device
-			# do we need to loop through its parents ?
-			if devpath.startswith(dev['devpath']):
-				return False
-			return True
-		deviceList = list(filter(noParent, deviceList))
+		# said parents. Otherwise the previous device is done.
+		# (with the separator, 1-2.1 is not the parent of 1-2.10)
+		if pending is not None:
+			if not devpath.startswith(pending['devpath'] + "/"):
+				del pending['devpath']
+				yield pending
+			pending = None
 		#
+		if not selectable:
+			continue
 		if vid not in VIDS and len(ttys) == 0:
 			continue
 		#
@@ -100,10 +135,11 @@ def get_devices_list(drive_info=False):
 		curDevice['serial_num'] = SN
 		curDevice['ports'] = ttys
 		curDevice['manufacturer'] = manufacturer
-		curDevice['usb_location'] = devpath.split("/", 4)[-1]
-		deviceList.append(curDevice)
+		curDevice['usb_location'] = usb_location
+		pending = curDevice
 	#
-	for i in range(len(deviceList)):
-		del deviceList[i]['devpath']
+	if pending is not None:
+		del pending['devpath']
+		yield pending
 	rp = [port.device for port in remainingPorts]
-	return (deviceList,rp)
+	return rp
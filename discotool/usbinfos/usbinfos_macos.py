@@ -20,11 +20,9 @@ macOS versions (Tahoe and earlier) so it is now the sole backend.
 """
 
 import os, sys, re
+import asyncio
 import plistlib
 import subprocess
-import psutil
-#from serial.tools.list_ports import comports
-from .pyserial_list_ports_osx import comports
 from .usbinfos_common import *
 
 # where to find serial ports named by location on macOS
@@ -64,19 +62,53 @@ def _ioreg_str(entry, *keys):
 			return val
 	return ""
 
+# the inputs of a scan and the fields that need them (None: always)
+PHASES = {
+	"ioreg": None,
+	# ioreg still finds the ports, without their interface
+	"comports": ("ports",),
+	"disk_partitions": ("volumes",),
+}
+
+class LiveSource(BaseSource):
+	def comports(self):
+		#from serial.tools.list_ports import comports
+		from .pyserial_list_ports_osx import comports
+		return comports()
+
+	def ioreg(self):
+		"""Call ioreg -r -c IOUSBHostDevice -a -l which outputs an XML plist
+		of every IOUSBHostDevice with the full subtree of children.
+		Returns the raw output, or None on failure.
+		"""
+		try:
+			return subprocess.check_output(
+				["ioreg", "-r", "-c", "IOUSBHostDevice", "-a", "-l"],
+				stderr=subprocess.DEVNULL,
+			)
+		except (subprocess.CalledProcessError, FileNotFoundError):
+			return None
+
+	async def ioreg_async(self):
+		"""Same as ioreg(), without blocking the asyncio event loop."""
+		try:
+			process = await asyncio.create_subprocess_exec(
+				"ioreg", "-r", "-c", "IOUSBHostDevice", "-a", "-l",
+				stdout=asyncio.subprocess.PIPE,
+				stderr=asyncio.subprocess.DEVNULL,
+			)
+		except FileNotFoundError:
+			return None
+		output, _ = await process.communicate()
+		if process.returncode != 0:
+			return None
+		return output
+
 # ioreg helper
-def _get_usb_data_from_ioreg():
-	"""Call ioreg -r -c IOUSBHostDevice -a -l which outputs an XML plist
-	of every IOUSBHostDevice with the full subtree of children.
+def _get_usb_data_from_ioreg(raw):
+	"""Parse the output of ioreg from LiveSource.ioreg().
 	Returns the parsed plist (a list of dicts), or None on failure.
 	"""
-	try:
-		raw = subprocess.check_output(
-			["ioreg", "-r", "-c", "IOUSBHostDevice", "-a", "-l"],
-			stderr=subprocess.DEVNULL,
-		)
-	except (subprocess.CalledProcessError, FileNotFoundError):
-		return None
 	if not raw or not raw.strip():
 		return None
 	try:
@@ -144,7 +176,7 @@ def _walk_children_for_ports_and_disks(node, serial_ports, bsd_names):
 		_walk_children_for_ports_and_disks(child, serial_ports, bsd_names)
 
 
-def _match_ports_to_device(vid, pid, serial_num, location_id_str):
+def _match_ports_to_device(vid, pid, serial_num, location_id_str, source):
 	"""Match serial ports from remainingPorts to a USB device using either
 	VID+PID+serial or location_id prefix in the device path.
 	Mutates the global remainingPorts list (removes matched ports).
@@ -182,18 +214,21 @@ def _match_ports_to_device(vid, pid, serial_num, location_id_str):
 						found = True
 				if location[-1] != "0" or found:
 					break
+	source.count("ports_matched", len(ttys))
 	return ttys
 
 
 # going through all the ioreg USB device entries
 # extracting the important informations
 # matching serial ports and listing the volumes
-def _read_ioreg_devices(ioreg_entries, devices, allMounts, drive_info):
+# yields each device when it's done
+def _iter_ioreg_devices(ioreg_entries, allMounts, drive_info, source, wanted=None):
 	global remainingPorts
 	# flatten the tree: collect all actual USB devices including those
 	# nested behind hubs, so we process each real device individually
 	all_usb_devices = _collect_usb_devices(ioreg_entries)
 	for entry in all_usb_devices:
+		source.count("devices_seen")
 		curDevice = {}
 		# --- vendor / product IDs (integers in ioreg) ---
 		vid = entry.get("idVendor", 0)
@@ -221,8 +256,13 @@ def _read_ioreg_devices(ioreg_entries, devices, allMounts, drive_info):
 			location_id_str = hex(raw_location)
 		else:
 			location_id_str = str(raw_location)
+		# skip matching ports and volumes for devices that can't be selected
+		if wanted is not None and not wanted(
+			vid=vid, pid=pid, serial=serial_num, loc=location_id_str):
+			source.count("devices_skipped")
+			continue
 		# try to guess the port using the Location ID or Serial Number
-		ttys = _match_ports_to_device(vid, pid, serial_num, location_id_str)
+		ttys = _match_ports_to_device(vid, pid, serial_num, location_id_str, source)
 		# also check for serial ports visible in the ioreg tree
 		# (walk this device's children, but stop at nested USB devices)
 		ioreg_serial_ports = []
@@ -242,6 +282,7 @@ def _read_ioreg_devices(ioreg_entries, devices, allMounts, drive_info):
 						break
 				ttys.append({'dev': dev, 'iface': iface})
 				known_devs.add(dev)
+				source.count("ports_matched")
 		curDevice['ports'] = ttys
 		#
 		# now we select all the ones with a known VID or with an existing tty
@@ -264,7 +305,7 @@ def _read_ioreg_devices(ioreg_entries, devices, allMounts, drive_info):
 			if disk in allMounts:
 				mount = allMounts[disk]
 				if drive_info:
-					mains, version = get_cp_drive_info(mount)
+					mains, version = source.drive_info(mount, serial_num)
 				deviceVolumes.append({
 					'name': os.path.basename(mount),
 					'mount_point': mount,
@@ -279,7 +320,7 @@ def _read_ioreg_devices(ioreg_entries, devices, allMounts, drive_info):
 					# avoid duplicates
 					if not any(v['mount_point'] == mount_point for v in deviceVolumes):
 						if drive_info:
-							mains, version = get_cp_drive_info(mount_point)
+							mains, version = source.drive_info(mount_point, serial_num)
 						deviceVolumes.append({
 							'name': os.path.basename(mount_point),
 							'mount_point': mount_point,
@@ -288,28 +329,36 @@ def _read_ioreg_devices(ioreg_entries, devices, allMounts, drive_info):
 		curDevice['volumes'] = deviceVolumes
 		curDevice['version'] = version
 		curDevice['usb_location'] = location_id_str
-		devices += [curDevice]
-	return devices
+		yield curDevice
+
+
+def get_devices_list(drive_info=False, source=None, wanted=None, fields=None):
+	return collect_devices(iter_devices(drive_info, source, wanted, fields))
 
 
-def get_devices_list(drive_info=False):
+def iter_devices(drive_info=False, source=None, wanted=None, fields=None):
 	global remainingPorts
+	if source is None:
+		source = LiveSource()
+	if fields is None:
+		fields = FIELDS
 	# ioreg -r -c IOUSBHostDevice -a -l
-	ioreg_data = _get_usb_data_from_ioreg()
+	ioreg_data = _get_usb_data_from_ioreg(source.ioreg())
 
 	# list the existing ports
-	remainingPorts = [x for x in comports() if x.vid is not None]
+	remainingPorts = []
+	if phase_needed(PHASES, "comports", fields):
+		remainingPorts = [x for x in source.comports() if x.vid is not None]
 
 	# list the mounts to match the mount points
 	allMounts = {}
-	for part in psutil.disk_partitions():
-		allMounts[part.device] = part.mountpoint
+	if phase_needed(PHASES, "disk_partitions", fields):
+		for part in source.disk_partitions():
+			allMounts[part.device] = part.mountpoint
 
 	# list the devices
 	if ioreg_data is not None:
-		deviceList = _read_ioreg_devices(ioreg_data, [], allMounts, drive_info)
-	else:
-		deviceList = []
+		yield from _iter_ioreg_devices(ioreg_data, allMounts, drive_info, source, wanted)
 
 	rp = [port.device for port in remainingPorts]
-	return (deviceList, rp)
+	return rp
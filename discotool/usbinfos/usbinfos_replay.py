@@ -0,0 +1,270 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Record the raw inputs of the backends (udev properties, comports records,
+partitions, ioreg plist, WMI rows, drive probes) into a JSON file, and feed
+them back to the unchanged correlation code of the recorded platform.
+
+The file contains a list of timestamped scans and hotplug events:
+{
+	"format": "discotool-replay",
+	"version": 1,
+	"platform": "linux",
+	"scans": [{"time": 1700000000.0, "inputs": {"comports": [...], ...}}],
+	"events": [{"time": 1700000000.0, "kind": "add", ...}],
+}
+
+Each scan done while replaying uses the next recorded scan, staying on the
+last one once they have all been used, so that a --wait sequence recorded
+on a rig replays the same way on another machine.
+"""
+
+import json
+import sys
+import time
+from types import SimpleNamespace
+from .usbinfos_hotplug import PollingMonitor
+
+REPLAY_FORMAT = "discotool-replay"
+REPLAY_VERSION = 1
+
+PORT_ATTRIBUTES = (
+	"device", "name", "description", "hwid", "vid", "pid", "serial_number",
+	"location", "manufacturer", "product", "interface",
+)
+PARTITION_ATTRIBUTES = ("device", "mountpoint", "fstype", "opts")
+DESCRIPTOR_ATTRIBUTES = (
+	"vid", "pid", "manufacturer", "product", "serial_number", "location",
+)
+
+
+def current_platform():
+	for platform in ("darwin", "linux", "win32"):
+		if sys.platform.startswith(platform):
+			return platform
+	return sys.platform
+
+
+############################################################
+# replacements for the objects returned by the system
+############################################################
+class ReplayUdevDevice:
+	"""The part of pyudev.Device used by the linux backend"""
+	def __init__(self, record):
+		self.subsystem = record.get("subsystem")
+		self.properties = record["properties"]
+		self.children = [
+			ReplayUdevDevice(child) for child in record.get("children", [])
+		]
+
+	def get(self, key, default=None):
+		return self.properties.get(key, default)
+
+
+def _dump_attributes(attributes):
+	def dump(items):
+		return [
+			{attr: getattr(item, attr, None) for attr in attributes}
+			for item in items
+		]
+	return dump
+
+
+def _load_attributes(records):
+	return [SimpleNamespace(**record) for record in records]
+
+
+def _dump_udev(devices):
+	return [
+		{
+			"properties": dict(device.properties),
+			"children": [
+				{
+					"subsystem": child.subsystem,
+					"properties": dict(child.properties),
+				}
+				for child in device.children
+			],
+		}
+		for device in devices
+	]
+
+
+def _load_udev(records):
+	return [ReplayUdevDevice(record) for record in records]
+
+
+def _dump_ioreg(raw):
+	if raw is None:
+		return None
+	return raw.decode("utf-8", errors="replace")
+
+
+def _load_ioreg(text):
+	if not text:
+		return None
+	return text.encode("utf-8")
+
+
+def _identity(value):
+	return value
+
+
+# how to convert the return value of each source method to and from json
+CONVERTERS = {
+	"comports": (_dump_attributes(PORT_ATTRIBUTES), _load_attributes),
+	"disk_partitions": (_dump_attributes(PARTITION_ATTRIBUTES), _load_attributes),
+	"udev_devices": (_dump_udev, _load_udev),
+	"ioreg": (_dump_ioreg, _load_ioreg),
+	"usb_descriptors": (_dump_attributes(DESCRIPTOR_ATTRIBUTES), _load_attributes),
+	"wmi_disks": (_identity, _identity),
+}
+
+
+############################################################
+# sources
+############################################################
+class RecordingSource:
+	"""Wrap a live source, store what it returns in the scan's inputs"""
+	def __init__(self, source, inputs):
+		self._source = source
+		self._inputs = inputs
+
+	def drive_info(self, mount, serial=None):
+		mains, version = self._source.drive_info(mount, serial)
+		self._inputs.setdefault("drive_info", {})[mount] = [mains, version]
+		return (mains, version)
+
+	def __getattr__(self, name):
+		method = getattr(self._source, name)
+		if name.endswith("_async"):
+			# the asyncio version of an input (LiveSource.ioreg_async)
+			name = name[:-len("_async")]
+			dump, load = CONVERTERS[name]
+			async def record_async(*args, **kwargs):
+				self._inputs[name] = dump(await method(*args, **kwargs))
+				return load(self._inputs[name])
+			return record_async
+		dump, load = CONVERTERS[name]
+		def record(*args, **kwargs):
+			self._inputs[name] = dump(method(*args, **kwargs))
+			# give back what will be replayed, not what the system returned
+			return load(self._inputs[name])
+		return record
+
+
+class ReplaySource:
+	"""Give back the inputs of a recorded scan"""
+	def __init__(self, inputs):
+		self._inputs = inputs
+
+	def drive_info(self, mount, serial=None):
+		mains, version = self._inputs.get("drive_info", {}).get(mount, ([], ""))
+		return (mains, version)
+
+	def __getattr__(self, name):
+		if name not in CONVERTERS:
+			raise AttributeError(name)
+		_, load = CONVERTERS[name]
+		def replay(*args, **kwargs):
+			# a backend input that was not recorded is empty
+			return load(self._inputs.get(name, []))
+		return replay
+
+
+############################################################
+# hotplug monitors
+############################################################
+class RecordingMonitor:
+	"""Wrap a hotplug monitor, record the events it returns"""
+	def __init__(self, monitor, recorder):
+		self._monitor = monitor
+		self._recorder = recorder
+
+	def _record(self, events):
+		for event in events:
+			self._recorder.record_event(**event)
+		if events:
+			self._recorder.save()
+		return events
+
+	def wait(self, timeout=None):
+		return self._record(self._monitor.wait(timeout))
+
+	def close(self):
+		self._monitor.close()
+
+
+class AsyncRecordingMonitor(RecordingMonitor):
+	"""Wrap an asyncio hotplug monitor, record the events it returns"""
+	async def wait(self, timeout=None):
+		return self._record(await self._monitor.wait(timeout))
+
+
+class ReplayMonitor:
+	"""Give back the recorded events one by one, without waiting,
+	then wait like a polling monitor when there are no more events"""
+	def __init__(self, events):
+		self.events = list(events)
+
+	def wait(self, timeout=None):
+		if self.events:
+			event = dict(self.events.pop(0))
+			del event["time"]
+			return [event]
+		return PollingMonitor().wait(timeout)
+
+	def close(self):
+		pass
+
+
+############################################################
+# files
+############################################################
+class Recorder:
+	"""Record the scans and events into a file, saved after each scan"""
+	def __init__(self, path):
+		self.path = path
+		self.data = {
+			"format": REPLAY_FORMAT,
+			"version": REPLAY_VERSION,
+			"platform": current_platform(),
+			"scans": [],
+			"events": [],
+		}
+
+	def record_scan(self, source):
+		scan = {"time": time.time(), "inputs": {}}
+		self.data["scans"].append(scan)
+		return RecordingSource(source, scan["inputs"])
+
+	def record_event(self, kind, **info):
+		self.data["events"].append(dict(time=time.time(), kind=kind, **info))
+
+	def save(self):
+		with open(self.path, "w") as fp:
+			json.dump(self.data, fp)
+
+
+class Replayer:
+	"""Read a recorded file, give out its scans one after the other"""
+	def __init__(self, path):
+		self.path = path
+		with open(path, "r") as fp:
+			self.data = json.load(fp)
+		if self.data.get("format") != REPLAY_FORMAT:
+			raise ValueError(f"{path} is not a discotool replay file")
+		if self.data.get("version", 0) > REPLAY_VERSION:
+			raise ValueError(f"{path} was recorded by a newer discotool")
+		self.platform = self.data["platform"]
+		self.events = self.data.get("events", [])
+		self.position = 0
+
+	def next_source(self):
+		scans = self.data["scans"]
+		if len(scans) == 0:
+			return ReplaySource({})
+		scan = scans[min(self.position, len(scans) - 1)]
+		self.position += 1
+		return ReplaySource(scan["inputs"])
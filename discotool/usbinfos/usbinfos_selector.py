@@ -0,0 +1,455 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Selector expressions to pick devices, compiled once into a plan.
+
+	vid=239a pid=80f4
+	serial~^DF60
+	loc=1-2.3.*
+	drive=CIRCUITPY or (name~feather and not drive=*BOOT)
+
+A predicate is key, operator, value (quote the value if it has spaces).
+- "=" exact match, not case sensitive, with * and ? wildcards.
+- "!=" the opposite.
+- "~" regular expression search, not case sensitive.
+- "!~" the opposite.
+Predicates next to each other are combined with "and", or use "and", "or",
+"not" and parentheses. vid and pid are hexadecimal numbers.
+
+Keys: vid, pid, serial (sn), name, manufacturer, loc (location,
+usb_location), drive (volume), mount, port, version.
+
+Exact predicates (=) on vid, pid, serial, name, loc and drive use the
+indexes of a DeviceIndex to find the candidates instead of trying every
+device, the remaining predicates are then checked on those candidates.
+
+Selector.prefilter() is given to the backends, to skip the devices that
+cannot match, using only the keys known before the serial ports and drives
+are resolved (usually vid, pid, serial and loc).
+Selector.fields() are the device fields the scan must compute for it.
+"""
+
+import fnmatch
+import re
+
+KEYS = {
+	"vid": "vid",
+	"pid": "pid",
+	"serial": "serial",
+	"sn": "serial",
+	"name": "name",
+	"manufacturer": "manufacturer",
+	"loc": "loc",
+	"location": "loc",
+	"usb_location": "loc",
+	"drive": "drive",
+	"volume": "drive",
+	"mount": "mount",
+	"port": "port",
+	"version": "version",
+}
+INDEXED_KEYS = ("vid", "pid", "serial", "name", "loc", "drive")
+# the device fields needed to evaluate each key (see usbinfos_common.FIELDS)
+KEY_FIELDS = {
+	"vid": "vendor_id",
+	"pid": "product_id",
+	"serial": "serial_num",
+	"name": "name",
+	"manufacturer": "manufacturer",
+	"loc": "usb_location",
+	"drive": "volumes",
+	"mount": "volumes",
+	"port": "ports",
+	"version": "version",
+}
+WILDCARDS = re.compile(r"[*?\[]")
+
+TOKENS = re.compile(r"""
+	\s*(?:
+		(?P<open>\() | (?P<close>\)) |
+		(?P<key>[A-Za-z_]+)\s*(?P<op>!=|=|!~|~)\s*
+			(?P<value>"[^"]*"|'[^']*'|[^\s()]+) |
+		(?P<word>[A-Za-z]+)
+	)""", re.VERBOSE)
+
+
+class SelectorError(ValueError):
+	pass
+
+
+############################################################
+# device fields
+############################################################
+def location_values(location):
+	"""
+	The values of a USB location for the loc key.
+	"""
+	# on linux also match the name of the port: usb1/1-2/1-2.3 => 1-2.3
+	if "/" in location:
+		return [location, location.split("/")[-1]]
+	return [location]
+
+
+def device_values(device, key):
+	"""
+	The values of the device for a selector key, as a list.
+	"""
+	if key == "vid":
+		return [device['vendor_id']]
+	if key == "pid":
+		return [device['product_id']]
+	if key == "serial":
+		return [device['serial_num'] or ""]
+	if key == "name":
+		return [device['name'] or ""]
+	if key == "manufacturer":
+		return [device['manufacturer'] or ""]
+	if key == "loc":
+		return location_values(device.get('usb_location', "") or "")
+	if key == "version":
+		return [device.get('version', "") or ""]
+	if key == "drive":
+		return [volume['name'] for volume in device.get('volumes', [])]
+	if key == "mount":
+		return [volume['mount_point'] for volume in device.get('volumes', [])]
+	if key == "port":
+		return [port['dev'] for port in device.get('ports', [])]
+	return []
+
+
+def _index_key(key, value):
+	if key in ("vid", "pid"):
+		return value
+	return value.lower()
+
+
+class DeviceIndex:
+	"""
+	A list of devices with indexes by exact value of the INDEXED_KEYS.
+	"""
+	def __init__(self, deviceList):
+		self.devices = list(deviceList)
+		self.indexes = {key: {} for key in INDEXED_KEYS}
+		for position, device in enumerate(self.devices):
+			for key in INDEXED_KEYS:
+				for value in device_values(device, key):
+					index = self.indexes[key].setdefault(_index_key(key, value), [])
+					index.append(position)
+
+	def lookup(self, key, value):
+		return set(self.indexes[key].get(_index_key(key, value), ()))
+
+
+############################################################
+# the plan
+############################################################
+class Predicate:
+	def __init__(self, key, op, text):
+		if key.lower() not in KEYS:
+			raise SelectorError(f"Unknown selector key: {key}")
+		self.key = KEYS[key.lower()]
+		self.op = op
+		self.negate = op.startswith("!")
+		self.text = text
+		self.exact = None
+		self.glob = False
+		if op.endswith("~"):
+			try:
+				self.regex = re.compile(text, re.IGNORECASE)
+			except re.error as ex:
+				raise SelectorError(f"Invalid regular expression {text}: {ex}")
+		elif self.key in ("vid", "pid"):
+			try:
+				self.exact = int(text, 16)
+			except ValueError:
+				raise SelectorError(f"Invalid {self.key}: {text}")
+		elif WILDCARDS.search(text):
+			self.regex = re.compile(fnmatch.translate(text), re.IGNORECASE)
+			self.glob = True
+		else:
+			self.exact = text.lower()
+
+	def _match_value(self, value):
+		if self.key in ("vid", "pid"):
+			if self.exact is not None:
+				return value == self.exact
+			value = f"{value:04x}"
+		if self.exact is not None:
+			return value.lower() == self.exact
+		if self.glob:
+			return self.regex.match(value) is not None
+		return self.regex.search(value) is not None
+
+	def match(self, device):
+		found = any(self._match_value(value)
+			for value in device_values(device, self.key))
+		return found != self.negate
+
+	def prefilter(self, known):
+		if self.key not in known:
+			return None
+		found = any(self._match_value(value) for value in known[self.key])
+		return found != self.negate
+
+	def candidates(self, index):
+		if self.negate or self.exact is None or self.key not in INDEXED_KEYS:
+			return None
+		return index.lookup(self.key, self.exact)
+
+	def predicates(self):
+		yield self
+
+	def __repr__(self):
+		return f"{self.key}{self.op}{self.text}"
+
+
+class And:
+	def __init__(self, children):
+		self.children = children
+
+	def match(self, device):
+		return all(child.match(device) for child in self.children)
+
+	def prefilter(self, known):
+		result = True
+		for child in self.children:
+			value = child.prefilter(known)
+			if value is False:
+				return False
+			if value is None:
+				result = None
+		return result
+
+	def candidates(self, index):
+		result = None
+		for child in self.children:
+			found = child.candidates(index)
+			if found is not None:
+				result = found if result is None else result & found
+		return result
+
+	def predicates(self):
+		for child in self.children:
+			yield from child.predicates()
+
+	def __repr__(self):
+		return "(" + " and ".join(repr(child) for child in self.children) + ")"
+
+
+class Or:
+	def __init__(self, children):
+		self.children = children
+
+	def match(self, device):
+		return any(child.match(device) for child in self.children)
+
+	def prefilter(self, known):
+		result = False
+		for child in self.children:
+			value = child.prefilter(known)
+			if value is True:
+				return True
+			if value is None:
+				result = None
+		return result
+
+	def candidates(self, index):
+		result = set()
+		for child in self.children:
+			found = child.candidates(index)
+			if found is None:
+				return None
+			result |= found
+		return result
+
+	def predicates(self):
+		for child in self.children:
+			yield from child.predicates()
+
+	def __repr__(self):
+		return "(" + " or ".join(repr(child) for child in self.children) + ")"
+
+
+class Not:
+	def __init__(self, child):
+		self.child = child
+
+	def match(self, device):
+		return not self.child.match(device)
+
+	def prefilter(self, known):
+		value = self.child.prefilter(known)
+		if value is None:
+			return None
+		return not value
+
+	def candidates(self, index):
+		return None
+
+	def predicates(self):
+		return self.child.predicates()
+
+	def __repr__(self):
+		return f"not {self.child!r}"
+
+
+############################################################
+# parser
+############################################################
+def _tokenize(text):
+	tokens = []
+	position = 0
+	text = text.strip()
+	while position < len(text):
+		found = TOKENS.match(text, position)
+		if not found or found.end() == position:
+			raise SelectorError(f"Invalid selector at: {text[position:]}")
+		position = found.end()
+		if found.group("open"):
+			tokens.append(("(", None))
+		elif found.group("close"):
+			tokens.append((")", None))
+		elif found.group("key"):
+			value = found.group("value")
+			if value[0] in "\"'":
+				value = value[1:-1]
+			tokens.append(("pred", Predicate(found.group("key"), found.group("op"), value)))
+		else:
+			word = found.group("word").lower()
+			if word not in ("and", "or", "not"):
+				raise SelectorError(f"Invalid selector word: {found.group('word')}")
+			tokens.append((word, None))
+		position = len(text) - len(text[position:].lstrip())
+	return tokens
+
+
+class _Parser:
+	def __init__(self, tokens):
+		self.tokens = tokens
+		self.position = 0
+
+	def peek(self):
+		if self.position < len(self.tokens):
+			return self.tokens[self.position][0]
+		return None
+
+	def take(self):
+		token = self.tokens[self.position]
+		self.position += 1
+		return token
+
+	def parse_or(self):
+		children = [self.parse_and()]
+		while self.peek() == "or":
+			self.take()
+			children.append(self.parse_and())
+		return children[0] if len(children) == 1 else Or(children)
+
+	def parse_and(self):
+		children = [self.parse_not()]
+		while self.peek() in ("and", "not", "pred", "("):
+			if self.peek() == "and":
+				self.take()
+			children.append(self.parse_not())
+		return children[0] if len(children) == 1 else And(children)
+
+	def parse_not(self):
+		if self.peek() == "not":
+			self.take()
+			return Not(self.parse_not())
+		return self.parse_term()
+
+	def parse_term(self):
+		kind = self.peek()
+		if kind == "(":
+			self.take()
+			node = self.parse_or()
+			if self.peek() != ")":
+				raise SelectorError("Missing closing parenthesis in selector")
+			self.take()
+			return node
+		if kind == "pred":
+			return self.take()[1]
+		raise SelectorError(f"Unexpected {kind or 'end'} in selector")
+
+
+class Selector:
+	"""
+	A compiled selector expression, see the module documentation.
+	"""
+	def __init__(self, expression):
+		self.expression = expression
+		tokens = _tokenize(expression)
+		if not tokens:
+			raise SelectorError("Empty selector")
+		parser = _Parser(tokens)
+		self.plan = parser.parse_or()
+		if parser.position != len(tokens):
+			raise SelectorError(f"Unexpected {parser.peek()} in selector")
+
+	@classmethod
+	def contains(cls, key, text):
+		"""
+		Selector for the values of key that contain text (not case sensitive).
+		"""
+		selector = cls.__new__(cls)
+		selector.expression = f"{key}~{re.escape(text)}"
+		selector.plan = Predicate(key, "~", re.escape(text))
+		return selector
+
+	@classmethod
+	def any_of(cls, selectors):
+		"""
+		Combine compiled selectors with "or".
+		"""
+		combined = cls.__new__(cls)
+		combined.expression = " or ".join(f"({sel.expression})" for sel in selectors)
+		combined.plan = Or([sel.plan for sel in selectors])
+		return combined
+
+	def match(self, device):
+		return self.plan.match(device)
+
+	def fields(self):
+		"""
+		The device fields used by the selector.
+		"""
+		return set(KEY_FIELDS[predicate.key] for predicate in self.plan.predicates())
+
+	def prefilter(self, vid=None, pid=None, serial=None, loc=None):
+		"""
+		False if a device with these values cannot match the selector,
+		whatever the values of the other keys. None means unknown.
+		"""
+		known = {}
+		if vid is not None:
+			known["vid"] = [vid]
+		if pid is not None:
+			known["pid"] = [pid]
+		if serial is not None:
+			known["serial"] = [serial]
+		if loc is not None:
+			known["loc"] = location_values(loc)
+		return self.plan.prefilter(known) is not False
+
+	def select(self, devices):
+		"""
+		The devices matching the selector, in order, without duplicates.
+		devices is a list of devices or a DeviceIndex.
+		"""
+		if isinstance(devices, DeviceIndex):
+			index = devices
+		else:
+			index = DeviceIndex(devices)
+		candidates = self.plan.candidates(index)
+		if candidates is None:
+			positions = range(len(index.devices))
+		else:
+			positions = sorted(candidates)
+		# positions are unique: no comparison of the devices' contents
+		return [index.devices[position] for position in positions
+			if self.plan.match(index.devices[position])]
+
+	def __repr__(self):
+		return f"Selector({self.plan!r})"
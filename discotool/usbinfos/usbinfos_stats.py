@@ -0,0 +1,124 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Timings and counters of a scan.
+
+Every call to the source of a scan (comports, disk_partitions, udev_devices,
+ioreg, wmi_disks, usb_descriptors, drive_info) is a phase, timed with a
+monotonic clock. What is left of the scan's duration is the "correlate"
+phase: matching ports and volumes to the devices in the backend.
+With the asyncio API the phases run concurrently, their sum can be more
+than the total.
+
+Counters:
+- devices_seen: USB devices looked at by the backend.
+- ports_matched: serial ports attributed to a device.
+- drives_probed: drives read for Circuitpython informations (--info).
+- cache_hits: drive informations reused for a drive already probed.
+- drive_timeouts: drives that did not answer in time when probed.
+- devices_skipped: devices not resolved because they can't be selected.
+"""
+
+import asyncio
+import threading
+import time
+from .usbinfos_trace import span
+
+COUNTERS = (
+	"devices_seen", "ports_matched", "drives_probed", "cache_hits",
+	"drive_timeouts", "devices_skipped",
+)
+
+
+class ScanStats:
+	def __init__(self, backend=""):
+		self.backend = backend
+		self.phases = {}
+		self.counters = {name: 0 for name in COUNTERS}
+		self.start = time.monotonic()
+		self.total = None
+
+	def add_phase(self, name, duration):
+		self.phases[name] = self.phases.get(name, 0) + duration
+
+	def count(self, name, number=1):
+		self.counters[name] = self.counters.get(name, 0) + number
+
+	def finish(self):
+		self.total = time.monotonic() - self.start
+		self.phases["correlate"] = max(0, self.total - sum(self.phases.values()))
+
+	def as_dict(self):
+		return {
+			"backend": self.backend,
+			"total": self.total,
+			"phases": dict(self.phases),
+			"counters": dict(self.counters),
+		}
+
+
+class TimedSource:
+	"""Wrap the source of a scan, time its methods and count the probes.
+	The methods can be called from several threads (see usbinfos_async)."""
+	def __init__(self, source, stats):
+		self._source = source
+		self._drive_info = {}
+		self._lock = threading.Lock()
+		self.stats = stats
+
+	def count(self, name, number=1):
+		with self._lock:
+			self.stats.count(name, number)
+
+	def add_phase(self, name, duration):
+		with self._lock:
+			self.stats.add_phase(name, duration)
+
+	def drive_info(self, mount, serial=None):
+		# serial: the serial number of the board, for the trace
+		with self._lock:
+			if mount in self._drive_info:
+				self.stats.count("cache_hits")
+				return self._drive_info[mount]
+		start = time.monotonic()
+		with span("scan.drive_info", serial=serial, mount=mount) as trace:
+			try:
+				info = self._source.drive_info(mount, serial)
+			except TimeoutError:
+				self.count("drive_timeouts")
+				trace["outcome"] = "timeout"
+				info = ([], "")
+		with self._lock:
+			self.stats.add_phase("drive_info", time.monotonic() - start)
+			self.stats.count("drives_probed")
+			self._drive_info[mount] = info
+		return info
+
+	async def fetch(self, name):
+		"""
+		Read an input without blocking the event loop: with the asyncio
+		version of the method (name_async) if the source has one,
+		otherwise in the default executor.
+		"""
+		method = getattr(self._source, name + "_async", None)
+		if method is None:
+			loop = asyncio.get_running_loop()
+			return await loop.run_in_executor(None, getattr(self, name))
+		start = time.monotonic()
+		try:
+			with span("scan." + name):
+				return await method()
+		finally:
+			self.add_phase(name, time.monotonic() - start)
+
+	def __getattr__(self, name):
+		method = getattr(self._source, name)
+		def timed(*args, **kwargs):
+			start = time.monotonic()
+			try:
+				with span("scan." + name):
+					return method(*args, **kwargs)
+			finally:
+				self.add_phase(name, time.monotonic() - start)
+		return timed
@@ -0,0 +1,92 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+"""
+Opt-in trace of the scans and commands, one JSON line per span, appended to
+the file given by the DISCOTOOL_TRACE environment variable (or set_trace()).
+
+{"span": "scan.comports", "start": 1700000000.1, "end": 1700000000.2,
+ "duration": 0.1, "outcome": "ok", "host": "rig-12", "pid": 1234,
+ "trace_id": "9f0c...", ...attributes like "serial", "mount", "command"}
+
+The outcome is "ok", or "error" with the exception in "error", "stopped"
+for a scan that was not iterated to the end, or another value set by the
+code of the span (like "error" and the "returncode" of a command that
+failed).
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+_trace_path = None
+_trace_file = None
+_trace_lock = threading.Lock()
+_trace_base = {}
+
+
+def set_trace(path):
+	"""
+	Append the spans to the file at path, None to stop tracing.
+	"""
+	global _trace_path, _trace_file, _trace_base
+	with _trace_lock:
+		if _trace_file is not None:
+			_trace_file.close()
+		_trace_path = path
+		_trace_file = None
+		if path:
+			_trace_file = open(path, "a", buffering=1)
+			_trace_base = {
+				"host": socket.gethostname(),
+				"pid": os.getpid(),
+				"trace_id": uuid.uuid4().hex,
+			}
+
+if os.environ.get("DISCOTOOL_TRACE"):
+	set_trace(os.environ["DISCOTOOL_TRACE"])
+
+
+def tracing():
+	return _trace_file is not None
+
+
+def _write(record):
+	line = json.dumps(record, default=str)
+	with _trace_lock:
+		if _trace_file is not None:
+			_trace_file.write(line + "\n")
+
+
+@contextmanager
+def span(name, **attributes):
+	"""
+	Trace the code in the with block, yields a dictionary of attributes
+	that can be completed (set "outcome" to override the default).
+	"""
+	if _trace_file is None:
+		yield attributes
+		return
+	record = dict(_trace_base, span=name, outcome="ok")
+	record.update(attributes)
+	start = time.time()
+	clock = time.monotonic()
+	try:
+		yield record
+	except GeneratorExit:
+		# a generator (like a scan) that was closed before its end
+		record["outcome"] = "stopped"
+		raise
+	except BaseException as ex:
+		record["outcome"] = "error"
+		record["error"] = repr(ex)
+		raise
+	finally:
+		record["start"] = start
+		record["end"] = start + (time.monotonic() - clock)
+		record["duration"] = record["end"] - start
+		_write(record)
@@ -4,10 +4,60 @@
 
 import os
 import re
-import wmi
-from .pyserial_list_ports_windows import comports
 from .usbinfos_common import *
-from . import usb_descriptor_win32
+
+# the inputs of a scan and the fields that need them (None: always)
+PHASES = {
+	# the serial ports are needed to find the devices
+	"comports": None,
+	# the descriptors give the strings, the location and the VID/PID of drives
+	"usb_descriptors": ("name", "manufacturer", "usb_location", "volumes"),
+	"wmi_disks": ("volumes",),
+}
+
+class LiveSource(BaseSource):
+	def comports(self):
+		from .pyserial_list_ports_windows import comports
+		return comports()
+
+	def usb_descriptors(self):
+		from . import usb_descriptor_win32
+		return usb_descriptor_win32.get_all_devices()
+
+	def wmi_disks(self):
+		"""List the USB disk drives from WMI, with their removable volumes
+		and the related "windows portable drive" entities, as plain rows.
+		"""
+		import wmi
+		wmi_info = wmi.WMI()
+		portable_drives = [
+			{
+				"PNPDeviceID": ppi.PNPDeviceID,
+				"manufacturer": ppi.manufacturer,
+				"description": ppi.description,
+			}
+			for ppi in wmi_info.Win32_PnPEntity(pnpclass="WPD")
+		]
+		disks = []
+		for physical_disk in wmi_info.Win32_DiskDrive ():
+			if physical_disk.InterfaceType != "USB": continue
+			volumes = []
+			for partition in physical_disk.associators ("Win32_DiskDriveToDiskPartition"):
+				for logical_disk in partition.associators ("Win32_LogicalDiskToPartition"):
+					volumes.append({
+						"DriveType": logical_disk.DriveType,
+						"VolumeName": logical_disk.VolumeName,
+						"DeviceID": logical_disk.DeviceID,
+					})
+			disks.append({
+				"PNPDeviceID": physical_disk.PNPDeviceID,
+				"caption": physical_disk.caption,
+				"SerialNumber": physical_disk.SerialNumber,
+				"volumes": volumes,
+				"portable_drives": [ppi for ppi in portable_drives
+					if physical_disk.PNPDeviceID.replace("\\","#") in ppi["PNPDeviceID"]],
+			})
+		return disks
 
 def filter_port_description(description):
 	m = re.match(".*%(.+)%.*", description)
@@ -17,61 +67,73 @@ def filter_port_description(description):
 		name = description
 	return name.replace("_"," ").title()
 
-def get_devices_list(drive_info=False):
-	remainingPorts = [x for x in comports() if x.vid is not None]
-	deviceList = []
+def get_devices_list(drive_info=False, source=None, wanted=None, fields=None):
+	return collect_devices(iter_devices(drive_info, source, wanted, fields))
+
+def iter_devices(drive_info=False, source=None, wanted=None, fields=None):
+	if source is None:
+		source = LiveSource()
+	if fields is None:
+		fields = FIELDS
+	remainingPorts = [x for x in source.comports() if x.vid is not None]
 
 	serialNumbers = set(x.serial_number.upper() for x in remainingPorts)
 
+	usb_descriptors = []
+	if phase_needed(PHASES, "usb_descriptors", fields):
+		usb_descriptors = source.usb_descriptors()
 	descriptors = {
 		# f"USB\\VID_{dev.vid:04X}&PID_{dev.pid:04X}\\{dev.serial_number}"
 		(dev.vid, dev.pid, dev.serial_number): dev
-		for dev in usb_descriptor_win32.get_all_devices()
+		for dev in usb_descriptors
 	}
 	vid_pid_by_serial = {
 		dev.serial_number: (dev.vid, dev.pid, )
-		for dev in usb_descriptor_win32.get_all_devices()
+		for dev in usb_descriptors
 	}
 
 	allMounts = []
-	wmi_info = wmi.WMI()
-	for physical_disk in wmi_info.Win32_DiskDrive ():
-		if physical_disk.InterfaceType != "USB": continue
+	physical_disks = []
+	if phase_needed(PHASES, "wmi_disks", fields):
+		physical_disks = source.wmi_disks()
+	for physical_disk in physical_disks:
 		volumes = []
 		manufacturer, product = "", ""
-		pnp_id = physical_disk.PNPDeviceID.replace("\\","#")
-		for partition in physical_disk.associators ("Win32_DiskDriveToDiskPartition"):
-			for logical_disk in partition.associators ("Win32_LogicalDiskToPartition"):
-				if logical_disk.DriveType == 2: # removable
-					volumes.append(logical_disk)
-					# try to find info from related "windows portable drive" entity
-					for ppi in wmi_info.Win32_PnPEntity(pnpclass="WPD"):
-						if pnp_id in ppi.PNPDeviceID:
-							manufacturer = ppi.manufacturer or manufacturer
-							product = ppi.description or product
+		for logical_disk in physical_disk["volumes"]:
+			if logical_disk["DriveType"] == 2: # removable
+				volumes.append(logical_disk)
+				# try to find info from related "windows portable drive" entity
+				for ppi in physical_disk["portable_drives"]:
+					manufacturer = ppi["manufacturer"] or manufacturer
+					product = ppi["description"] or product
 		# default information from the caption
-		if physical_disk.caption:
+		if physical_disk["caption"]:
 			# guessing the Manufacturer is the first word
-			manufacturer = manufacturer or physical_disk.caption.split(" ")[0]
+			manufacturer = manufacturer or physical_disk["caption"].split(" ")[0]
 			# guessing it ends with "USB Device"
-			product = product or " ".join(physical_disk.caption.split(" ")[1:-2])
+			product = product or " ".join(physical_disk["caption"].split(" ")[1:-2])
 		allMounts.append({
 			"manufacturer": manufacturer.strip(),
 			"product": product.strip(),
 			"disk": physical_disk,
 			"volumes": volumes,
 		})
-		serialNumbers.add(physical_disk.SerialNumber)
+		serialNumbers.add(physical_disk["SerialNumber"])
 	
 	# how to get the actual list of USB connected devices in a useful way ?
 	# for now we take anything with a serial number: serial ports and disk drives
 	devices = serialNumbers
 
 	for device in sorted(devices):
+		source.count("devices_seen")
 		curDevice = {}
 		deviceVolumes = []
 		name = ""
 		SN = device.upper()
+		# only the serial number is known before matching ports and drives
+		if wanted is not None and not wanted(serial=SN):
+			source.count("devices_skipped")
+			continue
 
 		ttys = []
 		vid = "0"
@@ -87,25 +149,26 @@ def get_devices_list(drive_info=False):
 				iface = port.interface or ""
 				ttys.append({'dev':port.device,'iface':iface})
 				remainingPorts.remove(port)
+				source.count("ports_matched")
 
 		version = ""
 		mains = []
 		deviceVolumes = []
 		for mount in allMounts:
-			if mount["disk"].SerialNumber == SN:
+			if mount["disk"]["SerialNumber"] == SN:
 				if mount["manufacturer"]:
 					manufacturer = mount["manufacturer"]
 				if mount["product"]:
 					name = mount["product"]
 				for disk in mount["volumes"]:
-					if disk.VolumeName is None:
+					if disk["VolumeName"] is None:
 						# disk unmounted or something
 						continue
-					volume = disk.DeviceID
+					volume = disk["DeviceID"]
 					if drive_info:
-						mains,version = get_cp_drive_info(volume)
+						mains,version = source.drive_info(volume, SN)
 					deviceVolumes.append({
-						'name': disk.VolumeName,
+						'name': disk["VolumeName"],
 						'mount_point': volume+"\\",
 						'mains': mains,
 					})
@@ -135,7 +198,7 @@ def get_devices_list(drive_info=False):
 		curDevice['ports'] = ttys
 		curDevice['version'] = version
 		curDevice['usb_location'] = location
-		deviceList.append(curDevice)
+		yield curDevice
 
 	rp = [port.device for port in remainingPorts]
-	return (deviceList,rp)
+	return rp
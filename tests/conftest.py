@@ -0,0 +1,72 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import json
+import pytest
+from discotool import usbinfos
+
+
+def board_inputs(index, root, pid=0x80f4, version="9.0.0"):
+	"""
+	The recorded inputs of the linux backend for a board with a drive,
+	a REPL and a DATA port.
+	"""
+	serial = f"DF60{index:04X}"
+	mount = root / f"CIRCUITPY{index}"
+	mount.mkdir(exist_ok=True)
+	block = f"/dev/sd{chr(ord('b') + index)}1"
+	ports = [f"/dev/ttyACM{2 * index}", f"/dev/ttyACM{2 * index + 1}"]
+	return {
+		"udev_devices": [{
+			"properties": {
+				"TYPE": "239/2/1", "ID_VENDOR_ID": "239a", "ID_MODEL_ID": f"{pid:04x}",
+				"DEVPATH": f"/devices/pci0000:00/0000:00:14.0/usb1/1-2/1-2.{index + 1}",
+				"ID_VENDOR": "Adafruit", "ID_MODEL": "QT_Py_RP2040", "ID_SERIAL_SHORT": serial,
+			},
+			"children": [{"subsystem": "tty", "properties": {"DEVNAME": port}} for port in ports]
+				+ [{"subsystem": "block", "properties": {"DEVNAME": block}}],
+		}],
+		"comports": [{
+			"device": port, "name": port[5:], "description": "", "hwid": "",
+			"vid": 0x239a, "pid": pid, "serial_number": serial,
+			"location": f"1-2.{index + 1}:1.0", "manufacturer": "Adafruit",
+			"product": "QT Py RP2040", "interface": f"CircuitPython {kind} control",
+		} for port, kind in zip(ports, ("CDC", "CDC2"))],
+		"disk_partitions": [{"device": block, "mountpoint": str(mount), "fstype": "vfat", "opts": "rw"}],
+		"drive_info": {str(mount): [["code.py"], version]},
+	}
+
+
+def scan_inputs(boards):
+	"""
+	Merge the inputs of the boards into the inputs of a scan.
+	"""
+	inputs = {"udev_devices": [], "comports": [], "disk_partitions": [], "drive_info": {}}
+	for board in boards:
+		for name, value in board.items():
+			if name == "drive_info":
+				inputs[name].update(value)
+			else:
+				inputs[name] += value
+	return inputs
+
+
+@pytest.fixture
+def replay(tmp_path, monkeypatch):
+	"""
+	replay(scans, events=()) writes a linux replay file with the scans
+	(lists of board_inputs) and selects it as the backend for the test.
+	"""
+	monkeypatch.setattr(usbinfos, "_backend_spec", None)
+	monkeypatch.setattr(usbinfos, "_replayer", None)
+	def load(scans, events=()):
+		path = tmp_path / "replay.json"
+		path.write_text(json.dumps({
+			"format": "discotool-replay", "version": 1, "platform": "linux",
+			"scans": [{"time": number, "inputs": scan_inputs(boards)}
+				for number, boards in enumerate(scans)],
+			"events": [dict(event, time=0) for event in events],
+		}))
+		usbinfos.set_backend(f"replay:{path}")
+		return path
+	return load
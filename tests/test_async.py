@@ -0,0 +1,60 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import asyncio
+from conftest import board_inputs
+from discotool import usbinfos
+
+
+def test_async_scan(tmp_path, replay):
+	replay([[board_inputs(index, tmp_path) for index in range(3)]])
+	async def main():
+		# the event loop keeps running during the scan
+		ticks = []
+		async def ticker():
+			while True:
+				ticks.append(None)
+				await asyncio.sleep(0)
+		task = asyncio.create_task(ticker())
+		result = await usbinfos.scan(drive_info=True, selector="serial=DF600002")
+		task.cancel()
+		return result, ticks
+	(devices, ports), ticks = asyncio.run(main())
+	assert ticks
+	assert [device.serial_num for device in devices] == ["DF600002"]
+	assert devices[0]["version"] == "9.0.0"
+	assert len(ports) == 4
+	assert devices == usbinfos.get_devices_list(drive_info=True, selector="serial=DF600002")[0]
+
+
+def test_async_watch(tmp_path, replay):
+	boards = [board_inputs(index, tmp_path) for index in range(2)]
+	replay([boards[:1], boards, [board_inputs(1, tmp_path, version="9.1.0")]],
+		events=[{"kind": "add"}, {"kind": "remove"}])
+	async def main():
+		events = []
+		async for event in usbinfos.watch(drive_info=True):
+			events.append((event["event"], event["device"]["serial_num"], event["changes"]))
+			if len(events) == 4:
+				return events
+	assert asyncio.run(main()) == [
+		("added", "DF600000", []),
+		("added", "DF600001", []),
+		("removed", "DF600000", []),
+		("changed", "DF600001", ["version"]),
+	]
+
+
+def test_async_version_of_the_circuitpython_drive(tmp_path, replay):
+	boards = [board_inputs(index, tmp_path) for index in range(20)]
+	for index, board in enumerate(boards):
+		# a second drive on the board, without boot_out.txt
+		block = f"/dev/sd{chr(ord('b') + index)}2"
+		board["udev_devices"][0]["children"].append({"subsystem": "block", "properties": {"DEVNAME": block}})
+		board["disk_partitions"].append({"device": block, "mountpoint": str(tmp_path / f"DATA{index}"),
+			"fstype": "vfat", "opts": "rw"})
+	replay([boards])
+	devices, _ = asyncio.run(usbinfos.scan(drive_info=True))
+	assert [len(device["volumes"]) for device in devices] == [2] * 20
+	assert [device["version"] for device in devices] == ["9.0.0"] * 20
+	assert usbinfos.last_scan_stats()["counters"]["drives_probed"] == 40
@@ -0,0 +1,51 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import os
+from discotool.backup import backup_drive, manifest_path
+
+
+def tree(root):
+	found = {}
+	for dirpath, dirnames, filenames in os.walk(root):
+		for name in dirnames:
+			found[os.path.relpath(os.path.join(dirpath, name), root) + os.sep] = None
+		for name in filenames:
+			path = os.path.join(dirpath, name)
+			with open(path, "rb") as fp:
+				found[os.path.relpath(path, root)] = fp.read()
+	return found
+
+
+def make_drive(root):
+	os.makedirs(root / "lib" / "adafruit_display_text")
+	os.makedirs(root / "sd")
+	(root / "code.py").write_bytes(b"print(1)\n")
+	(root / "code.py.tmp").write_bytes(b"my notes\n")
+	(root / "lib" / "adafruit_display_text" / "label.mpy").write_bytes(b"\x00" * 100)
+
+
+def test_backup_and_incremental(tmp_path):
+	drive = tmp_path / "CIRCUITPY"
+	make_drive(drive)
+	job = {
+		"source": str(drive),
+		"destination": str(tmp_path / "backup" / "1"),
+		"manifest": manifest_path(str(tmp_path / "backup"), "TEST_CIRCUITPY"),
+	}
+	result = backup_drive(job)
+	assert not result.errors
+	assert result.files_copied == 3
+	assert tree(tmp_path / "backup" / "1") == tree(drive)
+	# the empty directory is kept
+	assert os.path.isdir(tmp_path / "backup" / "1" / "sd")
+	(drive / "code.py").write_bytes(b"print(2)\n")
+	job["destination"] = str(tmp_path / "backup" / "2")
+	result = backup_drive(job)
+	assert not result.errors
+	assert result.files_copied == 1
+	assert result.files_unchanged == 2
+	assert tree(tmp_path / "backup" / "2") == tree(drive)
+	# no temporary file left
+	for name in os.listdir(tmp_path / "backup" / ".discotool"):
+		assert name.endswith(".json")
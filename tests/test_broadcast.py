@@ -0,0 +1,121 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import os
+import select
+import sys
+import threading
+import time
+import pytest
+from discotool import broadcast, serialpool
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="needs ptys")
+pytest.importorskip("serial")
+
+BOARDS = 10
+
+
+class Device(dict):
+	def __init__(self, serial, data):
+		super().__init__(serial_num=serial, name="Board", volumes=[
+			{"name": "CIRCUITPY", "mount_point": "/media/CIRCUITPY", "mains": []}])
+		self.repl = None
+		self.data = data
+
+
+class Board:
+	"""
+	A pty that answers "ok" and the payload in upper case, or nothing.
+	"""
+	def __init__(self, silent=False):
+		import tty
+		self.master, self.slave = os.openpty()
+		tty.setraw(self.master)
+		tty.setraw(self.slave)
+		self.path = os.ttyname(self.slave)
+		self.silent = silent
+		self.received = b""
+		self.closing = threading.Event()
+		self.thread = threading.Thread(target=self.run, daemon=True)
+		self.thread.start()
+
+	def run(self):
+		while not self.closing.is_set():
+			readable, _, _ = select.select([self.master], [], [], 0.05)
+			if readable:
+				data = os.read(self.master, 1024)
+				self.received += data
+				if not self.silent:
+					os.write(self.master, b"ok " + data.upper())
+
+	def close(self):
+		self.closing.set()
+		self.thread.join()
+		os.close(self.master)
+		os.close(self.slave)
+
+
+@pytest.fixture
+def boards(monkeypatch):
+	boards = [Board(silent=index == BOARDS - 1) for index in range(BOARDS)]
+	devices = [Device(f"SN{index}", board.path) for index, board in enumerate(boards)]
+	monkeypatch.setattr(serialpool, "get_identified_devices", lambda fields=None: devices)
+	yield boards, devices
+	for board in boards:
+		board.close()
+
+
+def test_broadcast_replies(boards):
+	boards, devices = boards
+	done = []
+	results = broadcast.broadcast(devices, b"show\n", reply=True, timeout=0.3, done=done.append)
+	assert len(done) == BOARDS
+	for board, result in zip(boards[:-1], results):
+		assert board.received == b"show\n"
+		assert result.ok
+		assert result.reply == b"ok SHOW\n"
+		assert result.latency >= result.write_time
+	# the silent board times out
+	assert boards[-1].received == b"show\n"
+	assert not results[-1].ok
+	assert results[-1].reply == b""
+
+
+def test_broadcast_templates(boards):
+	boards, devices = boards
+	payload = broadcast.template_payload("{index} {serial} {drive}\n")
+	results = broadcast.broadcast(devices, payload)
+	assert all(result.ok for result in results)
+	assert all(result.reply is None for result in results)
+	# the boards read what was written
+	time.sleep(0.1)
+	for index, board in enumerate(boards):
+		assert board.received == f"{index} SN{index} CIRCUITPY\n".encode()
+
+
+def test_broadcast_errors(boards):
+	boards, devices = boards
+	devices = [Device("", boards[0].path), Device("SN1", None)]
+	results = broadcast.broadcast(devices, broadcast.template_payload("{nope}"))
+	assert [result.error for result in results] == ["no serial number", "no data port"]
+	results = broadcast.broadcast(devices[:1] + [Device("SN1", boards[1].path)],
+		broadcast.template_payload("{nope}"))
+	assert results[1].error.startswith("bad payload template")
+
+
+def test_unescape():
+	assert broadcast.unescape("a\\n\\x00\\\\é") == "a\n\x00\\é".encode("utf-8")
+
+
+def test_broadcast_uses_the_ports_of_the_devices(boards, monkeypatch):
+	boards, devices = boards
+	scans = []
+	monkeypatch.setattr(serialpool, "get_identified_devices",
+		lambda fields=None: scans.append(fields) or devices)
+	results = broadcast.broadcast(devices[:-1], b"show\n", reply=True, timeout=0.3)
+	assert all(result.ok for result in results)
+	assert scans == []
+	# the board reset under another name since the devices were scanned
+	results = broadcast.broadcast([Device("SN0", "/dev/nope")], b"show\n", reply=True, timeout=0.3)
+	assert results[0].ok
+	assert len(scans) == 1
@@ -0,0 +1,67 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import gzip
+import os
+import threading
+import time
+from discotool import capture
+from discotool.capture import CaptureFile, PortResolver
+
+
+class Device(dict):
+	def __init__(self, serial, repl):
+		super().__init__(serial_num=serial, usb_location="1-1", name="Board",
+			vendor_id=0x239A, product_id=0x80F4)
+		self.repl = repl
+		self.data = None
+
+
+class Monitor:
+	def wait(self, timeout=None):
+		time.sleep(min(timeout, 0.05))
+		return []
+
+	def close(self):
+		pass
+
+
+def test_resolver_does_not_scan_in_port(monkeypatch):
+	scanned = threading.Event()
+	def slow_scan(fields=None):
+		time.sleep(0.5)
+		scanned.set()
+		return [Device("ABC", "/dev/new")]
+	monkeypatch.setattr(capture, "get_identified_devices", slow_scan)
+	monkeypatch.setattr(capture, "hotplug_monitor", Monitor)
+	monkeypatch.setattr(capture, "RESCAN_INTERVAL", 0.05)
+	device = Device("ABC", "/dev/old")
+	resolver = PortResolver(devices=[device])
+	resolver.start()
+	try:
+		identity = capture.device_identity(device)
+		start = time.monotonic()
+		assert resolver.port(identity) == "/dev/old"
+		assert time.monotonic() - start < 0.1
+		# the scan of the thread replaces the devices
+		assert scanned.wait(2)
+		time.sleep(0.05)
+		assert resolver.port(identity) == "/dev/new"
+	finally:
+		resolver.close()
+
+
+def test_capture_file_rotation(tmp_path):
+	compressor = capture.ThreadPoolExecutor(max_workers=1)
+	capture_file = CaptureFile(str(tmp_path), "board", max_size=100,
+		compression="gz", compressor=compressor)
+	capture_file.write(b"x" * 60)
+	capture_file.write(b"y" * 60)
+	capture_file.write(b"z" * 10)
+	capture_file.close()
+	compressor.shutdown(wait=True)
+	rotated = [name for name in os.listdir(tmp_path) if name.endswith(".gz")]
+	assert len(rotated) == 1
+	with gzip.open(tmp_path / rotated[0]) as fp:
+		assert fp.read() == b"x" * 60 + b"y" * 60
+	assert (tmp_path / "board.log").read_bytes() == b"z" * 10
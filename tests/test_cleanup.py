@@ -0,0 +1,46 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import os
+from discotool.cleanup import find_all, remove_all
+
+
+def make_drive(root):
+	os.makedirs(root / "lib" / "._hidden")
+	os.makedirs(root / ".Trashes" / "501")
+	(root / "code.py").write_bytes(b"print(1)\n")
+	(root / "._code.py").write_bytes(b"x" * 4096)
+	(root / ".DS_Store").write_bytes(b"x" * 100)
+	(root / "lib" / "._a.mpy").write_bytes(b"x" * 4096)
+	(root / "lib" / "a.mpy").write_bytes(b"a")
+	(root / "lib" / "._hidden" / "file").write_bytes(b"x")
+	(root / ".Trashes" / "501" / "file").write_bytes(b"x")
+
+
+def test_cleanup_drives(tmp_path):
+	jobs = []
+	for index in range(3):
+		drive = tmp_path / f"CIRCUITPY{index}"
+		make_drive(drive)
+		jobs.append({"serial": str(index), "source": str(drive)})
+	find_all(jobs)
+	for job in jobs:
+		names = [os.path.relpath(candidate.path, job["source"]) for candidate in job["candidates"]]
+		# the matching directories are removed whole, not walked
+		assert names == sorted(["._code.py", ".DS_Store", ".Trashes",
+			os.path.join("lib", "._a.mpy"), os.path.join("lib", "._hidden")])
+	results = remove_all(jobs)
+	for result in results:
+		assert result.removed == 5
+		assert not result.errors
+	for index in range(3):
+		drive = tmp_path / f"CIRCUITPY{index}"
+		assert sorted(os.listdir(drive)) == ["code.py", "lib"]
+		assert os.listdir(drive / "lib") == ["a.mpy"]
+
+
+def test_cleanup_patterns(tmp_path):
+	make_drive(tmp_path)
+	(tmp_path / "lib" / "old.bak").write_bytes(b"x")
+	jobs = find_all([{"serial": "0", "source": str(tmp_path)}], ["*.bak"])
+	assert [candidate.path for candidate in jobs[0]["candidates"]] == [str(tmp_path / "lib" / "old.bak")]
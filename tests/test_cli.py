@@ -0,0 +1,40 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import sys
+import pytest
+from click.testing import CliRunner
+from conftest import board_inputs
+from discotool.discotool import main
+
+
+@pytest.mark.parametrize("criteria", [
+	["-m", "circuitpy1"],
+	["-a", "-m", "circuitpy1"],
+	["-a", "-s", "df600001"],
+	["-a", "-S", "version=9.* and drive=CIRCUITPY1"],
+])
+def test_select_with_auto(tmp_path, replay, criteria):
+	# --auto scans all the boards, the selection still needs its fields
+	replay([[board_inputs(index, tmp_path) for index in range(2)]])
+	result = CliRunner().invoke(main, criteria + ["get", "port"])
+	assert result.exit_code == 0
+	assert result.stdout == "/dev/ttyACM2\n"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="posix shell commands")
+def test_circup_on_several_boards(tmp_path, replay, monkeypatch):
+	from discotool import discotool
+	boards = [board_inputs(index, tmp_path) for index in range(3)]
+	for index in range(3):
+		(tmp_path / f"CIRCUITPY{index}" / "boot_out.txt").write_text("Adafruit CircuitPython 9.0.0\n")
+	replay([boards])
+	monkeypatch.setitem(discotool.conf, "CIRCUP", "echo circup")
+	result = CliRunner().invoke(main, ["-S", "vid=239a", "update"])
+	assert result.exit_code == 0
+	lines = [line for line in result.stdout.splitlines() if "] circup" in line]
+	# the first board runs alone, and no board is asked for each module
+	assert lines[0] == f"[CIRCUITPY0 DF600000] circup --path {tmp_path / 'CIRCUITPY0'} update --all"
+	assert sorted(lines[1:]) == [
+		f"[CIRCUITPY{index} DF60000{index}] circup --path {tmp_path / f'CIRCUITPY{index}'} update --all"
+		for index in (1, 2)]
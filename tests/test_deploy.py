@@ -0,0 +1,76 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from discotool import deploy
+from discotool.deploy import SourceTree, deploy_all
+
+
+def make_project(root):
+	os.makedirs(root / "lib")
+	(root / "code.py").write_bytes(b"import lib.a\n")
+	(root / "lib" / "a.py").write_bytes(b"x = 1\n")
+	(root / "lib" / "b.py").write_bytes(b"y = 2\n")
+
+
+def test_hashes_in_parallel_once(tmp_path, monkeypatch):
+	make_project(tmp_path)
+	hashed = []
+	lock = threading.Lock()
+	def slow_hash(path):
+		with lock:
+			hashed.append(path)
+		time.sleep(0.3)
+		return path
+	monkeypatch.setattr(deploy, "file_hash", slow_hash)
+	tree = SourceTree(str(tmp_path))
+	start = time.monotonic()
+	with ThreadPoolExecutor(max_workers=9) as pool:
+		list(pool.map(tree.hash, list(tree.files) * 3))
+	# three files hashed at the same time, each one once
+	assert time.monotonic() - start < 0.6
+	assert sorted(hashed) == sorted(os.path.join(str(tmp_path), relative) for relative in tree.files)
+
+
+def test_deploy_only_the_changes(tmp_path):
+	source = tmp_path / "project"
+	make_project(source)
+	boards = [tmp_path / f"CIRCUITPY{index}" for index in range(3)]
+	jobs = []
+	for board in boards:
+		board.mkdir()
+		jobs.append({"serial": board.name, "destination": str(board)})
+	results = deploy_all(SourceTree(str(source)), jobs)
+	assert [result.files_written for result in results] == [3, 3, 3]
+	# written in order, code.py last
+	assert results[0].changes == [os.path.join("lib", "a.py"), os.path.join("lib", "b.py"), "code.py"]
+	(source / "lib" / "b.py").write_bytes(b"y = 3\n")
+	# an edit later than the FAT time resolution
+	later = time.time() + 10
+	os.utime(source / "lib" / "b.py", (later, later))
+	results = deploy_all(SourceTree(str(source)), jobs)
+	assert [result.changes for result in results] == [[os.path.join("lib", "b.py")]] * 3
+	for board in boards:
+		assert (board / "lib" / "b.py").read_bytes() == b"y = 3\n"
+
+
+def test_same_size_edit_within_the_resolution(tmp_path):
+	source = tmp_path / "project"
+	make_project(source)
+	board = tmp_path / "CIRCUITPY"
+	board.mkdir()
+	jobs = [{"serial": "A", "destination": str(board)}]
+	os.utime(source / "code.py", (1000.9, 1000.9))
+	deploy_all(SourceTree(str(source)), jobs)
+	assert os.stat(board / "code.py").st_mtime == 1000
+	result = deploy_all(SourceTree(str(source)), jobs)[0]
+	assert (result.files_written, result.files_hashed) == (0, 0)
+	# saved 1.2 seconds later, same size
+	(source / "code.py").write_bytes(b"import lib.b\n")
+	os.utime(source / "code.py", (1002.1, 1002.1))
+	result = deploy_all(SourceTree(str(source)), jobs)[0]
+	assert (result.changes, result.files_hashed) == (["code.py"], 1)
+	assert (board / "code.py").read_bytes() == b"import lib.b\n"
@@ -0,0 +1,29 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+from discotool.usbinfos import device_identity, diff_devices
+
+
+def make_device(serial, loc="usb1/1-2", volumes=()):
+	return {"name": "Feather", "vendor_id": 0x239a, "product_id": 0x80f4,
+		"serial_num": serial, "usb_location": loc, "volumes": list(volumes)}
+
+
+def test_diff_devices():
+	previous = [make_device("A"), make_device("B"), make_device("", "usb1/1-3")]
+	current = [make_device("B", volumes=[{"name": "CIRCUITPY"}]),
+		make_device("", "usb1/1-3"), make_device("C")]
+	events = diff_devices(previous, current)
+	assert [(event["event"], event["device"]["serial_num"]) for event in events] == [
+		("removed", "A"), ("changed", "B"), ("added", "C")]
+	assert events[1]["changes"] == ["volumes"]
+	# the same with dictionaries by identity
+	by_identity = lambda devices: {device_identity(device): device for device in devices}
+	assert diff_devices(by_identity(previous), by_identity(current)) == events
+	assert diff_devices(current, current) == []
+
+
+def test_identity_without_serial():
+	# a board without serial number is known by its USB port
+	assert device_identity(make_device("", "usb1/1-3")) != device_identity(make_device("", "usb1/1-4"))
+	assert device_identity(make_device("A", "usb1/1-3")) == device_identity(make_device("A", "usb1/1-4"))
@@ -0,0 +1,24 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import pytest
+from conftest import board_inputs
+from discotool import usbinfos
+
+
+def test_only_the_fields_asked(tmp_path, replay):
+	replay([[board_inputs(index, tmp_path) for index in range(3)]])
+	devices = usbinfos.get_identified_devices(drive_info=True, fields=["serial_num"])
+	assert [device["serial_num"] for device in devices] == ["DF600000", "DF600001", "DF600002"]
+	stats = usbinfos.last_scan_stats()
+	assert stats["counters"]["drives_probed"] == 0
+	assert "disk_partitions" not in stats["phases"]
+	# the version needs the drives
+	devices = usbinfos.get_identified_devices(drive_info=True, fields=["version"])
+	assert devices[0]["version"] == "9.0.0"
+	assert usbinfos.last_scan_stats()["counters"]["drives_probed"] == 3
+	# and the selector its own fields
+	devices = usbinfos.get_identified_devices(fields=["name"], selector="drive=CIRCUITPY1")
+	assert [device["serial_num"] for device in devices] == ["DF600001"]
+	with pytest.raises(ValueError):
+		usbinfos.get_identified_devices(fields=["color"])
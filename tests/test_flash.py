@@ -0,0 +1,40 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import os
+from conftest import board_inputs
+from discotool import flash, usbinfos
+
+
+def boot_inputs(index, root):
+	# the board at the same USB location, as a UF2 boot drive
+	inputs = board_inputs(index, root)
+	(root / f"CIRCUITPY{index}" / flash.BOOT_INFO).write_text("UF2 Bootloader\n")
+	inputs["comports"] = []
+	return inputs
+
+
+def test_flash_boards(tmp_path, replay, monkeypatch):
+	boot = tmp_path / "boot"
+	boot.mkdir()
+	boards = [board_inputs(index, tmp_path) for index in range(3)]
+	replay([boards + [boot_inputs(3, boot)], [boot_inputs(0, boot), boot_inputs(1, boot)]],
+		events=[{"kind": "add"}])
+	resets = []
+	monkeypatch.setattr(flash, "reset_to_bootloader", resets.append)
+	firmware = tmp_path / "firmware.uf2"
+	firmware.write_bytes(os.urandom(200000))
+	devices = usbinfos.get_identified_devices(fields=flash.FLASH_FIELDS + ("ports",))
+	devices.append(usbinfos.DeviceInfoDict(dict(devices[0], usb_location="")))
+	done = []
+	results = flash.flash_boards(devices, str(firmware), timeout=0.5, done=done.append)
+	assert len(done) == 5
+	# all the boards are reset at once, but the one already in the bootloader
+	assert sorted(resets) == ["/dev/ttyACM0", "/dev/ttyACM2", "/dev/ttyACM4"]
+	for index in (0, 1, 3):
+		assert results[index].ok
+		assert results[index].drive == str(boot / f"CIRCUITPY{index}")
+		assert (boot / f"CIRCUITPY{index}" / "firmware.uf2").read_bytes() == firmware.read_bytes()
+	assert results[3].boot_time == 0
+	assert results[2].error == "no boot drive after 0.5s"
+	assert results[4].error == "no USB location to follow the board"
@@ -0,0 +1,49 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import sys
+import time
+import pytest
+from discotool.fleet import prefix_lines, run_all, run_lanes
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="posix shell commands")
+
+
+def test_run_all():
+	jobs = [{"serial": f"SN{index}", "command": f"sleep 0.3; echo board {index}"}
+		for index in range(4)]
+	jobs.append({"serial": "SN4", "command": "echo failed >&2; exit 3"})
+	jobs.append({"serial": "SN5", "command": "read line; echo got $line"})
+	done = []
+	start = time.monotonic()
+	results = run_all(jobs, workers=4, done=done.append)
+	# the commands run concurrently
+	assert time.monotonic() - start < 1.0
+	assert sorted(result.job["serial"] for result in done) == [f"SN{index}" for index in range(6)]
+	assert [result.job for result in results] == jobs
+	for index, result in enumerate(results[:4]):
+		assert result.ok
+		assert result.output == f"board {index}\n"
+	assert results[4].returncode == 3
+	assert results[4].output == "failed\n"
+	# no input: the command does not wait
+	assert results[5].output == "got\n"
+
+
+def test_prefix_lines():
+	assert prefix_lines("[SN1] ", "a\nb\n") == "[SN1] a\n[SN1] b\n"
+	assert prefix_lines("[SN1] ", "") == ""
+
+
+def test_run_lanes():
+	done = []
+	def square(number):
+		time.sleep(0.1)
+		return number * number
+	start = time.monotonic()
+	results = run_lanes([[1, 2, 3], [4], [5, 6]], square, workers=3, done=done.append)
+	# the lanes run at the same time, their jobs one after the other
+	assert time.monotonic() - start < 0.5
+	assert results == [1, 4, 9, 16, 25, 36]
+	assert sorted(done) == results
+	assert done.index(1) < done.index(4) < done.index(9)
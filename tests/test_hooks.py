@@ -0,0 +1,62 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import sys
+import threading
+import pytest
+from discotool.hooks import Hook, HookRunner, format_command
+
+
+def make_device(serial, drive=None):
+	volumes = [{"name": drive, "mount_point": f"/media/{drive}"}] if drive else []
+	return {"name": "QT Py", "vendor_id": 0x239a, "product_id": 0x80f4,
+		"serial_num": serial, "usb_location": "", "volumes": volumes, "ports": []}
+
+
+def event(kind, device):
+	return {"event": kind, "device": device, "changes": []}
+
+
+def test_hook_events():
+	hook = Hook(print, "drive=CIRCUITPY")
+	# the board is added without its drive, then the drive is mounted
+	assert hook.trigger(event("added", make_device("A"))) is None
+	assert hook.trigger(event("changed", make_device("A", "CIRCUITPY"))) == "added"
+	assert hook.trigger(event("changed", make_device("A", "CIRCUITPY"))) == "changed"
+	assert hook.trigger(event("removed", make_device("A", "CIRCUITPY"))) == "removed"
+	with pytest.raises(ValueError):
+		Hook(print, "", "mounted")
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="posix shell quoting")
+def test_format_command():
+	device = make_device("A", "MY DRIVE")
+	assert format_command("ls {mount} # {event}", device, "added") == "ls '/media/MY DRIVE' # added"
+
+
+def test_runs_are_serialized():
+	started = threading.Event()
+	release = threading.Event()
+	runs = []
+	def action(event):
+		runs.append(event["device"]["serial_num"])
+		started.set()
+		release.wait(5)
+	results = []
+	runner = HookRunner(workers=4, report=results.append)
+	runner.add(action, None, "changed")
+	board = make_device("A")
+	runner.dispatch(event("added", board))
+	runner.dispatch(event("changed", board))
+	assert started.wait(5)
+	# waiting for the first run: queued once
+	for _ in range(3):
+		runner.dispatch(event("changed", board))
+	# another board runs at the same time
+	runner.dispatch(event("added", make_device("B")))
+	runner.dispatch(event("changed", make_device("B")))
+	release.set()
+	runner.close()
+	assert sorted(runs) == ["A", "A", "B"]
+	assert all(result["returncode"] == 0 for result in results)
+	assert [result["hook"] for result in results] == ["changed"] * 3
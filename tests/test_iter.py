@@ -0,0 +1,22 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+from conftest import board_inputs
+from discotool import usbinfos
+
+
+def test_iter_devices(tmp_path, replay):
+	replay([[board_inputs(index, tmp_path) for index in range(5)]])
+	devices = usbinfos.iter_devices(drive_info=True, selector="pid=80f4")
+	assert [device.serial_num for device in devices] == [f"DF60000{index}" for index in range(5)]
+	assert usbinfos.last_scan_stats()["counters"]["drives_probed"] == 5
+
+
+def test_find_device_stops_the_scan(tmp_path, replay):
+	replay([[board_inputs(index, tmp_path) for index in range(5)]])
+	device = usbinfos.find_device("serial=DF600001", drive_info=True)
+	assert device.serial_num == "DF600001"
+	assert device.volume_name == "CIRCUITPY1"
+	# the following boards are not resolved
+	assert usbinfos.last_scan_stats()["counters"]["drives_probed"] == 1
+	assert usbinfos.find_device("serial=nope") is None
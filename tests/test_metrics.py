@@ -0,0 +1,63 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import os
+import urllib.request
+from discotool.metrics import CONTENT_TYPE, Metrics
+
+
+def make_device(pid, serial):
+	return {"vendor_id": 0x239a, "product_id": pid, "serial_num": serial, "usb_location": ""}
+
+
+def make_stats(total, timeouts=0):
+	return {"phases": {"enumerate": total / 2}, "total": total,
+		"counters": {"drive_timeouts": timeouts}}
+
+
+def test_metrics_render(tmp_path):
+	metrics = Metrics()
+	metrics.observe_scan([make_device(0x80f4, "A"), make_device(0x80f4, "B")], [], make_stats(0.02))
+	metrics.observe_scan([make_device(0x80f4, "A"), make_device(0x8022, "C")],
+		[{"dev": "/dev/ttyACM9"}], make_stats(3, timeouts=2))
+	lines = metrics.render().splitlines()
+	assert 'discotool_boards_present{vid="239a",pid="8022"} 1' in lines
+	assert 'discotool_boards_present{vid="239a",pid="80f4"} 1' in lines
+	assert "discotool_unknown_serial_ports 1" in lines
+	assert "discotool_scans_total 2" in lines
+	assert 'discotool_scan_duration_seconds_bucket{phase="total",le="0.025"} 1' in lines
+	assert 'discotool_scan_duration_seconds_bucket{phase="total",le="5"} 2' in lines
+	assert 'discotool_scan_duration_seconds_bucket{phase="total",le="+Inf"} 2' in lines
+	assert 'discotool_scan_duration_seconds_count{phase="enumerate"} 2' in lines
+	assert 'discotool_hotplug_events_total{event="added"} 1' in lines
+	assert 'discotool_hotplug_events_total{event="removed"} 1' in lines
+	assert "discotool_drive_probe_timeouts_total 2" in lines
+	path = tmp_path / "discotool.prom"
+	metrics.write_textfile(str(path))
+	assert path.read_text().splitlines() == lines
+
+
+def test_metrics_serve():
+	metrics = Metrics()
+	metrics.observe_scan([make_device(0x80f4, "A")], [])
+	server = metrics.serve(0)
+	try:
+		url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+		with urllib.request.urlopen(url, timeout=5) as response:
+			assert response.headers["Content-Type"] == CONTENT_TYPE
+			body = response.read().decode("utf-8")
+	finally:
+		server.shutdown()
+		server.server_close()
+	assert "discotool_scans_total 1" in body.splitlines()
+
+
+def test_textfile_is_replaced(tmp_path):
+	metrics = Metrics()
+	path = tmp_path / "discotool.prom"
+	for _ in range(2):
+		metrics.observe_scan([], [])
+		metrics.write_textfile(str(path))
+	assert os.listdir(tmp_path) == ["discotool.prom"]
+	assert "discotool_scans_total 2" in path.read_text().splitlines()
+	assert os.stat(path).st_mode & 0o777 == 0o644
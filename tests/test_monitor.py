@@ -0,0 +1,66 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import os
+import sys
+import threading
+import pytest
+from discotool.monitor import LineSplitter, Port, SerialMonitor
+
+PORTS = 20
+SIZE = 1024 * 1024
+
+
+def test_line_splitter_partial_lines():
+	splitter = LineSplitter()
+	assert splitter.feed(b"hel") == []
+	assert splitter.feed(b"lo\r\nwor") == [b"hello"]
+	assert splitter.feed(b"ld\nand\n\nmore") == [b"world", b"and", b""]
+	assert splitter.flush() == [b"more"]
+	assert splitter.flush() == []
+
+
+def test_line_splitter_title_sequence():
+	splitter = LineSplitter()
+	line = b"\x1b]0;\xf0\x9f\x90\x8dcode.py | 9.0.0\x1b\\Hello\n"
+	assert splitter.feed(line) == [b"Hello"]
+	# the title cut between two reads, ended by BEL
+	assert splitter.feed(b"\x1b]0;Done") == []
+	assert splitter.feed(b"\x07x\n") == [b"x"]
+	# kept when asked
+	splitter = LineSplitter(strip_title=False)
+	assert splitter.feed(b"\x1b]0;t\x07x\n") == [b"\x1b]0;t\x07x"]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="needs ptys")
+def test_monitor_reads_all_the_ports():
+	import tty
+	boards = []
+	for index in range(PORTS):
+		master, slave = os.openpty()
+		tty.setraw(master)
+		# raw before the monitor opens it, a canonical tty drops long lines
+		tty.setraw(slave)
+		boards.append((master, slave, Port(f"board{index}", os.ttyname(slave))))
+	received = {id(port): bytearray() for _, _, port in boards}
+	def handler(port, data, timestamp):
+		received[id(port)].extend(data)
+		if all(len(data) >= SIZE for data in received.values()):
+			serial_monitor.stop()
+	serial_monitor = SerialMonitor([port for _, _, port in boards], handler)
+	def send(master, index):
+		data = bytes([65 + index]) * SIZE
+		view = memoryview(data)
+		while len(view):
+			view = view[os.write(master, view[:65536]):]
+	senders = [threading.Thread(target=send, args=(master, index), daemon=True)
+		for index, (master, _, _) in enumerate(boards)]
+	for sender in senders:
+		sender.start()
+	serial_monitor.run(duration=30)
+	for master, slave, _ in boards:
+		os.close(master)
+		os.close(slave)
+	for index, (_, _, port) in enumerate(boards):
+		assert received[id(port)] == bytes([65 + index]) * SIZE
+		assert port.bytes_read == SIZE
@@ -0,0 +1,91 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import os
+import sys
+import threading
+import time
+import pytest
+from discotool import pipe
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="needs ptys")
+
+DATA = bytes(range(256)) * 8000
+
+
+def echo_board(close_after=None):
+	"""
+	A pty that sends back what it receives, closed after close_after bytes.
+	"""
+	import tty
+	master, slave = os.openpty()
+	tty.setraw(master)
+	path = os.ttyname(slave)
+	def run():
+		received = 0
+		while close_after is None or received < close_after:
+			try:
+				data = os.read(master, 65536)
+			except OSError:
+				break
+			if not data:
+				break
+			os.write(master, data)
+			received += len(data)
+		if close_after is not None:
+			# closing the master drops what the slave didn't read yet
+			time.sleep(0.5)
+			os.close(master)
+	threading.Thread(target=run, daemon=True).start()
+	# the pty disappears when the slave is closed
+	return path, slave
+
+
+def run_pipe(function, board, data, close_on_eof):
+	path, slave = board
+	input_read, input_write = os.pipe()
+	output_read, output_write = os.pipe()
+	received = bytearray()
+	def feed():
+		os.write(input_write, data)
+		os.close(input_write)
+	def collect():
+		while True:
+			chunk = os.read(output_read, 65536)
+			if not chunk:
+				break
+			received.extend(chunk)
+	feeder = threading.Thread(target=feed, daemon=True)
+	collector = threading.Thread(target=collect, daemon=True)
+	feeder.start()
+	collector.start()
+	stats = pipe.PipeStats()
+	function(path, input_read, output_write, close_on_eof, stats)
+	os.close(output_write)
+	collector.join(5)
+	feeder.join(5)
+	os.close(input_read)
+	os.close(output_read)
+	os.close(slave)
+	return bytes(received), stats
+
+
+def test_pipe_until_the_port_closes():
+	board = echo_board(close_after=len(DATA))
+	received, stats = run_pipe(pipe._pipe_posix, board, DATA, False)
+	assert received == DATA
+	assert stats.bytes_in == stats.bytes_out == len(DATA)
+
+
+def test_pipe_close_on_eof_reads_the_answer():
+	board = echo_board()
+	received, stats = run_pipe(pipe._pipe_posix, board, DATA, True)
+	assert received == DATA
+	assert stats.bytes_in == stats.bytes_out == len(DATA)
+
+
+def test_pipe_threads_close_on_eof():
+	pytest.importorskip("serial")
+	board = echo_board()
+	received, stats = run_pipe(pipe._pipe_threads, board, DATA, True)
+	assert received == DATA
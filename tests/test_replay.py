@@ -0,0 +1,55 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import json
+import pytest
+from conftest import board_inputs, scan_inputs
+from discotool import usbinfos
+from discotool.usbinfos.usbinfos_replay import Recorder, Replayer, ReplaySource
+
+
+def test_replay_scans(tmp_path, replay):
+	boards = [board_inputs(index, tmp_path) for index in range(2)]
+	replay([[], boards[:1], boards])
+	assert usbinfos.get_devices_list() == ([], [])
+	devices = usbinfos.get_identified_devices(drive_info=True)
+	assert [device.serial_num for device in devices] == ["DF600000"]
+	device = devices[0]
+	assert device.repl == "/dev/ttyACM0"
+	assert device.data == "/dev/ttyACM1"
+	assert device.volume_name == "CIRCUITPY0"
+	assert device["version"] == "9.0.0"
+	assert device["usb_location"] == "usb1/1-2/1-2.1"
+	# stays on the last scan
+	for _ in range(2):
+		devices = usbinfos.get_identified_devices()
+		assert [device.serial_num for device in devices] == ["DF600000", "DF600001"]
+
+
+def test_record_what_is_replayed(tmp_path):
+	inputs = scan_inputs([board_inputs(0, tmp_path)])
+	path = tmp_path / "record.json"
+	recorder = Recorder(str(path))
+	source = recorder.record_scan(ReplaySource(inputs))
+	for name in ("udev_devices", "comports", "disk_partitions"):
+		getattr(source, name)()
+	source.drive_info(str(tmp_path / "CIRCUITPY0"), "DF600000")
+	recorder.save()
+	replayer = Replayer(str(path))
+	assert replayer.data["scans"][0]["inputs"] == json.loads(json.dumps(inputs))
+	source = replayer.next_source()
+	assert [port.device for port in source.comports()] == ["/dev/ttyACM0", "/dev/ttyACM1"]
+	# not recorded
+	assert source.usb_descriptors() == []
+
+
+def test_bad_files(tmp_path):
+	path = tmp_path / "bad.json"
+	path.write_text(json.dumps({"format": "other"}))
+	with pytest.raises(ValueError):
+		Replayer(str(path))
+	path.write_text(json.dumps({"format": "discotool-replay", "version": 99}))
+	with pytest.raises(ValueError):
+		Replayer(str(path))
+	with pytest.raises(ValueError):
+		usbinfos.set_backend("nope")
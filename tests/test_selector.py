@@ -0,0 +1,86 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import pytest
+from conftest import board_inputs
+from discotool import usbinfos
+from discotool.usbinfos.usbinfos_selector import DeviceIndex, Selector, SelectorError
+
+
+def make_device(name, vid, pid, serial, loc, drive=None):
+	return {
+		"name": name,
+		"manufacturer": "Adafruit",
+		"vendor_id": vid,
+		"product_id": pid,
+		"serial_num": serial,
+		"usb_location": loc,
+		"version": "9.0.0",
+		"volumes": [{"name": drive, "mount_point": f"/media/{drive}"}] if drive else [],
+		"ports": [],
+	}
+
+
+DEVICES = [
+	make_device("Feather RP2040", 0x239a, 0x80f4, "DF6012", "usb1/1-2/1-2.1", "CIRCUITPY"),
+	make_device("QT Py", 0x239a, 0x80cc, "DF6034", "usb1/1-2/1-2.2", "CIRCUITPY1"),
+	make_device("Feather M4", 0x239a, 0x8022, "AB0056", "usb1/1-3", "FEATHERBOOT"),
+	make_device("Pico", 0x2e8a, 0x000a, "E660", "usb1/1-4"),
+]
+
+
+def names(expression, devices=DEVICES):
+	return [device["name"] for device in Selector(expression).select(devices)]
+
+
+def test_select():
+	assert names("vid=239a pid=80f4") == ["Feather RP2040"]
+	assert names("serial~^df60") == ["Feather RP2040", "QT Py"]
+	assert names("loc=1-2.*") == ["Feather RP2040", "QT Py"]
+	assert names("drive=CIRCUITPY or (name~feather and not drive=*BOOT)") == ["Feather RP2040"]
+	assert names("vid!=239a") == ["Pico"]
+	assert names("name='qt py' or sn=e660") == ["QT Py", "Pico"]
+	assert names("mount=/media/circuitpy*") == ["Feather RP2040", "QT Py"]
+	# the same devices through an index, in order and without duplicates
+	assert names("pid=80cc or serial=DF6034 or vid=239a", DeviceIndex(DEVICES)) == [
+		"Feather RP2040", "QT Py", "Feather M4"]
+
+
+def test_fields_and_prefilter():
+	selector = Selector("vid=239a and drive=CIRCUITPY")
+	assert selector.fields() == {"vendor_id", "volumes"}
+	assert selector.prefilter(vid=0x239a)
+	assert not selector.prefilter(vid=0x2e8a)
+	# the drive is not known yet
+	assert selector.prefilter()
+	assert Selector("not loc=1-2.*").prefilter(loc="usb1/1-3")
+	assert not Selector("not loc=1-2.*").prefilter(loc="usb1/1-2/1-2.1")
+
+
+def test_contains_and_any_of():
+	selector = Selector.any_of([Selector.contains("name", "qt"), Selector("vid=2e8a")])
+	assert [device["name"] for device in selector.select(DEVICES)] == ["QT Py", "Pico"]
+
+
+@pytest.mark.parametrize("expression", [
+	"", "color=red", "vid=xyz", "name~(", "(vid=239a", "vid=239a)", "and",
+])
+def test_errors(expression):
+	with pytest.raises(SelectorError):
+		Selector(expression)
+
+
+def test_selector_in_the_backend(tmp_path, replay):
+	# 1-2.1 is not the parent of 1-2.10 and 1-2.11
+	replay([[board_inputs(index, tmp_path) for index in range(12)]])
+	devices, ports = usbinfos.get_devices_list(drive_info=True, selector="serial=DF60000A")
+	assert [device["serial_num"] for device in devices] == ["DF60000A"]
+	assert [port["dev"] for port in devices[0]["ports"]] == ["/dev/ttyACM20", "/dev/ttyACM21"]
+	counters = usbinfos.last_scan_stats()["counters"]
+	assert counters["devices_skipped"] == 11
+	assert counters["drives_probed"] == 1
+	# the ports of the skipped boards are not attributed
+	assert len(ports) == 22
+	devices = usbinfos.get_identified_devices(selector="loc=1-2.1 or drive=CIRCUITPY11")
+	assert [device["serial_num"] for device in devices] == ["DF600000", "DF60000B"]
+	assert len(devices[0]["ports"]) == 2
@@ -0,0 +1,113 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import os
+import select
+import sys
+import threading
+import pytest
+from discotool import serialpool
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="needs ptys")
+pytest.importorskip("serial")
+
+
+class Device(dict):
+	def __init__(self, serial, data):
+		super().__init__(serial_num=serial, name="Board", volumes=[])
+		self.repl = None
+		self.data = data
+
+
+class Board:
+	"""
+	A pty that answers each line in upper case.
+	"""
+	def __init__(self):
+		import tty
+		self.master, self.slave = os.openpty()
+		tty.setraw(self.master)
+		tty.setraw(self.slave)
+		self.path = os.ttyname(self.slave)
+		self.closing = threading.Event()
+		self.thread = threading.Thread(target=self.run, daemon=True)
+		self.thread.start()
+
+	def run(self):
+		while not self.closing.is_set():
+			readable, _, _ = select.select([self.master], [], [], 0.05)
+			if readable:
+				os.write(self.master, os.read(self.master, 1024).upper())
+
+	def close(self):
+		# the pty hangs up when nothing uses the master anymore
+		self.closing.set()
+		self.thread.join()
+		os.close(self.master)
+		os.close(self.slave)
+
+
+def test_connections_are_shared(monkeypatch):
+	board = Board()
+	monkeypatch.setattr(serialpool, "get_identified_devices",
+		lambda fields=None: [Device("ABC", board.path)])
+	with serialpool.SerialPool(follow_hotplug=False) as pool:
+		connection = pool.get("ABC", "data")
+		assert pool.get("ABC", "data") is connection
+		def worker(number):
+			for index in range(20):
+				with connection:
+					connection.write(b"t%d-%d\n" % (number, index))
+					assert connection.readline() == b"T%d-%d\n" % (number, index)
+		threads = [threading.Thread(target=worker, args=(number,)) for number in range(8)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		assert connection.read_until(b"\n", timeout=0.1) == b""
+	board.close()
+
+
+def test_reconnect_on_a_new_port(monkeypatch):
+	boards = [Board()]
+	monkeypatch.setattr(serialpool, "get_identified_devices",
+		lambda fields=None: [Device("ABC", boards[-1].path)])
+	monkeypatch.setattr(serialpool, "RESCAN_INTERVAL", 0)
+	with serialpool.SerialPool(follow_hotplug=False) as pool:
+		connection = pool.get("ABC", "data")
+		connection.write(b"before\n")
+		assert connection.readline() == b"BEFORE\n"
+		# the board resets and comes back as another tty
+		boards[0].close()
+		boards.append(Board())
+		pool.refresh()
+		connection.write(b"after\n")
+		assert connection.readline() == b"AFTER\n"
+		assert connection.path == boards[-1].path
+	boards[-1].close()
+
+
+def test_retry_after_an_error(monkeypatch):
+	boards = [Board()]
+	monkeypatch.setattr(serialpool, "get_identified_devices",
+		lambda fields=None: [Device("ABC", boards[-1].path)])
+	monkeypatch.setattr(serialpool, "RESCAN_INTERVAL", 0)
+	with serialpool.SerialPool(follow_hotplug=False) as pool:
+		connection = pool.get("ABC", "data")
+		connection.write(b"before\n")
+		assert connection.readline() == b"BEFORE\n"
+		# no refresh: the write fails and is made again on the new port
+		boards[0].close()
+		boards.append(Board())
+		connection.write(b"after\n")
+		assert connection.readline() == b"AFTER\n"
+	boards[-1].close()
+
+
+def test_unknown_board(monkeypatch):
+	monkeypatch.setattr(serialpool, "get_identified_devices", lambda fields=None: [])
+	with serialpool.SerialPool(follow_hotplug=False) as pool:
+		with pytest.raises(ConnectionError):
+			pool.get("ABC", "data").write(b"x")
+		with pytest.raises(ValueError):
+			pool.get("ABC", "cdc3")
@@ -0,0 +1,61 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import json
+from conftest import board_inputs
+from discotool import usbinfos
+from discotool.usbinfos import usbinfos_trace
+from discotool.usbinfos.usbinfos_stats import ScanStats, TimedSource
+
+
+class Source:
+	def drive_info(self, mount, serial=None):
+		if mount == "/slow":
+			raise TimeoutError()
+		return (["code.py"], "9.0.0")
+
+
+def test_drive_info_span(tmp_path):
+	trace = tmp_path / "trace.jsonl"
+	usbinfos_trace.set_trace(str(trace))
+	try:
+		stats = ScanStats("test")
+		source = TimedSource(Source(), stats)
+		assert source.drive_info("/fast", "ABC") == (["code.py"], "9.0.0")
+		assert source.drive_info("/slow", "DEF") == ([], "")
+		# cached
+		source.drive_info("/fast", "ABC")
+	finally:
+		usbinfos_trace.set_trace(None)
+	spans = [json.loads(line) for line in trace.read_text().splitlines()]
+	assert [(span["span"], span["serial"], span["mount"], span["outcome"]) for span in spans] == [
+		("scan.drive_info", "ABC", "/fast", "ok"),
+		("scan.drive_info", "DEF", "/slow", "timeout"),
+	]
+	assert stats.counters["drives_probed"] == 2
+	assert stats.counters["drive_timeouts"] == 1
+	assert stats.counters["cache_hits"] == 1
+
+
+def test_last_scan_stats(tmp_path, replay):
+	replay([[board_inputs(index, tmp_path) for index in range(3)]])
+	usbinfos.get_devices_list(drive_info=True)
+	stats = usbinfos.last_scan_stats()
+	assert stats["backend"] == "linux"
+	assert set(stats["phases"]) == {"udev_devices", "comports", "disk_partitions", "drive_info", "correlate"}
+	assert stats["total"] >= sum(stats["phases"].values()) * 0.99
+	assert stats["counters"]["devices_seen"] == 3
+	assert stats["counters"]["ports_matched"] == 6
+	assert stats["counters"]["drives_probed"] == 3
+
+
+def test_timings_option(tmp_path, replay):
+	from click.testing import CliRunner
+	from discotool.discotool import main
+	replay([[board_inputs(0, tmp_path)]])
+	result = CliRunner().invoke(main, ["--timings", "json"])
+	assert result.exit_code == 0
+	output = json.loads(result.stdout)
+	assert [device["serial_num"] for device in output["devices"]] == ["DF600000"]
+	assert output["timings"]["counters"]["devices_seen"] == 1
+	assert "Scan timings (linux)" in result.stderr
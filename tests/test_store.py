@@ -0,0 +1,78 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import os
+import stat
+import time
+from discotool.store import BackupStore
+
+
+def make_drive(root, code):
+	os.makedirs(root / "lib")
+	(root / "code.py").write_bytes(code)
+	(root / "lib" / "big.mpy").write_bytes(b"\x01" * 10000)
+
+
+def test_store_deduplicates(tmp_path):
+	store = BackupStore(str(tmp_path / "backup"))
+	for index in range(3):
+		drive = tmp_path / f"CIRCUITPY{index}"
+		make_drive(drive, f"print({index})\n".encode())
+		result = store.backup_drive({"source": str(drive), "drive": f"DRIVE{index}",
+			"destination": str(tmp_path / "backup" / f"DRIVE{index}")})
+		assert result.files_copied == 2
+	# the library is stored once
+	assert len(store.stored()) == 4
+	assert (tmp_path / "backup" / "DRIVE2" / "code.py").read_bytes() == b"print(2)\n"
+	checked, corrupted, missing = store.verify()
+	assert (checked, corrupted, missing) == (4, [], [])
+
+
+def test_store_verify_and_prune(tmp_path):
+	store = BackupStore(str(tmp_path / "backup"))
+	drive = tmp_path / "CIRCUITPY"
+	make_drive(drive, b"print(1)\n")
+	job = {"source": str(drive), "drive": "DRIVE"}
+	store.backup_drive(job)
+	(drive / "code.py").write_bytes(b"print(2)\n")
+	later = time.time() + 10
+	os.utime(drive / "code.py", (later, later))
+	result = store.backup_drive(job)
+	assert (result.files_copied, result.files_unchanged) == (1, 1)
+	assert len(store.snapshots("DRIVE")) == 2
+	# damage an object
+	digest = store.load_snapshot("DRIVE")["code.py"]["hash"]
+	path = store.object_path(digest)
+	os.chmod(path, stat.S_IWUSR | stat.S_IRUSR)
+	with open(path, "wb") as fp:
+		fp.write(b"broken")
+	_, corrupted, _ = store.verify()
+	assert corrupted == [digest]
+	# the first version of code.py is not used anymore
+	snapshots, objects, freed = store.prune(1)
+	assert (snapshots, objects) == (1, 1)
+	assert len(store.stored()) == 2
+
+
+def test_store_directories_and_checksum(tmp_path):
+	store = BackupStore(str(tmp_path / "backup"))
+	drive = tmp_path / "CIRCUITPY"
+	make_drive(drive, b"print(1)\n")
+	os.makedirs(drive / "sd" / "empty")
+	job = {"source": str(drive), "drive": "DRIVE"}
+	store.backup_drive(job)
+	# the same size and time, another content
+	stat_before = os.stat(drive / "code.py")
+	(drive / "code.py").write_bytes(b"print(9)\n")
+	os.utime(drive / "code.py", ns=(stat_before.st_atime_ns, stat_before.st_mtime_ns))
+	result = store.backup_drive(job)
+	assert (result.files_copied, result.files_unchanged) == (0, 2)
+	result = store.backup_drive(job, checksum=True)
+	assert (result.files_copied, result.files_unchanged) == (1, 1)
+	# the empty directories are restored
+	restored = tmp_path / "restored"
+	store.materialize(store.load_snapshot("DRIVE"), str(restored), link=False)
+	assert sorted(os.listdir(restored)) == ["code.py", "lib", "sd"]
+	assert os.listdir(restored / "sd") == ["empty"]
+	assert (restored / "code.py").read_bytes() == b"print(9)\n"
+	assert store.verify() == (3, [], [])
@@ -0,0 +1,107 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import os
+from discotool.sync import Batch, BoardSync, batches, tree_watcher
+
+
+def write(path, text):
+	with open(path, "w") as fp:
+		fp.write(text)
+
+
+def read(path):
+	with open(path) as fp:
+		return fp.read()
+
+
+def test_backup_rename_is_not_a_deletion():
+	# vim: a.py -> a.py~ (ignored, no moved_to), write a.py, remove a.py~
+	batch = Batch()
+	batch.add(("moved_from", 1, "a.py"))
+	batch.add(("changed", "a.py"))
+	batch.close()
+	assert batch.changed == {"a.py"}
+	assert batch.deleted == set()
+	assert batch.moves == []
+
+
+def test_rename_over_moved_away_file():
+	# a.py -> a.py~, then a temporary file renamed to a.py
+	batch = Batch()
+	batch.add(("moved_from", 1, "a.py"))
+	batch.add(("changed", "tmp123"))
+	batch.add(("moved_from", 2, "tmp123"))
+	batch.add(("moved_to", 2, "a.py"))
+	batch.close()
+	assert batch.changed == {"a.py"}
+	assert "a.py" not in batch.deleted
+
+
+def test_edit_then_rename():
+	batch = Batch()
+	batch.add(("changed", "a.py"))
+	batch.add(("moved_from", 1, "a.py"))
+	batch.add(("moved_to", 1, "b.py"))
+	batch.close()
+	assert batch.changed == {"b.py"}
+	assert batch.deleted == {"a.py"}
+
+
+def test_move_out_of_tree():
+	batch = Batch()
+	batch.add(("moved_from", 1, "a.py"))
+	batch.close()
+	assert batch.deleted == {"a.py"}
+
+
+def test_vim_save_with_watcher(tmp_path):
+	source = tmp_path / "source"
+	board = tmp_path / "board"
+	source.mkdir()
+	board.mkdir()
+	write(source / "code.py", "import a\n")
+	write(source / "a.py", "x = 1\n")
+	sync = BoardSync(str(source), {
+		"serial": "TEST",
+		"destination": str(board),
+		"index": str(tmp_path / "index.json"),
+	})
+	sync.start()
+	assert read(board / "a.py") == "x = 1\n"
+	watcher = tree_watcher(str(source))
+	try:
+		os.rename(source / "a.py", source / "a.py~")
+		write(source / "a.py", "x = 2\n")
+		os.remove(source / "a.py~")
+		batch = next(batches(watcher, 0.2))
+	finally:
+		watcher.close()
+	assert "a.py" in batch.changed
+	assert "a.py" not in batch.deleted
+	sync.apply(batch)
+	assert sorted(os.listdir(board)) == ["a.py", "code.py"]
+	assert read(board / "a.py") == "x = 2\n"
+
+
+def test_edit_then_rename_on_board(tmp_path):
+	source = tmp_path / "source"
+	board = tmp_path / "board"
+	source.mkdir()
+	board.mkdir()
+	write(source / "a.py", "x = 1\n")
+	sync = BoardSync(str(source), {
+		"serial": "TEST",
+		"destination": str(board),
+		"index": str(tmp_path / "index.json"),
+	})
+	sync.start()
+	batch = Batch()
+	write(source / "a.py", "x = 2\n")
+	batch.add(("changed", "a.py"))
+	os.rename(source / "a.py", source / "b.py")
+	batch.add(("moved_from", 1, "a.py"))
+	batch.add(("moved_to", 1, "b.py"))
+	sync.apply(batch.close())
+	assert sorted(os.listdir(board)) == ["b.py"]
+	assert read(board / "b.py") == "x = 2\n"
@@ -0,0 +1,42 @@
+# SPDX-FileCopyrightText: Copyright 2026 Neradoc, https://neradoc.me
+# SPDX-License-Identifier: MIT
+
+import json
+import shutil
+from click.testing import CliRunner
+from conftest import board_inputs
+from discotool.discotool import main
+
+
+def test_wait_drive(tmp_path, replay):
+	# the board comes up before its drive is mounted
+	unmounted = tmp_path / "unmounted"
+	unmounted.mkdir()
+	scans = [[], [board_inputs(0, unmounted)], [board_inputs(0, tmp_path)]]
+	shutil.rmtree(unmounted)
+	# one hotplug event before each scan
+	replay(scans, events=[{"kind": "add"}, {"kind": "mount"}])
+	result = CliRunner().invoke(main, ["--wait-drive", "--serial", "DF600000", "json"])
+	assert result.exit_code == 0
+	wait, output = result.stdout.split("\n", 1)
+	assert wait == "Wait until the device is available"
+	# two rescans
+	assert output.startswith("..[")
+	devices = json.loads(output[2:])
+	assert [device["volumes"][0]["mount_point"] for device in devices] == [str(tmp_path / "CIRCUITPY0")]
+
+
+def test_monitor_opened_before_the_first_scan(tmp_path, replay, monkeypatch):
+	from discotool import usbinfos
+	replay([[board_inputs(0, tmp_path)]])
+	calls = []
+	hotplug_monitor = usbinfos.hotplug_monitor
+	get_devices_list = usbinfos.get_devices_list
+	monkeypatch.setattr(usbinfos, "hotplug_monitor",
+		lambda: calls.append("monitor") or hotplug_monitor())
+	monkeypatch.setattr(usbinfos, "get_devices_list",
+		lambda *args, **kwargs: calls.append("scan") or get_devices_list(*args, **kwargs))
+	result = CliRunner().invoke(main, ["--wait", "--serial", "DF600000", "get", "sn"])
+	assert result.exit_code == 0
+	assert result.stdout.splitlines()[-1] == "DF600000"
+	assert calls == ["monitor", "scan"]